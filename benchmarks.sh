@@ -11,6 +11,17 @@ set -o pipefail
 
 export BENCHMARKS_N
 export BENCHMARKS_N_DIV_10=$((BENCHMARKS_N / 10))
+# Iteration bounds of the client loops, without adaptive mode both are BENCHMARKS_N and the stopping rule never ends a loop early
+if [[ "$ADAPTIVE" == "1" ]]; then
+    export BENCHMARKS_MIN_N="$ADAPTIVE_MIN_N"
+    export BENCHMARKS_MAX_N="$ADAPTIVE_MAX_N"
+else
+    export BENCHMARKS_MIN_N="$BENCHMARKS_N"
+    export BENCHMARKS_MAX_N="$BENCHMARKS_N"
+fi
+export BENCHMARKS_MIN_N_DIV_10=$((BENCHMARKS_MIN_N / 10))
+export BENCHMARKS_MAX_N_DIV_10=$((BENCHMARKS_MAX_N / 10))
+export ADAPTIVE_REL_WIDTH
 # This is for envsubst to substitute dollars to $
 export DOLLAR='$'
 
@@ -22,7 +33,12 @@ function show_help() {
     echo "  clusters-create      create clusters using configured provider"
     echo "  clusters-destroy     destroy clusters using configured provider"
     echo "  benchmarks           run configured benchmarks with configure approaches on configured provider"
+    echo "  resume               continue the last benchmark run, skipping finished cells and retrying failed ones"
+    echo "  run-approach <name>  run the remaining cells of one approach of the current run, used by the scheduler"
     echo "  plot <dir>           generate plots from benchmark results"
+    echo "  plot-merged <dir>... generate plots from the merged quantile sketches of several benchmark results"
+    echo "  compare <dir> <dir>  rank regressions of the second benchmark results against the first"
+    echo "  ingest <dir>         add benchmark results to the results database, plot slices of it with plotting/plots.py"
 }
 
 ### COMMAND FUNCTIONS ###
@@ -86,11 +102,19 @@ function benchmark_approach() {
     fi
 
     calculate_ports $benchmark
+    PHASE_CELL="$approach $benchmark $payload_size"
 
+    phase namespace-setup
+    # The namespace of an earlier cell with the same benchmark may still be terminating
+    wait_ready --context "$CLUSTER_1_CONTEXT" --context "$CLUSTER_2_CONTEXT" --timeout "$RESOURCE_DELETE_TIMEOUT" namespace-deleted "$benchmark"
     info "[$PROVIDER $approach $benchmark $payload_size] Creating namespace '$benchmark' in both clusters"
     kubectl create namespace "$benchmark" --context "$CLUSTER_1_CONTEXT" --dry-run=client -o yaml | kubectl apply -f - --context "$CLUSTER_1_CONTEXT"
     kubectl create namespace "$benchmark" --context "$CLUSTER_2_CONTEXT" --dry-run=client -o yaml | kubectl apply -f - --context "$CLUSTER_2_CONTEXT"
+    kubectl label namespace "$benchmark" "$BENCHMARK_NAMESPACE_LABEL=true" --overwrite --context "$CLUSTER_1_CONTEXT"
+    kubectl label namespace "$benchmark" "$BENCHMARK_NAMESPACE_LABEL=true" --overwrite --context "$CLUSTER_2_CONTEXT"
+    kubectl create configmap stopping-rule -n "$benchmark" --from-file="$BENCHMARKS_DIR/stopping-rule.awk" --context "$CLUSTER_2_CONTEXT" --dry-run=client -o yaml | kubectl apply -f - --context "$CLUSTER_2_CONTEXT"
 
+    phase server-setup
     info "[$PROVIDER $approach $benchmark $payload_size] Executing benchmark script"
     export BENCHMARK="$benchmark"
     export PAYLOAD_SIZE="$payload_size"
@@ -108,42 +132,35 @@ function benchmark_approach() {
     DATE=$(date +%Y%m%d%H%M%S)
     mkdir -p ./"$RESULTS_DIR"
 
-    info "[$PROVIDER $approach $benchmark $payload_size] Waiting for server pod to be scheduled in cluster 1"
-    until kubectl get pod -n "$benchmark" -l "$SERVER_LABEL" --context "$CLUSTER_1_CONTEXT" | grep "${benchmark}-server" >/dev/null 2>&1; do
-        sleep 1
-    done
     info "[$PROVIDER $approach $benchmark $payload_size] Waiting for server pod to be ready in cluster 1"
-    kubectl wait --for=condition=Ready pod -n "$benchmark" -l "$SERVER_LABEL" --context "$CLUSTER_1_CONTEXT" --timeout="$RESOURCE_CREATE_TIMEOUT"
+    wait_ready --context "$CLUSTER_1_CONTEXT" --timeout "$RESOURCE_CREATE_TIMEOUT" pods-ready "$benchmark" "$SERVER_LABEL"
     info "[$PROVIDER $approach $benchmark $payload_size] Executing benchmark post script"
     export BENCHMARK="$benchmark"
     export PAYLOAD_SIZE="$payload_size"
     run_if_exists "$APPROACHES_DIR"/"$approach"/"post-$BENCHMARK_CUSTOM_FILE"
+    # Namespaces of earlier cells are deleted in the background while this cell is set up, but not while it is measured
+    phase teardown-wait
+    wait_for_benchmark_namespaces
+    phase client-setup
     info "[$PROVIDER $approach $benchmark $payload_size] Deploying benchmark client"
     apply_if_exists "$BENCHMARKS_DIR/$benchmark/client.yaml" "$CLUSTER_2_CONTEXT" strict BENCHMARKS_N="$BENCHMARKS_N" BENCHMARKS_N_DIV_10="$BENCHMARKS_N_DIV_10"
-    info "[$PROVIDER $approach $benchmark $payload_size] Waiting for client pod to be scheduled in cluster 2"
-    until kubectl get pod -n "$benchmark" -l "$CLIENT_LABEL" --context "$CLUSTER_2_CONTEXT" | grep "${benchmark}-client" >/dev/null 2>&1; do
-        sleep 1
-    done
     info "[$PROVIDER $approach $benchmark $payload_size] Waiting for client pod to be ready in cluster 2"
-    kubectl wait --for=condition=Ready pod -n "$benchmark" -l "$CLIENT_LABEL" --context "$CLUSTER_2_CONTEXT" --timeout="$RESOURCE_CREATE_TIMEOUT"
+    wait_ready --context "$CLUSTER_2_CONTEXT" --timeout "$RESOURCE_CREATE_TIMEOUT" pods-ready "$benchmark" "$CLIENT_LABEL"
+    phase benchmark
     info "[$PROVIDER $approach $benchmark $payload_size] Running benchmark"
-    kubectl get --context "$CLUSTER_1_CONTEXT" --raw "/api/v1/nodes/$CLUSTER_1_CONTROL_PLANE_NAME/proxy/metrics/cadvisor" | grep '^container_cpu_usage_seconds_total{container="",cpu="total",id="/"' >>"./$RESULTS_DIR/$PROVIDER-$approach-$benchmark-metrics-cpu-P$payload_size-$CLUSTER_1_NAME-$DATE".log
-    kubectl get --context "$CLUSTER_2_CONTEXT" --raw "/api/v1/nodes/$CLUSTER_2_CONTROL_PLANE_NAME/proxy/metrics/cadvisor" | grep '^container_cpu_usage_seconds_total{container="",cpu="total",id="/"' >>"./$RESULTS_DIR/$PROVIDER-$approach-$benchmark-metrics-cpu-P$payload_size-$CLUSTER_2_NAME-$DATE".log
-    while true; do
-        sleep 1
-        kubectl get --context "$CLUSTER_1_CONTEXT" --raw "/api/v1/nodes/$CLUSTER_1_CONTROL_PLANE_NAME/proxy/metrics/cadvisor" | grep '^container_memory_working_set_bytes{container="",id="/"' >> "./$RESULTS_DIR/$PROVIDER-$approach-$benchmark-metrics-memory-P$payload_size-$CLUSTER_1_NAME-$DATE".log
-        kubectl get --context "$CLUSTER_2_CONTEXT" --raw "/api/v1/nodes/$CLUSTER_2_CONTROL_PLANE_NAME/proxy/metrics/cadvisor" | grep '^container_memory_working_set_bytes{container="",id="/"' >> "./$RESULTS_DIR/$PROVIDER-$approach-$benchmark-metrics-memory-P$payload_size-$CLUSTER_2_NAME-$DATE".log
-        STATUS=$(kubectl get pod -n $benchmark -l $CLIENT_LABEL --context $CLUSTER_2_CONTEXT -o json | jq -r ".items[0].status.containerStatuses[] | select(.name==\"${benchmark}-client\") | .state.terminated")
-        if [[ "$STATUS" != "null" ]]; then
-            echo "$CLIENT_LABEL container has terminated."
-            break
-        fi
-    done
+    python3 ./orchestration/metrics_collector.py \
+        --cluster "$CLUSTER_1_NAME" "$CLUSTER_1_CONTEXT" "$CLUSTER_1_CONTROL_PLANE_NAME" \
+        --cluster "$CLUSTER_2_NAME" "$CLUSTER_2_CONTEXT" "$CLUSTER_2_CONTROL_PLANE_NAME" \
+        --watch "$CLUSTER_2_CONTEXT" "$benchmark" "$CLIENT_LABEL" "${benchmark}-client" \
+        --interval "$METRICS_INTERVAL" \
+        --log-pattern "./$RESULTS_DIR/$PROVIDER-$approach-$benchmark-{metric}-P$payload_size-{cluster}-C$CLUSTER_PAIR_ID-$DATE.log"
+    echo "$CLIENT_LABEL container has terminated."
+    phase log-collection
     for job in $(kubectl get jobs -n $benchmark -l $CLIENT_LABEL -o jsonpath='{.items[*].metadata.name}' --context="$CLUSTER_2_CONTEXT"); do
-        kubectl logs job/"$job" -n $benchmark -c "${benchmark}-client" --context="$CLUSTER_2_CONTEXT" >"./$RESULTS_DIR/$PROVIDER-$approach-$job-P$payload_size-$DATE".log
+        kubectl logs job/"$job" -n $benchmark -c "${benchmark}-client" --context="$CLUSTER_2_CONTEXT" >"./$RESULTS_DIR/$PROVIDER-$approach-$job-P$payload_size-C$CLUSTER_PAIR_ID-$DATE".log
     done
-    kubectl get --context "$CLUSTER_1_CONTEXT" --raw "/api/v1/nodes/$CLUSTER_1_CONTROL_PLANE_NAME/proxy/metrics/cadvisor" | grep '^container_cpu_usage_seconds_total{container="",cpu="total",id="/"' >>"./$RESULTS_DIR/$PROVIDER-$approach-$benchmark-metrics-cpu-P$payload_size-$CLUSTER_1_NAME-$DATE".log
-    kubectl get --context "$CLUSTER_2_CONTEXT" --raw "/api/v1/nodes/$CLUSTER_2_CONTROL_PLANE_NAME/proxy/metrics/cadvisor" | grep '^container_cpu_usage_seconds_total{container="",cpu="total",id="/"' >>"./$RESULTS_DIR/$PROVIDER-$approach-$benchmark-metrics-cpu-P$payload_size-$CLUSTER_2_NAME-$DATE".log
+    compress_logs ./"$RESULTS_DIR"/"$PROVIDER-$approach-"*"-$DATE.log"
+    phase
 
     if [[ "${WAIT_BEFORE_CLEANUP-0}" == "1" ]]; then
         info "[$PROVIDER $approach $benchmark $payload_size] Waiting for user input before cleanup"
@@ -152,58 +169,226 @@ function benchmark_approach() {
     fi
 
     info "[$PROVIDER $approach $benchmark $payload_size] Deleting namespace '$benchmark' in both clusters"
-    kubectl delete namespace "$benchmark" --context "$CLUSTER_1_CONTEXT" --ignore-not-found --wait
-    kubectl delete namespace "$benchmark" --context "$CLUSTER_2_CONTEXT" --ignore-not-found --wait
+    phase teardown
+    delete_benchmark_namespaces "$benchmark"
+    phase
 }
 
-function benchmarks() {
-    info "[$PROVIDER; $APPROACHES; $BENCHMARKS] Running benchmarks"
+function compress_logs() {
+    # The logs of a cell are compressed once they are complete, extract_data.py reads .log.gz and .log.zst directly
+    [[ -e "$1" ]] || return 0
+    case "$LOG_COMPRESSION" in
+    none) ;;
+    gzip) gzip -f "$@" ;;
+    zstd) zstd -q -f --rm "$@" ;;
+    *)
+        echo "Error: Unknown LOG_COMPRESSION '$LOG_COMPRESSION', use none, gzip or zstd"
+        exit 1
+        ;;
+    esac
+}
+
+function delete_benchmark_namespaces() {
+    local benchmark=$1
+    # Only starts the deletion in both clusters at once, the next cell waits for it where it has to
+    kubectl delete namespace "$benchmark" --context "$(cat $CONTEXT_1_FILE)" --ignore-not-found --wait=false &
+    local delete_1=$!
+    kubectl delete namespace "$benchmark" --context "$(cat $CONTEXT_2_FILE)" --ignore-not-found --wait=false &
+    local delete_2=$!
+    wait "$delete_1"
+    wait "$delete_2"
+}
+
+function wait_for_benchmark_namespaces() {
+    wait_ready --context "$(cat $CONTEXT_1_FILE)" --context "$(cat $CONTEXT_2_FILE)" --timeout "$RESOURCE_DELETE_TIMEOUT" \
+        namespaces-settled "$BENCHMARK_NAMESPACE_LABEL"
+}
+
+function payload_sizes() {
+    local benchmark=$1
+    if [[ "$benchmark" == *-pld ]]; then
+        echo "$PAYLOAD_SIZES"
+    elif [[ "$benchmark" == *-par ]]; then
+        echo "$IPERF_PARALLEL_STREAMS"
+    elif [[ "$benchmark" == *-rate ]]; then
+        echo "$WRK_RATES"
+    else
+        echo "none"
+    fi
+}
+
+function benchmark_cells() {
     for approach in $APPROACHES; do
-        info "[$PROVIDER $approach] Installing approach"
-        run_if_exists "$APPROACHES_DIR/$approach/install.sh"
+        for benchmark in $BENCHMARKS; do
+            for payload_size in $(payload_sizes "$benchmark"); do
+                echo "$approach $benchmark $payload_size"
+            done
+        done
+    done
+}
+
+function manifest() {
+    python3 ./orchestration/manifest.py "./$RESULTS_DIR/$MANIFEST_FILE" "$@"
+}
 
-        if [[ "$BENCHMARKS" == "none" ]]; then
+function benchmarks() {
+    info "[$PROVIDER; $APPROACHES; $BENCHMARKS] Running benchmarks"
+    if [[ "$BENCHMARKS" == "none" ]]; then
+        for approach in $APPROACHES; do
+            info "[$PROVIDER $approach] Installing approach"
+            run_if_exists "$APPROACHES_DIR/$approach/install.sh"
             info "[$PROVIDER $approach $BENCHMARKS] Skipping benchmark execution as 'none' is selected"
             read -p "Press key to continue.. " -n1 -s
             echo
+            info "[$PROVIDER $approach] Uninstalling approach"
+            run_if_exists "$APPROACHES_DIR/$approach/uninstall.sh"
+        done
+        return 0
+    fi
+    benchmark_cells | manifest plan --provider "$PROVIDER"
+    run_manifest
+}
+
+function resume() {
+    if [[ ! -f "./$RESULTS_DIR/$MANIFEST_FILE" ]]; then
+        echo "Error: No manifest at ./$RESULTS_DIR/$MANIFEST_FILE, start a run with 'benchmarks' first"
+        exit 1
+    fi
+    info "[$PROVIDER] Resuming benchmarks from ./$RESULTS_DIR/$MANIFEST_FILE"
+    manifest recover
+    run_manifest
+}
+
+function run_manifest() {
+    if [[ -n "$CLUSTER_PAIRS" ]]; then
+        local pair_args=()
+        for pair in $CLUSTER_PAIRS; do
+            local contexts="${pair#*:}"
+            pair_args+=(--pair "${pair%%:*}" "${contexts%%,*}" "${contexts#*,}")
+        done
+        python3 ./orchestration/scheduler.py --manifest "./$RESULTS_DIR/$MANIFEST_FILE" "${pair_args[@]}" \
+            --max-attempts "$MAX_CELL_ATTEMPTS" --pair-dir "./$RESULTS_DIR/pairs"
+    else
+        # Approaches without cells left to run are neither installed nor uninstalled
+        for approach in $(manifest approaches --max-attempts "$MAX_CELL_ATTEMPTS"); do
+            run_approach "$approach"
+        done
+    fi
+    info "[$PROVIDER] Benchmark run finished: $(manifest summary --max-attempts "$MAX_CELL_ATTEMPTS")"
+}
+
+function run_approach() {
+    local approach=$1
+    PHASE_CELL="$approach - -"
+    phase install
+    info "[$PROVIDER $approach] Installing approach on cluster pair $CLUSTER_PAIR_ID"
+    run_if_exists "$APPROACHES_DIR/$approach/install.sh"
+    phase
+
+    while cell=$(manifest claim "$approach" --max-attempts "$MAX_CELL_ATTEMPTS" --detail pair="$CLUSTER_PAIR_ID"); do
+        read -r benchmark payload_size <<<"$cell"
+        # A failing cell must not end the whole run, it runs in a subshell that still exits on the first error
+        set +o errexit
+        (
+            set -o errexit
+            benchmark_approach "$approach" "$benchmark" "$payload_size"
+        )
+        status=$?
+        set -o errexit
+        if ((status == 0)); then
+            manifest finish "$approach" "$benchmark" "$payload_size" done
         else
-            for benchmark in $BENCHMARKS; do
-                if [[ "$benchmark" == *-pld ]]; then
-                    INTERNAL_PAYLOAD_SIZES="$PAYLOAD_SIZES"
-                    info "[$PROVIDER $approach $benchmark] Using payload sizes: $INTERNAL_PAYLOAD_SIZES"
-                elif [[ "$benchmark" == *-par ]]; then
-                    INTERNAL_PAYLOAD_SIZES="$IPERF_PARALLEL_STREAMS"
-                    info "[$PROVIDER $approach $benchmark] Using parallel streams as payload sizes: $INTERNAL_PAYLOAD_SIZES"
-                else
-                    INTERNAL_PAYLOAD_SIZES="none"
-                    info "[$PROVIDER $approach $benchmark] Using no payload size: $INTERNAL_PAYLOAD_SIZES"
-                fi
-                for payload_size in $INTERNAL_PAYLOAD_SIZES; do
-                    benchmark_approach "$approach" "$benchmark" "$payload_size"
-                done
-            done
+            info "[$PROVIDER $approach $benchmark $payload_size] Failed with exit code $status"
+            manifest finish "$approach" "$benchmark" "$payload_size" failed --error "exit code $status"
+            delete_benchmark_namespaces "$benchmark" || true
         fi
-
-        info "[$PROVIDER $approach] Uninstalling approach"
-        run_if_exists "$APPROACHES_DIR/$approach/uninstall.sh"
     done
+
+    PHASE_CELL="$approach - -"
+    # The approach may only go once the namespaces of its last cells are gone
+    phase teardown-wait
+    wait_for_benchmark_namespaces
+    phase uninstall
+    info "[$PROVIDER $approach] Uninstalling approach"
+    run_if_exists "$APPROACHES_DIR/$approach/uninstall.sh"
+    phase
 }
 
 function plot() {
     local input_folder="$1"
     info "[$BENCHMARKS] Preparing plot"
     source ./plotting/.venv/bin/activate
-    for benchmark in $BENCHMARKS; do
-        for metric in "bench" "memory" "cpu"; do
-            info "[$benchmark $metric] Plotting results"
-            mkdir -p plotting/results
-            (cd ./plotting && python3 plots.py "../$input_folder" "$benchmark" "$metric" "$RESULTS_DIR")
-        done
+    mkdir -p plotting/"$RESULTS_DIR"
+    info "[$input_folder] Extracting results"
+    (cd ./plotting && python3 extract_data.py "../$input_folder" --output "../$input_folder/data.arrow" --cache "../$input_folder/parse-cache.sqlite")
+    info "[$BENCHMARKS] Plotting results"
+    # shellcheck disable=SC2086
+    (cd ./plotting && python3 plots.py "../$input_folder/data.arrow" --benchmarks $BENCHMARKS --output-dir "$RESULTS_DIR")
+}
+
+function plot_merged() {
+    info "[$BENCHMARKS] Preparing plot of $# merged results"
+    source ./plotting/.venv/bin/activate
+    mkdir -p plotting/"$RESULTS_DIR"
+    local sketch_files=()
+    for input_folder in "$@"; do
+        info "[$input_folder] Sketching results"
+        (cd ./plotting && python3 extract_data.py "../$input_folder" --sketches "../$input_folder/data.sketch.json" --cache "../$input_folder/parse-cache.sqlite")
+        sketch_files+=("../$input_folder/data.sketch.json")
+    done
+    (cd ./plotting && python3 sketch.py "${sketch_files[@]}" --output "$RESULTS_DIR/merged.sketch.json")
+    info "[$BENCHMARKS] Plotting merged results"
+    # shellcheck disable=SC2086
+    (cd ./plotting && python3 plots.py "$RESULTS_DIR/merged.sketch.json" --benchmarks $BENCHMARKS --output-dir "$RESULTS_DIR")
+}
+
+function compare() {
+    local baseline_folder="$1"
+    local candidate_folder="$2"
+    source ./plotting/.venv/bin/activate
+    mkdir -p plotting/"$RESULTS_DIR"
+    for input_folder in "$baseline_folder" "$candidate_folder"; do
+        info "[$input_folder] Extracting results"
+        (cd ./plotting && python3 extract_data.py "../$input_folder" --output "../$input_folder/data.arrow" --cache "../$input_folder/parse-cache.sqlite")
     done
+    info "[$baseline_folder -> $candidate_folder] Comparing results"
+    (cd ./plotting && python3 compare.py "../$baseline_folder/data.arrow" "../$candidate_folder/data.arrow" --output-dir "$RESULTS_DIR")
+}
+
+function ingest() {
+    local input_folder="$1"
+    source ./plotting/.venv/bin/activate
+    info "[$input_folder] Ingesting results into $RESULTS_DB_FILE"
+    (cd ./plotting && python3 results_db.py "../$RESULTS_DB_FILE" ingest "../$input_folder" --cache "../$input_folder/parse-cache.sqlite")
 }
 
 ### UTILITY FUNCTIONS ###
 
+function phase() {
+    # Ends the running phase and starts the named one, without a name only ends it. Durations are logged and
+    # appended to PHASE_TIMINGS_FILE, so the time spent per phase can be compared across runs. PHASE_TRACE_FILE gets
+    # the same phase as a Chrome trace event, plotting/tracing.py merges it with the traces of the analysis.
+    local now=$EPOCHREALTIME
+    if [[ -n "${PHASE_NAME-}" ]]; then
+        local seconds start_us duration_us
+        read -r seconds start_us duration_us < <(awk -v start="$PHASE_STARTED" -v end="$now" 'BEGIN { printf "%.3f %.0f %.0f\n", end - start, start * 1000000, (end - start) * 1000000 }')
+        info "[$PROVIDER $PHASE_CELL] Phase $PHASE_NAME took ${seconds}s"
+        mkdir -p ./"$RESULTS_DIR"
+        printf '%s\t%s\t%s\t%s\t%s\t%s\n' "$(date +%Y-%m-%dT%H:%M:%S)" "$CLUSTER_PAIR_ID" "$PROVIDER" "${PHASE_CELL// /$'\t'}" \
+            "$PHASE_NAME" "$seconds" >>"./$RESULTS_DIR/$PHASE_TIMINGS_FILE"
+        local approach benchmark payload_size
+        read -r approach benchmark payload_size <<<"$PHASE_CELL"
+        printf '{"name": "%s", "cat": "phase", "ph": "X", "ts": %s, "dur": %s, "pid": "pair %s", "tid": "%s", "args": {"provider": "%s", "benchmark": "%s", "payload_size": "%s"}}\n' \
+            "$PHASE_NAME" "$start_us" "$duration_us" "$CLUSTER_PAIR_ID" "$approach" "$PROVIDER" "$benchmark" "$payload_size" >>"./$RESULTS_DIR/$PHASE_TRACE_FILE"
+    fi
+    PHASE_NAME=${1-}
+    PHASE_STARTED=$now
+}
+
+function wait_ready() {
+    python3 ./orchestration/readiness.py "$@"
+}
+
 function run_if_exists() {
     local script_path="$1"
     local mode="${2-}"
@@ -268,10 +453,30 @@ if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
         shift
         benchmarks
         ;;
+    resume)
+        shift
+        resume
+        ;;
+    run-approach)
+        shift
+        run_approach "$1"
+        ;;
     plot)
         shift
         plot "$@"
         ;;
+    plot-merged)
+        shift
+        plot_merged "$@"
+        ;;
+    compare)
+        shift
+        compare "$@"
+        ;;
+    ingest)
+        shift
+        ingest "$@"
+        ;;
     help | "")
         show_help
         ;;
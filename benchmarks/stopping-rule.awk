@@ -0,0 +1,50 @@
+# Sequential stopping rule for the benchmark clients, mounted into the client pods as a ConfigMap.
+# Reads one sample per line (the trailing number of the line, e.g. "time_total=0.012s" or "Requests/sec: 5400.12")
+# and exits 0 once at least min_n samples were collected and the 95% confidence interval of the chosen statistic
+# is narrower than rel_width times its estimate, 1 otherwise.
+#   statistic=median  distribution-free interval from order statistics, for latencies
+#   statistic=mean    normal approximation, for throughputs
+# Written for busybox awk, so no gawk extensions (asort) are used.
+
+BEGIN {
+    z = 1.96
+    n = 0
+}
+
+{
+    value = $NF
+    sub(/^[^0-9.]*/, "", value)
+    if (value != "") {
+        samples[++n] = value + 0
+    }
+}
+
+END {
+    if (n < min_n || n < 3) {
+        exit 1
+    }
+    if (statistic == "mean") {
+        sum = 0
+        for (i = 1; i <= n; i++) sum += samples[i]
+        center = sum / n
+        squares = 0
+        for (i = 1; i <= n; i++) squares += (samples[i] - center) ^ 2
+        width = 2 * z * sqrt(squares / (n - 1) / n)
+    } else {
+        for (i = 2; i <= n; i++) {
+            value = samples[i]
+            for (j = i - 1; j >= 1 && samples[j] > value; j--) samples[j + 1] = samples[j]
+            samples[j + 1] = value
+        }
+        center = n % 2 ? samples[(n + 1) / 2] : (samples[n / 2] + samples[n / 2 + 1]) / 2
+        lower = int(n / 2 - z * sqrt(n) / 2)
+        upper = int(n / 2 + z * sqrt(n) / 2 + 1) + 1
+        if (lower < 1) lower = 1
+        if (upper > n) upper = n
+        width = samples[upper] - samples[lower]
+    }
+    if (center != 0 && width / (center < 0 ? -center : center) <= rel_width) {
+        exit 0
+    }
+    exit 1
+}
@@ -3,6 +3,8 @@
 GREEN="\e[32m"
 BLUE="\e[34m"
 ENDCOLOR="\e[0m"
+# helper.sh is sourced from the approach directories as well, the orchestration scripts are found relative to it
+ORCHESTRATION_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)/orchestration"
 
 function info() {
     echo -e "${BLUE}$(date '+%Y-%m-%d %H:%M:%S') ${1}${ENDCOLOR}"
@@ -16,24 +18,13 @@ wait_for_gateway() {
     local namespace=$1
     local name=$2
     local context=$3
-    local timeout=100
-    local interval=1
-    local elapsed=0
+    local address
 
-    while true; do
-        external_ip=$(kubectl --context="$context" -n "$namespace" get svc "$name" -o jsonpath='{.status.loadBalancer.ingress[0].ip}' 2>/dev/null || echo "")
-        hostname=$(kubectl --context="$context" -n "$namespace" get svc "$name" -o jsonpath='{.status.loadBalancer.ingress[0].hostname}' 2>/dev/null || echo "")
-        if [[ -n "$external_ip" || -n "$hostname" ]]; then
-            approachinfo "Gateway in context $context is ready: ${external_ip:-$hostname}"
-            break
-        fi
-        if ((elapsed >= timeout)); then
-            echo "Timeout waiting for external IP/hostname for gateway in context $context"
-            exit 1
-        fi
-        sleep "$interval"
-        ((elapsed += interval))
-    done
+    if ! address=$(python3 "$ORCHESTRATION_DIR/readiness.py" --context "$context" --timeout 100s service-address "$namespace" "$name"); then
+        echo "No external IP/hostname for gateway in context $context"
+        exit 1
+    fi
+    approachinfo "Gateway in context $context is ready: $address"
 }
 
 if [[ $SET_NETWORK_PREFIX == "auto" ]]; then
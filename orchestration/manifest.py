@@ -0,0 +1,230 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from typing import Iterator
+import argparse
+import fcntl
+import json
+import logging
+import os
+import sys
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class Cell:
+    approach: str
+    benchmark: str
+    payload_size: str
+    state: str = PENDING
+    attempts: int = 0
+    started: str | None = None
+    finished: str | None = None
+    # Extra fields set by whoever runs the cell, e.g. the cluster pair it ran on
+    details: dict = field(default_factory=dict)
+
+    def runnable(self, max_attempts: int) -> bool:
+        return self.state == PENDING or (self.state == FAILED and self.attempts < max_attempts)
+
+
+@dataclass
+class Manifest:
+    provider: str
+    created: str
+    cells: list[Cell]
+
+    def find(self, approach: str, benchmark: str, payload_size: str) -> Cell:
+        for cell in self.cells:
+            if (cell.approach, cell.benchmark, cell.payload_size) == (approach, benchmark, payload_size):
+                return cell
+        raise KeyError(f"No cell {approach} {benchmark} {payload_size} in manifest")
+
+
+def now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def read_manifest(path: str) -> Manifest:
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version {data.get('version')} in {path}")
+    return Manifest(provider=data["provider"], created=data["created"], cells=[Cell(**cell) for cell in data["cells"]])
+
+
+def write_manifest(path: str, manifest: Manifest):
+    # Written to a temporary file next to the manifest and renamed over it, a crash leaves either the old or the
+    # new manifest but never a truncated one
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".manifest-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({"version": MANIFEST_VERSION, **asdict(manifest)}, f, indent=2)
+            f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    # Several runners may share one manifest, every read-modify-write holds an exclusive lock
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@contextmanager
+def updating(path: str) -> Iterator[Manifest]:
+    with locked(path):
+        manifest = read_manifest(path)
+        yield manifest
+        write_manifest(path, manifest)
+
+
+def plan(path: str, provider: str, cells: list[tuple[str, str, str]]):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with locked(path):
+        manifest = Manifest(provider=provider, created=now(), cells=[Cell(*cell) for cell in dict.fromkeys(cells)])
+        write_manifest(path, manifest)
+    logger.info(f"Planned {len(manifest.cells)} cells in {path}")
+
+
+def recover(path: str, approach: str | None = None) -> int:
+    # Cells still running belong to a run that was interrupted, they count as a failed attempt
+    with updating(path) as manifest:
+        interrupted = [cell for cell in manifest.cells if cell.state == RUNNING and approach in (None, cell.approach)]
+        for cell in interrupted:
+            cell.state = FAILED
+            cell.finished = now()
+            cell.details["error"] = "interrupted"
+    if interrupted:
+        logger.info(f"Marked {len(interrupted)} interrupted cells as failed")
+    return len(interrupted)
+
+
+def remaining_approaches(path: str, max_attempts: int) -> list[str]:
+    with locked(path):
+        manifest = read_manifest(path)
+    return list(dict.fromkeys(cell.approach for cell in manifest.cells if cell.runnable(max_attempts)))
+
+
+def cell_attempts(path: str, approach: str) -> int:
+    with locked(path):
+        manifest = read_manifest(path)
+    return sum(cell.attempts for cell in manifest.cells if cell.approach == approach)
+
+
+def claim(path: str, approach: str, max_attempts: int, details: dict | None = None) -> Cell | None:
+    # Pending cells first, then failed ones that have attempts left
+    with updating(path) as manifest:
+        candidates = [cell for cell in manifest.cells if cell.approach == approach and cell.runnable(max_attempts)]
+        if not candidates:
+            return None
+        cell = min(candidates, key=lambda cell: cell.state != PENDING)
+        cell.state = RUNNING
+        cell.attempts += 1
+        cell.started = now()
+        cell.finished = None
+        cell.details.pop("error", None)
+        cell.details.update(details or {})
+        return cell
+
+
+def finish(path: str, approach: str, benchmark: str, payload_size: str, state: str, error: str | None = None):
+    with updating(path) as manifest:
+        cell = manifest.find(approach, benchmark, payload_size)
+        cell.state = state
+        cell.finished = now()
+        if error:
+            cell.details["error"] = error
+
+
+def summary(path: str, max_attempts: int) -> dict[str, int]:
+    with locked(path):
+        manifest = read_manifest(path)
+    counts = {state: 0 for state in [PENDING, RUNNING, DONE, FAILED]}
+    for cell in manifest.cells:
+        counts[cell.state] += 1
+    counts["exhausted"] = sum(cell.state == FAILED and not cell.runnable(max_attempts) for cell in manifest.cells)
+    return counts
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Track the state of every approach x benchmark x payload size cell of a benchmark run")
+    parser.add_argument("manifest", help="manifest JSON file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    plan_parser = subparsers.add_parser("plan", help="start a new manifest with all cells pending, cells are read as 'APPROACH BENCHMARK PAYLOAD_SIZE' lines from stdin")
+    plan_parser.add_argument("--provider", required=True)
+    recover_parser = subparsers.add_parser("recover", help="mark cells left running by an interrupted run as failed")
+    recover_parser.add_argument("--approach", help="only cells of this approach")
+
+    approaches_parser = subparsers.add_parser("approaches", help="print the approaches that still have cells to run")
+    approaches_parser.add_argument("--max-attempts", type=int, default=1)
+
+    claim_parser = subparsers.add_parser("claim", help="mark the next cell of an approach as running and print 'BENCHMARK PAYLOAD_SIZE', exits 1 if none is left")
+    claim_parser.add_argument("approach")
+    claim_parser.add_argument("--max-attempts", type=int, default=1)
+    claim_parser.add_argument("--detail", action="append", default=[], metavar="KEY=VALUE", help="record a detail of the attempt in the cell")
+
+    finish_parser = subparsers.add_parser("finish", help="record the outcome of a cell")
+    finish_parser.add_argument("approach")
+    finish_parser.add_argument("benchmark")
+    finish_parser.add_argument("payload_size")
+    finish_parser.add_argument("state", choices=[DONE, FAILED])
+    finish_parser.add_argument("--error", help="reason of a failure")
+
+    summary_parser = subparsers.add_parser("summary", help="print the number of cells per state")
+    summary_parser.add_argument("--max-attempts", type=int, default=1)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        if args.command == "plan":
+            cells = [tuple(line.split()) for line in sys.stdin if line.strip()]
+            invalid = [cell for cell in cells if len(cell) != 3]
+            if invalid:
+                logger.error(f"Cells need exactly 3 fields: {' '.join(invalid[0])}")
+                sys.exit(2)
+            plan(args.manifest, args.provider, cells)
+        elif args.command == "recover":
+            recover(args.manifest, args.approach)
+        elif args.command == "approaches":
+            print("\n".join(remaining_approaches(args.manifest, args.max_attempts)))
+        elif args.command == "claim":
+            details = dict(detail.partition("=")[::2] for detail in args.detail)
+            cell = claim(args.manifest, args.approach, args.max_attempts, details)
+            if cell is None:
+                sys.exit(1)
+            print(cell.benchmark, cell.payload_size)
+        elif args.command == "finish":
+            finish(args.manifest, args.approach, args.benchmark, args.payload_size, args.state, args.error)
+        elif args.command == "summary":
+            print(" ".join(f"{state}={count}" for state, count in summary(args.manifest, args.max_attempts).items()))
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Manifest {args.manifest}: {e}")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO, stream=sys.stderr)
+    main()
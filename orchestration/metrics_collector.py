@@ -0,0 +1,308 @@
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import AsyncIterator
+from urllib.parse import quote, urlsplit
+import argparse
+import asyncio
+import json
+import logging
+import re
+import sys
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Root cgroup series, the whole node
+root_metrics = {
+    "metrics-cpu": 'container_cpu_usage_seconds_total{container="",cpu="total",id="/"',
+    "metrics-memory": 'container_memory_working_set_bytes{container="",id="/"',
+}
+
+# All per-container series, so the extractor can attribute usage to data plane components
+component_metrics = {
+    "components-cpu": "container_cpu_usage_seconds_total{",
+    "components-memory": "container_memory_working_set_bytes{",
+}
+
+# Watches are renewed regularly, so a silently dropped connection cannot stall the collector for long
+WATCH_TIMEOUT_SECONDS = 60
+
+KUBECTL_PROXY_READY = re.compile(r"Starting to serve on [^:]+:(\d+)")
+
+
+class HttpError(Exception):
+    pass
+
+
+class HttpConnection:
+    # Minimal HTTP/1.1 client that keeps one connection open across requests, enough for the plain HTTP
+    # endpoint of kubectl proxy (or a local stand-in server)
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+
+    async def _connect(self):
+        if self.writer is None or self.writer.is_closing():
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.reader = self.writer = None
+
+    async def _send(self, path: str) -> tuple[int, dict[str, str]]:
+        await self._connect()
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nAccept: */*\r\n\r\n".encode())
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before response")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def _body(self, headers: dict[str, str]) -> AsyncIterator[bytes]:
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # Trailer section ends with an empty line
+                    while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                yield await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining > 0:
+                chunk = await self.reader.read(min(remaining, 64 * 1024))
+                if not chunk:
+                    raise ConnectionResetError("connection closed in the middle of the body")
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            while chunk := await self.reader.read(64 * 1024):
+                yield chunk
+        if headers.get("connection", "").lower() == "close" or ("transfer-encoding" not in headers and "content-length" not in headers):
+            await self.close()
+
+    async def stream(self, path: str) -> AsyncIterator[bytes]:
+        try:
+            status, headers = await self._send(path)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # The server may have closed an idle keep-alive connection, retry once on a fresh one
+            await self.close()
+            status, headers = await self._send(path)
+        if status != 200:
+            body = b"".join([chunk async for chunk in self._body(headers)])
+            raise HttpError(f"GET {path} returned {status}: {body[:200].decode(errors='replace')}")
+        try:
+            async for chunk in self._body(headers):
+                yield chunk
+        except BaseException:
+            # An abandoned response leaves unread bytes on the connection, it cannot be reused
+            await self.close()
+            raise
+
+    async def get(self, path: str) -> bytes:
+        return b"".join([chunk async for chunk in self.stream(path)])
+
+
+async def start_kubectl_proxy(context: str) -> tuple[asyncio.subprocess.Process, str]:
+    process = await asyncio.create_subprocess_exec(
+        "kubectl", "proxy", "--context", context, "--port=0",
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+    )
+    while line := await process.stdout.readline():
+        match = KUBECTL_PROXY_READY.search(line.decode())
+        if match:
+            return process, f"http://127.0.0.1:{match.group(1)}"
+    raise RuntimeError(f"kubectl proxy for context {context} exited with {await process.wait()}")
+
+
+@dataclass
+class ClusterTarget:
+    name: str
+    context: str
+    node: str
+
+
+@dataclass
+class WatchTarget:
+    context: str
+    namespace: str
+    label_selector: str
+    container: str
+
+
+def select_metric_lines(lines: list[str], prefix: str, timestamp_ms: int) -> list[str]:
+    selected = []
+    for line in lines:
+        if not line.startswith(prefix):
+            continue
+        # cadvisor may omit the sample timestamp, the scrape time keeps the "<value> <timestamp>" layout the parsers expect
+        if len(line[line.rfind("}") + 1:].split()) == 1:
+            line = f"{line} {timestamp_ms}"
+        selected.append(line)
+    return selected
+
+
+def select_component_lines(lines: list[str], prefix: str, timestamp_ms: int) -> list[str]:
+    # Every scrape starts with a marker line, the per-container samples of one scrape belong together
+    selected = [f"# scrape {timestamp_ms}"]
+    selected.extend(line for line in lines if line.startswith(prefix) and 'container=""' not in line)
+    return selected
+
+
+class ClusterScraper:
+    def __init__(self, target: ClusterTarget, api_url: str, log_pattern: str):
+        url = urlsplit(api_url)
+        self.target = target
+        self.connection = HttpConnection(url.hostname, url.port or 80)
+        self.path = f"{url.path.rstrip('/')}/api/v1/nodes/{quote(target.node)}/proxy/metrics/cadvisor"
+        self.logs = {
+            metric: open(log_pattern.format(metric=metric, cluster=target.name), "a")
+            for metric in [*root_metrics, *component_metrics]
+        }
+
+    async def scrape(self, metrics: list[str]):
+        body = await self.connection.get(self.path)
+        timestamp_ms = int(time.time() * 1000)
+        all_lines = body.decode().splitlines()
+        for metric in metrics:
+            if metric in component_metrics:
+                lines = select_component_lines(all_lines, component_metrics[metric], timestamp_ms)
+            else:
+                lines = select_metric_lines(all_lines, root_metrics[metric], timestamp_ms)
+                if not lines:
+                    logger.warning(f"No {root_metrics[metric]} sample in cadvisor metrics of {self.target.name}")
+            log = self.logs[metric]
+            log.writelines(f"{line}\n" for line in lines)
+            log.flush()
+
+    async def close(self):
+        await self.connection.close()
+        for log in self.logs.values():
+            log.close()
+
+
+def container_terminated(pod: dict, container: str) -> bool:
+    for status in pod.get("status", {}).get("containerStatuses") or []:
+        if status.get("name") == container and status.get("state", {}).get("terminated"):
+            return True
+    return False
+
+
+async def watch_events(connection: HttpConnection, path: str) -> AsyncIterator[dict]:
+    # Watch responses are a stream of JSON documents, one per line
+    buffer = b""
+    async with aclosing(connection.stream(path)) as chunks:
+        async for chunk in chunks:
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+
+
+async def watch_until_terminated(target: WatchTarget, api_url: str):
+    url = urlsplit(api_url)
+    connection = HttpConnection(url.hostname, url.port or 80)
+    base_path = f"{url.path.rstrip('/')}/api/v1/namespaces/{quote(target.namespace)}/pods?labelSelector={quote(target.label_selector)}"
+    try:
+        while True:
+            # List first so a container that terminated before the watch started is not missed
+            pods = json.loads(await connection.get(base_path))
+            if any(container_terminated(pod, target.container) for pod in pods.get("items", [])):
+                return
+            resource_version = pods.get("metadata", {}).get("resourceVersion", "")
+            watch_path = f"{base_path}&watch=true&resourceVersion={quote(resource_version)}&timeoutSeconds={WATCH_TIMEOUT_SECONDS}"
+            async with aclosing(watch_events(connection, watch_path)) as events:
+                async for event in events:
+                    if event.get("type") == "ERROR":
+                        # e.g. 410 Gone for an expired resource version, start over with a fresh list
+                        logger.info(f"Watch of {target.label_selector} ended: {event.get('object', {}).get('message')}")
+                        break
+                    if container_terminated(event.get("object", {}), target.container):
+                        return
+            # The API server also ends watches after a timeout, both cases resume from a fresh list
+    finally:
+        await connection.close()
+
+
+async def collect(clusters: list[ClusterTarget], watch: WatchTarget, interval: float, log_pattern: str, api_urls: dict[str, str]):
+    proxies = []
+    try:
+        for context in {cluster.context for cluster in clusters} | {watch.context}:
+            if context not in api_urls:
+                process, api_urls[context] = await start_kubectl_proxy(context)
+                proxies.append(process)
+        scrapers = [ClusterScraper(cluster, api_urls[cluster.context], log_pattern) for cluster in clusters]
+        try:
+            # CPU counters are sampled as often as memory, so usage can be resolved over time instead of only
+            # between the first and the last scrape
+            metrics = [*root_metrics, *component_metrics]
+            await asyncio.gather(*(scraper.scrape(metrics) for scraper in scrapers))
+            watcher = asyncio.create_task(watch_until_terminated(watch, api_urls[watch.context]))
+            next_scrape = time.monotonic()
+            samples = 0
+            while True:
+                # Scrapes are scheduled on a fixed grid, so a slow scrape does not shift all later ones
+                next_scrape += interval
+                done, _ = await asyncio.wait({watcher}, timeout=max(0.0, next_scrape - time.monotonic()))
+                if done:
+                    watcher.result()
+                    break
+                await asyncio.gather(*(scraper.scrape(metrics) for scraper in scrapers))
+                samples += 1
+            logger.info(f"Container {watch.container} terminated after {samples} samples")
+            await asyncio.gather(*(scraper.scrape(metrics) for scraper in scrapers))
+        finally:
+            for scraper in scrapers:
+                await scraper.close()
+    finally:
+        for process in proxies:
+            process.terminate()
+            await process.wait()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Scrape cadvisor metrics of the clusters until the benchmark client terminates")
+    parser.add_argument("--cluster", nargs=3, action="append", required=True, metavar=("NAME", "CONTEXT", "NODE"), help="cluster to scrape, NAME is used in the log file name")
+    parser.add_argument("--watch", nargs=4, required=True, metavar=("CONTEXT", "NAMESPACE", "LABEL_SELECTOR", "CONTAINER"), help="stop once this container of the selected pod has terminated")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between scrapes (default: 1)")
+    parser.add_argument("--log-pattern", required=True, help="log file path with {metric} and {cluster} placeholders")
+    parser.add_argument("--api-url", action="append", default=[], metavar="CONTEXT=URL", help="use this API endpoint for a context instead of starting kubectl proxy")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    api_urls = {}
+    for api_url in args.api_url:
+        context, _, url = api_url.partition("=")
+        api_urls[context] = url
+    clusters = [ClusterTarget(name=name, context=context, node=node) for name, context, node in args.cluster]
+    try:
+        asyncio.run(collect(clusters, WatchTarget(*args.watch), args.interval, args.log_pattern, api_urls))
+    except (HttpError, OSError, RuntimeError) as e:
+        logger.error(f"Metrics collection failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
+    main()
@@ -0,0 +1,173 @@
+from contextlib import aclosing
+from typing import Callable
+from urllib.parse import quote, urlsplit
+import argparse
+import asyncio
+import json
+import logging
+import re
+import sys
+
+from metrics_collector import HttpConnection, HttpError, WATCH_TIMEOUT_SECONDS, start_kubectl_proxy, watch_events
+
+
+logger = logging.getLogger(__name__)
+
+DURATION = re.compile(r"(\d+(?:\.\d+)?)([smh]?)")
+DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600}
+
+# Evaluated on all objects of a watched collection by name, returns what to print once the wait is over, None to keep waiting
+Condition = Callable[[dict[str, dict]], str | None]
+
+
+def parse_duration(duration: str) -> float:
+    # Same notation as the kubectl --timeout flags, e.g. "100s" or "2m"
+    match = DURATION.fullmatch(duration.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid duration '{duration}'")
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def pod_ready(pod: dict) -> bool:
+    status = pod.get("status", {})
+    # A job pod may already be done by the time it is first seen, it will not become ready anymore
+    if status.get("phase") == "Succeeded":
+        return True
+    return any(condition.get("type") == "Ready" and condition.get("status") == "True" for condition in status.get("conditions") or [])
+
+
+def pods_ready(pods: dict[str, dict]) -> str | None:
+    # Like kubectl wait --for=condition=Ready, but an empty selection keeps waiting for the pods to be created
+    if pods and all(pod_ready(pod) for pod in pods.values()):
+        return " ".join(sorted(pods))
+    return None
+
+
+def service_address(services: dict[str, dict]) -> str | None:
+    for service in services.values():
+        for ingress in service.get("status", {}).get("loadBalancer", {}).get("ingress") or []:
+            address = ingress.get("ip") or ingress.get("hostname")
+            if address:
+                return address
+    return None
+
+
+def deleted(objects: dict[str, dict]) -> str | None:
+    return "" if not objects else None
+
+
+def settled(objects: dict[str, dict]) -> str | None:
+    # None of the objects is still being deleted
+    return "" if not any(obj.get("metadata", {}).get("deletionTimestamp") for obj in objects.values()) else None
+
+
+async def watch_until(api_url: str, path: str, condition: Condition) -> str:
+    url = urlsplit(api_url)
+    connection = HttpConnection(url.hostname, url.port or 80)
+    base_path = f"{url.path.rstrip('/')}{path}"
+    separator = "&" if "?" in base_path else "?"
+    try:
+        while True:
+            # List first so a state reached before the watch started is not missed
+            listing = json.loads(await connection.get(base_path))
+            objects = {obj["metadata"]["name"]: obj for obj in listing.get("items", [])}
+            result = condition(objects)
+            if result is not None:
+                return result
+            resource_version = listing.get("metadata", {}).get("resourceVersion", "")
+            watch_path = f"{base_path}{separator}watch=true&resourceVersion={quote(resource_version)}&timeoutSeconds={WATCH_TIMEOUT_SECONDS}"
+            async with aclosing(watch_events(connection, watch_path)) as events:
+                async for event in events:
+                    obj = event.get("object", {})
+                    if event.get("type") == "ERROR":
+                        # e.g. 410 Gone for an expired resource version, start over with a fresh list
+                        logger.info(f"Watch of {path} ended: {obj.get('message')}")
+                        break
+                    name = obj.get("metadata", {}).get("name")
+                    if event.get("type") == "DELETED":
+                        objects.pop(name, None)
+                    elif event.get("type") in ("ADDED", "MODIFIED"):
+                        objects[name] = obj
+                    result = condition(objects)
+                    if result is not None:
+                        return result
+            # The API server also ends watches after a timeout, both cases resume from a fresh list
+    finally:
+        await connection.close()
+
+
+async def wait(contexts: list[str], path: str, condition: Condition, timeout: float, api_urls: dict[str, str]) -> list[str]:
+    proxies = []
+    try:
+        for context in contexts:
+            if context not in api_urls:
+                process, api_urls[context] = await start_kubectl_proxy(context)
+                proxies.append(process)
+        # All contexts are waited for at once, e.g. a namespace being deleted in both clusters
+        return await asyncio.wait_for(
+            asyncio.gather(*(watch_until(api_urls[context], path, condition) for context in contexts)),
+            timeout,
+        )
+    finally:
+        for process in proxies:
+            process.terminate()
+            await process.wait()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Wait for Kubernetes objects to reach a state by watching them instead of polling")
+    parser.add_argument("--context", action="append", required=True, help="context to wait in, repeat to wait in several clusters at once")
+    parser.add_argument("--timeout", type=parse_duration, default=parse_duration("100s"), help="give up after this long, e.g. 100s or 5m (default: 100s)")
+    parser.add_argument("--api-url", action="append", default=[], metavar="CONTEXT=URL", help="use this API endpoint for a context instead of starting kubectl proxy")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pods_parser = subparsers.add_parser("pods-ready", help="wait until the selected pods exist and all are ready, prints their names")
+    pods_parser.add_argument("namespace")
+    pods_parser.add_argument("selector")
+
+    service_parser = subparsers.add_parser("service-address", help="wait until a load balancer service has an external address and print it")
+    service_parser.add_argument("namespace")
+    service_parser.add_argument("name")
+
+    deleted_parser = subparsers.add_parser("namespace-deleted", help="wait until a namespace is gone")
+    deleted_parser.add_argument("name")
+
+    settled_parser = subparsers.add_parser("namespaces-settled", help="wait until no namespace matching the selector is being deleted")
+    settled_parser.add_argument("selector")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    api_urls = {}
+    for api_url in args.api_url:
+        context, _, url = api_url.partition("=")
+        api_urls[context] = url
+    if args.command == "pods-ready":
+        path = f"/api/v1/namespaces/{quote(args.namespace)}/pods?labelSelector={quote(args.selector)}"
+        condition, description = pods_ready, f"pods {args.selector} in namespace {args.namespace} to be ready"
+    elif args.command == "service-address":
+        path = f"/api/v1/namespaces/{quote(args.namespace)}/services?fieldSelector={quote(f'metadata.name={args.name}')}"
+        condition, description = service_address, f"an address of service {args.name} in namespace {args.namespace}"
+    elif args.command == "namespace-deleted":
+        path = f"/api/v1/namespaces?fieldSelector={quote(f'metadata.name={args.name}')}"
+        condition, description = deleted, f"namespace {args.name} to be deleted"
+    else:
+        path = f"/api/v1/namespaces?labelSelector={quote(args.selector)}"
+        condition, description = settled, f"namespaces {args.selector} to finish deleting"
+    try:
+        results = asyncio.run(wait(args.context, path, condition, args.timeout, api_urls))
+    except asyncio.TimeoutError:
+        logger.error(f"Timed out after {args.timeout:g}s waiting for {description} in {', '.join(args.context)}")
+        sys.exit(1)
+    except (HttpError, OSError, RuntimeError) as e:
+        logger.error(f"Waiting for {description} failed: {e}")
+        sys.exit(1)
+    for result in results:
+        if result:
+            print(result)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO, stream=sys.stderr)
+    main()
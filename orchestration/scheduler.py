@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from manifest import cell_attempts, recover, remaining_approaches, summary
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RUNNER = ["./benchmarks.sh", "run-approach"]
+
+
+@dataclass
+class ClusterPair:
+    id: str
+    context_1: str
+    context_2: str
+
+
+@dataclass
+class WorkUnit:
+    approach: str
+    attempts: int = 0
+    # Failed runs that did not get to claim a cell, e.g. because the approach failed to install
+    setup_failures: int = 0
+
+
+def write_context_files(pair: ClusterPair, pair_dir: str) -> tuple[str, str]:
+    # The benchmark and approach scripts read the contexts from files named in CONTEXT_1_FILE/CONTEXT_2_FILE
+    directory = os.path.join(pair_dir, pair.id)
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for name, context in [("context-1.txt", pair.context_1), ("context-2.txt", pair.context_2)]:
+        path = os.path.join(directory, name)
+        with open(path, "w") as f:
+            f.write(f"{context}\n")
+        files.append(path)
+    return files[0], files[1]
+
+
+async def run_unit(pair: ClusterPair, unit: WorkUnit, runner: list[str], env: dict[str, str]) -> int:
+    process = await asyncio.create_subprocess_exec(
+        *runner, unit.approach,
+        env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+    )
+    # Output of all pairs ends up interleaved on one terminal, every line is tagged with its pair
+    while line := await process.stdout.readline():
+        sys.stdout.write(f"[{pair.id}] {line.decode(errors='replace')}")
+        sys.stdout.flush()
+    return await process.wait()
+
+
+async def pair_worker(pair: ClusterPair, queue: asyncio.Queue, manifest: str, max_attempts: int, runner: list[str], pair_dir: str):
+    context_1_file, context_2_file = write_context_files(pair, pair_dir)
+    env = {**os.environ, "CLUSTER_PAIR_ID": pair.id, "CONTEXT_1_FILE": context_1_file, "CONTEXT_2_FILE": context_2_file}
+    while True:
+        unit = await queue.get()
+        try:
+            unit.attempts += 1
+            logger.info(f"[{pair.id}] Running approach {unit.approach} (attempt {unit.attempts})")
+            attempts_before = cell_attempts(manifest, unit.approach)
+            returncode = await run_unit(pair, unit, runner, env)
+            if returncode == 0:
+                logger.info(f"[{pair.id}] Approach {unit.approach} finished")
+                continue
+            logger.error(f"[{pair.id}] Approach {unit.approach} exited with {returncode}")
+            # A runner that died in the middle of a cell leaves it running, it counts as a failed attempt
+            recover(manifest, approach=unit.approach)
+            # Runs that claimed cells are bounded by the attempts of the cells, the approach goes back to the queue as
+            # long as the manifest has runnable cells for it. Only runs that failed before any cell count against
+            # the approach.
+            if cell_attempts(manifest, unit.approach) == attempts_before:
+                unit.setup_failures += 1
+            if unit.approach not in remaining_approaches(manifest, max_attempts):
+                continue
+            if unit.setup_failures < max_attempts:
+                queue.put_nowait(unit)
+            else:
+                logger.error(f"[{pair.id}] Giving up on approach {unit.approach} after {unit.setup_failures} runs that failed before a cell, its remaining cells are left for resume")
+        finally:
+            queue.task_done()
+
+
+async def schedule(pairs: list[ClusterPair], manifest: str, max_attempts: int, runner: list[str], pair_dir: str):
+    # Approaches are the unit of work, install, all cells and uninstall of one approach stay on one pair
+    queue: asyncio.Queue[WorkUnit] = asyncio.Queue()
+    for approach in remaining_approaches(manifest, max_attempts):
+        queue.put_nowait(WorkUnit(approach))
+    logger.info(f"Scheduling {queue.qsize()} approaches on {len(pairs)} cluster pairs")
+    workers = [asyncio.create_task(pair_worker(pair, queue, manifest, max_attempts, runner, pair_dir)) for pair in pairs]
+    try:
+        # Completes once every unit, including retries put back by the workers, is done. Workers only return by
+        # raising, such an error ends the schedule instead of leaving the queue waiting forever.
+        joined = asyncio.create_task(queue.join())
+        done, _ = await asyncio.wait([joined, *workers], return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task is not joined:
+                task.result()
+    finally:
+        joined.cancel()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the approaches of a benchmark manifest in parallel on a pool of cluster pairs")
+    parser.add_argument("--manifest", required=True, help="manifest written by manifest.py plan")
+    parser.add_argument("--pair", nargs=3, action="append", required=True, metavar=("ID", "CONTEXT_1", "CONTEXT_2"), help="cluster pair, ID is recorded with every cell run on it")
+    parser.add_argument("--max-attempts", type=int, default=1, help="attempts per cell, and runs of an approach that fail before any cell (default: 1)")
+    parser.add_argument("--pair-dir", default="pairs", help="directory for the context files of the pairs (default: pairs)")
+    parser.add_argument("--runner", nargs="+", default=DEFAULT_RUNNER, help=f"command run with the approach appended (default: {' '.join(DEFAULT_RUNNER)})")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    pairs = [ClusterPair(*pair) for pair in args.pair]
+    if len({pair.id for pair in pairs}) != len(pairs):
+        logger.error("Cluster pair IDs must be unique")
+        sys.exit(2)
+    try:
+        asyncio.run(schedule(pairs, args.manifest, args.max_attempts, args.runner, args.pair_dir))
+    except (OSError, ValueError) as e:
+        logger.error(f"Scheduling failed: {e}")
+        sys.exit(1)
+    logger.info(" ".join(f"{state}={count}" for state, count in summary(args.manifest, args.max_attempts).items()))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
+    main()
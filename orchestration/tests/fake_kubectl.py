@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# Stands in for kubectl in the tests of benchmarks.sh. Every call is appended to FAKE_KUBECTL_LOG with the cluster pair
+# of the runner that made it. kubectl proxy serves a cluster in which every selected pod has already completed.
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import json
+import os
+import sys
+
+
+def option(args: list[str], name: str) -> str | None:
+    for i, arg in enumerate(args):
+        if arg == name and i + 1 < len(args):
+            return args[i + 1]
+        if arg.startswith(f"{name}="):
+            return arg.partition("=")[2]
+    return None
+
+
+def completed_pod(container: str) -> dict:
+    return {
+        "metadata": {"name": f"{container}-0"},
+        "status": {"phase": "Succeeded", "containerStatuses": [{"name": container, "state": {"terminated": {"exitCode": 0}}}]},
+    }
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+        if url.path.endswith("/proxy/metrics/cadvisor"):
+            body = (
+                'container_cpu_usage_seconds_total{container="",cpu="total",id="/"} 100 1700000000000\n'
+                'container_memory_working_set_bytes{container="",id="/"} 2000000000 1700000000000\n'
+            ).encode()
+        elif parts[-1] == "pods":
+            # The container of a pod is named like its app label, e.g. app=nginx-curl-client
+            selector = query.get("labelSelector", [""])[0]
+            body = json.dumps({"metadata": {"resourceVersion": "1"}, "items": [completed_pod(selector.partition("=")[2])]}).encode()
+        else:
+            # Namespaces are deleted right away
+            body = json.dumps({"metadata": {"resourceVersion": "1"}, "items": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    args = sys.argv[1:]
+    with open(os.environ["FAKE_KUBECTL_LOG"], "a") as f:
+        f.write(json.dumps({"args": args, "context": option(args, "--context"), "pair": os.environ.get("CLUSTER_PAIR_ID")}) + "\n")
+
+    if args[0] == "proxy":
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeApiHandler)
+        print(f"Starting to serve on 127.0.0.1:{server.server_address[1]}", flush=True)
+        server.serve_forever()
+    elif args[:2] == ["get", "nodes"]:
+        print(f"{option(args, '--context')}-control-plane")
+    elif args[:2] == ["get", "jobs"]:
+        print(f"{option(args, '-n')}-client")
+    elif args[0] == "logs":
+        print(f"log of {args[1]}")
+    elif args[0] == "apply":
+        sys.stdin.read()
+    elif "--dry-run=client" in args:
+        print(f"kind: {args[1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+ORCHESTRATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ORCHESTRATION_DIR)
+
+from metrics_collector import HttpConnection
+
+
+CLUSTER_2_PREFIX = "/cluster-2"
+
+
+def cadvisor_metrics(scrape: int) -> str:
+    # Root and per-container series of both metrics, the root memory sample without a timestamp like some cadvisors
+    return "".join([
+        "# HELP container_cpu_usage_seconds_total Cumulative cpu time consumed in seconds.\n",
+        f'container_cpu_usage_seconds_total{{container="",cpu="total",id="/",image="",name="",namespace="",pod=""}} {100 + scrape} 1700000000000\n',
+        f'container_cpu_usage_seconds_total{{container="",cpu="total",id="/kubepods",image="",name="",namespace="",pod=""}} {50 + scrape} 1700000000000\n',
+        f'container_cpu_usage_seconds_total{{container="cilium-agent",cpu="total",id="/kubepods/a",image="cilium",name="a",namespace="kube-system",pod="cilium-a"}} {10 + scrape} 1700000000000\n',
+        f'container_memory_working_set_bytes{{container="",id="/",image="",name="",namespace="",pod=""}} {2e9 + scrape}\n',
+        f'container_memory_working_set_bytes{{container="cilium-agent",id="/kubepods/a",image="cilium",name="a",namespace="kube-system",pod="cilium-a"}} {1e8 + scrape} 1700000000000\n',
+        "container_network_receive_bytes_total{container=\"\",id=\"/\",interface=\"eth0\"} 1 1700000000000\n",
+    ])
+
+
+def pod(terminated: bool) -> dict:
+    state = {"terminated": {"exitCode": 0}} if terminated else {"running": {}}
+    return {"metadata": {"name": "client"}, "status": {"containerStatuses": [{"name": "bench-client", "state": state}]}}
+
+
+class StandInApiServer(ThreadingHTTPServer):
+    # Serves the cadvisor endpoint of two nodes, node-1 with Content-Length and node-2 chunked, and lists and
+    # watches of the client pod. The first watch fails with 410 Gone, the second reports the terminated container.
+    daemon_threads = True
+
+    def __init__(self, terminate_after: float):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.terminate_after = terminate_after
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.scrapes = {"node-1": 0, "node-2": 0}
+        self.lists = 0
+        self.watches = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def send_body(self, body: bytes, chunked: bool = False):
+        self.send_response(200)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            # Uneven chunk sizes with an extension and a trailer, as the decoder has to handle them
+            for start in range(0, len(body), 700):
+                piece = body[start:start + 700]
+                self.wfile.write(f"{len(piece):x};name=value\r\n".encode() + piece + b"\r\n")
+            self.wfile.write(b"0\r\nX-Trailer: done\r\n\r\n")
+        else:
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def send_events(self, events: list[tuple[float, dict]]):
+        self.send_response(200)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for delay, event in events:
+                time.sleep(delay)
+                line = json.dumps(event).encode() + b"\n"
+                # Every event split across two chunks, the watch has to join them again
+                for piece in (line[:10], line[10:]):
+                    self.wfile.write(f"{len(piece):x}\r\n".encode() + piece + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.removeprefix(CLUSTER_2_PREFIX)
+        query = parse_qs(url.query)
+        if path.endswith("/proxy/metrics/cadvisor"):
+            node = path.split("/")[4]
+            with self.server.lock:
+                scrape = self.server.scrapes[node]
+                self.server.scrapes[node] += 1
+            self.send_body(cadvisor_metrics(scrape).encode(), chunked=node == "node-2")
+        elif path == "/api/v1/namespaces/bench/pods" and query.get("labelSelector") == ["app=client"]:
+            if query.get("watch") == ["true"]:
+                with self.server.lock:
+                    self.server.watches += 1
+                    watch = self.server.watches
+                if watch == 1:
+                    self.send_events([(0.0, {"type": "ERROR", "object": {"kind": "Status", "code": 410, "message": "too old resource version"}})])
+                else:
+                    self.send_events([(0.0, {"type": "ADDED", "object": pod(False)}), (self.server.terminate_after, {"type": "MODIFIED", "object": pod(True)})])
+            else:
+                with self.server.lock:
+                    self.server.lists += 1
+                self.send_body(json.dumps({"metadata": {"resourceVersion": str(self.server.lists)}, "items": [pod(False)]}).encode())
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+
+class MetricsCollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInApiServer(terminate_after=0.5)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.results = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.results.cleanup()
+
+    def read_log(self, metric: str, cluster: str) -> list[str]:
+        with open(os.path.join(self.results.name, f"{metric}-{cluster}.log")) as f:
+            return f.read().splitlines()
+
+    def test_collect_until_container_terminated(self):
+        subprocess.run(
+            [
+                sys.executable, os.path.join(ORCHESTRATION_DIR, "metrics_collector.py"),
+                "--cluster", "cluster-1", "context-1", "node-1",
+                "--cluster", "cluster-2", "context-2", "node-2",
+                "--watch", "context-2", "bench", "app=client", "bench-client",
+                "--interval", "0.05",
+                "--log-pattern", os.path.join(self.results.name, "{metric}-{cluster}.log"),
+                "--api-url", f"context-1={self.server.url}",
+                "--api-url", f"context-2={self.server.url}{CLUSTER_2_PREFIX}/",
+            ],
+            check=True, timeout=30, capture_output=True,
+        )
+
+        # Scraped until the container terminated, the watch resumed from a fresh list after 410 Gone
+        self.assertEqual(self.server.lists, 2)
+        self.assertEqual(self.server.watches, 2)
+        for node in ["node-1", "node-2"]:
+            self.assertGreaterEqual(self.server.scrapes[node], 5)
+        # One keep-alive connection per scraper, the watcher needs a second one as it leaves the 410 Gone watch
+        # before reading its end
+        self.assertEqual(self.server.connections, 4)
+
+        for cluster, node in [("cluster-1", "node-1"), ("cluster-2", "node-2")]:
+            scrapes = self.server.scrapes[node]
+            cpu = self.read_log("metrics-cpu", cluster)
+            self.assertEqual(len(cpu), scrapes)
+            self.assertEqual([float(line.split()[-2]) for line in cpu], [100.0 + i for i in range(scrapes)])
+            self.assertTrue(all('id="/"' in line for line in cpu))
+
+            # The scrape time stands in for the missing sample timestamp
+            memory = self.read_log("metrics-memory", cluster)
+            self.assertEqual(len(memory), scrapes)
+            timestamps = [int(line.split()[-1]) for line in memory]
+            self.assertEqual(timestamps, sorted(timestamps))
+            self.assertGreater(timestamps[0], 1700000000000)
+
+            for metric, prefix in [("components-cpu", "container_cpu_usage_seconds_total{"), ("components-memory", "container_memory_working_set_bytes{")]:
+                lines = self.read_log(metric, cluster)
+                markers = [line for line in lines if line.startswith("# scrape ")]
+                samples = [line for line in lines if not line.startswith("# scrape ")]
+                self.assertEqual(len(markers), scrapes)
+                self.assertEqual(len(samples), scrapes)
+                self.assertTrue(all(line.startswith(prefix) and 'container="cilium-agent"' in line for line in samples))
+
+
+class HttpConnectionTest(unittest.IsolatedAsyncioTestCase):
+    async def test_reconnects_after_server_closed_idle_connection(self):
+        requests = []
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            while line := await reader.readline():
+                requests.append(line)
+                while (await reader.readline()) not in (b"\r\n", b""):
+                    pass
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+                await writer.drain()
+                # Like an idle timeout of the server, the next request has to go out on a new connection
+                break
+            writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        connection = HttpConnection("127.0.0.1", server.sockets[0].getsockname()[1])
+        try:
+            self.assertEqual(await connection.get("/first"), b"ok")
+            await asyncio.sleep(0.05)
+            self.assertEqual(await connection.get("/second"), b"ok")
+        finally:
+            await connection.close()
+            server.close()
+            await server.wait_closed()
+        self.assertEqual([line.split()[1] for line in requests], [b"/first", b"/second"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import glob
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ORCHESTRATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPOSITORY_DIR = os.path.dirname(ORCHESTRATION_DIR)
+sys.path.insert(0, ORCHESTRATION_DIR)
+sys.path.insert(0, os.path.join(REPOSITORY_DIR, "plotting"))
+
+from extract_data import get_log_file_metadata
+from manifest import DONE, FAILED, PENDING, plan, read_manifest
+
+
+PAIRS = {"pair-a": ["ctx-a1", "ctx-a2"], "pair-b": ["ctx-b1", "ctx-b2"]}
+CELLS = [("nginx-curl", "none"), ("nginx-curl-pld", "16")]
+
+# Approach scripts sourced by benchmarks.sh. istio-sidecar kills its runner in the middle of the first cell it gets,
+# skupper fails every cell and istio-ambient fails to install. The others have no scripts and just run.
+APPROACH_SCRIPTS = {
+    ("istio-sidecar", "benchmark.sh"): 'if [[ ! -e "$FAKE_STATE_DIR/killed" ]]; then touch "$FAKE_STATE_DIR/killed"; kill -KILL $$; exit 1; fi\n',
+    ("skupper", "benchmark.sh"): "exit 1\n",
+    ("istio-ambient", "install.sh"): "exit 1\n",
+}
+APPROACHES = ["cilium-none", "linkerd", "istio-sidecar", "skupper", "istio-ambient"]
+
+
+class SchedulerTest(unittest.TestCase):
+    # Runs scheduler.py with the real benchmarks.sh run-approach against a fake kubectl on two cluster pairs
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.work_dir = os.path.join(self.directory.name, "work")
+        self.state_dir = os.path.join(self.directory.name, "state")
+        bin_dir = os.path.join(self.directory.name, "bin")
+        for directory in [self.work_dir, self.state_dir, bin_dir]:
+            os.makedirs(directory)
+        # benchmarks.sh runs from its directory, results and approaches of the test stay in the temporary one
+        for name in ["benchmarks.sh", "helper.sh", "config.cfg", "benchmarks", "orchestration"]:
+            os.symlink(os.path.join(REPOSITORY_DIR, name), os.path.join(self.work_dir, name))
+        for approach in APPROACHES:
+            os.makedirs(os.path.join(self.work_dir, "approaches", approach))
+        for (approach, script), content in APPROACH_SCRIPTS.items():
+            with open(os.path.join(self.work_dir, "approaches", approach, script), "w") as f:
+                f.write(content)
+
+        os.symlink(os.path.join(ORCHESTRATION_DIR, "tests", "fake_kubectl.py"), os.path.join(bin_dir, "kubectl"))
+        if shutil.which("envsubst") is None:
+            # The fake kubectl ignores the manifests, only the pipe has to work
+            with open(os.path.join(bin_dir, "envsubst"), "w") as f:
+                f.write("#!/bin/sh\nexec cat\n")
+            os.chmod(os.path.join(bin_dir, "envsubst"), stat.S_IRWXU)
+        self.env = {
+            **os.environ,
+            "PATH": os.pathsep.join([bin_dir, os.path.dirname(sys.executable), os.environ["PATH"]]),
+            "FAKE_KUBECTL_LOG": os.path.join(self.state_dir, "kubectl.jsonl"),
+            "FAKE_STATE_DIR": self.state_dir,
+        }
+        self.results_dir = os.path.join(self.work_dir, "results")
+        self.manifest = os.path.join(self.results_dir, "manifest.json")
+        plan(self.manifest, "k3s", [(approach, benchmark, payload_size) for approach in APPROACHES for benchmark, payload_size in CELLS])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_scheduler(self) -> subprocess.CompletedProcess:
+        pair_args = [arg for pair, contexts in PAIRS.items() for arg in ["--pair", pair, *contexts]]
+        return subprocess.run(
+            [
+                sys.executable, "orchestration/scheduler.py",
+                "--manifest", "./results/manifest.json",
+                *pair_args,
+                "--max-attempts", "2",
+                "--pair-dir", "./results/pairs",
+            ],
+            cwd=self.work_dir, env=self.env, check=True, timeout=300, capture_output=True, text=True,
+        )
+
+    def read_jsonl(self, file: str) -> list[dict]:
+        with open(file) as f:
+            return [json.loads(line) for line in f]
+
+    def read_phases(self) -> list[list[str]]:
+        with open(os.path.join(self.results_dir, "phase-timings.tsv")) as f:
+            return [line.rstrip("\n").split("\t") for line in f]
+
+    def test_approaches_on_pairs_with_retries(self):
+        process = self.run_scheduler()
+        manifest = read_manifest(self.manifest)
+        cells = {(cell.approach, cell.benchmark): cell for cell in manifest.cells}
+
+        # Every kubectl call of a runner goes to the contexts of the pair in its CLUSTER_PAIR_ID
+        calls = self.read_jsonl(os.path.join(self.state_dir, "kubectl.jsonl"))
+        self.assertEqual({call["pair"] for call in calls}, set(PAIRS))
+        for call in calls:
+            if call["context"] is not None:
+                self.assertIn(call["context"], PAIRS[call["pair"]])
+
+        # Install, all cells and uninstall of an approach run on one pair
+        phases = self.read_phases()
+        for approach in ["cilium-none", "linkerd"]:
+            pairs = {cell.details["pair"] for cell in manifest.cells if cell.approach == approach}
+            self.assertEqual(len(pairs), 1)
+            approach_phases = [phase for phase in phases if phase[3] == approach]
+            self.assertEqual({phase[1] for phase in approach_phases}, pairs)
+            self.assertEqual([phase[6] for phase in approach_phases][::len(approach_phases) - 1], ["install", "uninstall"])
+
+        # The killed runner left its cell running, recover() marked it failed and the approach was queued again.
+        # The second run took the pending cell first and then the failed one.
+        runs = {approach: process.stderr.count(f"Running approach {approach} ") for approach in APPROACHES}
+        self.assertEqual(runs, {"cilium-none": 1, "linkerd": 1, "istio-sidecar": 2, "skupper": 1, "istio-ambient": 2})
+        self.assertEqual((cells["istio-sidecar", "nginx-curl"].attempts, cells["istio-sidecar", "nginx-curl-pld"].attempts), (2, 1))
+        # Failing cells are retried by run_approach itself until they used up their attempts
+        for benchmark, _ in CELLS:
+            cell = cells["skupper", benchmark]
+            self.assertEqual((cell.state, cell.attempts, cell.details["error"]), (FAILED, 2, "exit code 1"))
+        # An approach that does not install is given up after --max-attempts runs, its cells are left for resume
+        self.assertIn("Giving up on approach istio-ambient", process.stderr)
+        for benchmark, _ in CELLS:
+            self.assertEqual((cells["istio-ambient", benchmark].state, cells["istio-ambient", benchmark].attempts), (PENDING, 0))
+        self.assertIn("pending=2 running=0 done=6 failed=2 exhausted=2", process.stderr)
+
+        # Logs of every finished cell carry the pair it ran on, as extract_data.py reads it
+        for approach in ["cilium-none", "linkerd", "istio-sidecar"]:
+            for benchmark, payload_size in CELLS:
+                cell = cells[approach, benchmark]
+                self.assertEqual(cell.state, DONE)
+                self.assertNotIn("error", cell.details)
+                logs = glob.glob(os.path.join(self.results_dir, f"k3s-{approach}-{benchmark}-*-P{payload_size}-*.log.gz"))
+                self.assertEqual(len(logs), 9)
+                for log in logs:
+                    self.assertIn(f"-C{cell.details['pair']}-", os.path.basename(log))
+                    metadata = get_log_file_metadata(log)
+                    self.assertEqual((metadata.approach, metadata.benchmark_type, metadata.cluster_pair), (approach, benchmark, cell.details["pair"]))
+
+        # Output of the runners is tagged with the pair
+        self.assertTrue(all(line.startswith(("[pair-a] ", "[pair-b] ")) for line in process.stdout.splitlines()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+import numpy as np
+
+
+BOOTSTRAP_RESAMPLES = 1000
+BOOTSTRAP_CONFIDENCE = 0.95
+BOOTSTRAP_SEED = 0
+# Upper bound of resampled values held in memory at once per series
+BOOTSTRAP_CHUNK_SIZE = 4_000_000
+# Longer series get the order statistic and normal approximation intervals instead of a bootstrap, resampling costs
+# BOOTSTRAP_RESAMPLES times the length of the series and the approximations are tight at that size anyway
+BOOTSTRAP_MAX_SAMPLES = 50_000
+
+
+def _lerp(lower: np.ndarray, upper: np.ndarray, fraction: np.ndarray) -> np.ndarray:
+    # Same interpolation as numpy/pandas "linear" quantiles, so results match them bit for bit
+    diff = upper - lower
+    return np.where(fraction >= 0.5, upper - diff * (1 - fraction), lower + diff * fraction)
+
+
+def segment_quantiles(sorted_values: np.ndarray, offsets: np.ndarray, lengths: np.ndarray, q: float) -> np.ndarray:
+    position = q * (lengths - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, lengths - 1)
+    return _lerp(sorted_values[offsets + lower], sorted_values[offsets + upper], position - lower)
+
+
+def segment_whiskers(sorted_values: np.ndarray, segment: np.ndarray, offsets: np.ndarray, q1: np.ndarray, q3: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Whiskers as matplotlib's boxplot draws them: the most extreme value within 1.5 times the interquartile range,
+    # never inside the box
+    iqr = q3 - q1
+    low = np.minimum.reduceat(np.where(sorted_values >= (q1 - 1.5 * iqr)[segment], sorted_values, np.inf), offsets)
+    high = np.maximum.reduceat(np.where(sorted_values <= (q3 + 1.5 * iqr)[segment], sorted_values, -np.inf), offsets)
+    return np.where(low > q1, q1, low), np.where(high < q3, q3, high)
+
+
+def _t_distribution_two_sided_p(t_value: np.ndarray, degrees_of_freedom: np.ndarray) -> np.ndarray:
+    from scipy.special import stdtr
+    return 2 * stdtr(degrees_of_freedom, -np.abs(t_value))
+
+
+def _bootstrap_ci(values: np.ndarray, rng: np.random.Generator, resamples: int, confidence: float) -> tuple[float, float, float, float]:
+    n = len(values)
+    if n == 1:
+        return values[0], values[0], values[0], values[0]
+    medians = np.empty(resamples)
+    means = np.empty(resamples)
+    chunk = max(1, BOOTSTRAP_CHUNK_SIZE // n)
+    for start in range(0, resamples, chunk):
+        stop = min(start + chunk, resamples)
+        samples = values[rng.integers(0, n, size=(stop - start, n))]
+        medians[start:stop] = np.median(samples, axis=1)
+        means[start:stop] = samples.mean(axis=1)
+    alpha = (1 - confidence) / 2
+    median_low, median_high = np.quantile(medians, [alpha, 1 - alpha])
+    mean_low, mean_high = np.quantile(means, [alpha, 1 - alpha])
+    return median_low, median_high, mean_low, mean_high
+
+
+def _asymptotic_ci(sorted_values: np.ndarray, mean: float, std: float, confidence: float) -> tuple[float, float, float, float]:
+    # Distribution-free order statistic interval of the median and normal approximation of the mean, as
+    # sketch.sketch_statistics computes them from merged sketches
+    from scipy.special import ndtri
+    n = len(sorted_values)
+    z = ndtri(1 - (1 - confidence) / 2)
+    rank_margin = z * np.sqrt(n) / 2 / (n - 1)
+    lengths = np.array([n])
+    offsets = np.array([0])
+    median_low = segment_quantiles(sorted_values, offsets, lengths, max(0.5 - rank_margin, 0))[0]
+    median_high = segment_quantiles(sorted_values, offsets, lengths, min(0.5 + rank_margin, 1))[0]
+    mean_margin = z * std / np.sqrt(n)
+    return median_low, median_high, mean - mean_margin, mean + mean_margin
+
+
+def _finite_or_none(value) -> float | None:
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def compute_statistics(plot_data: list, resamples: int = BOOTSTRAP_RESAMPLES, confidence: float = BOOTSTRAP_CONFIDENCE) -> list[dict]:
+    # Descriptive statistics, the least squares trend of value over sample index and bootstrap confidence
+    # intervals for every series at once. Series may have different lengths, scalars count as one sample.
+    series = [np.atleast_1d(np.asarray(data, dtype=np.float64)) for data in plot_data]
+    if not series:
+        return []
+    lengths = np.array([len(s) for s in series], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    values = np.concatenate(series)
+    segment = np.repeat(np.arange(len(series)), lengths)
+    count = len(series)
+
+    mean = np.bincount(segment, weights=values, minlength=count) / lengths
+    deviation = values - mean[segment]
+    sum_squares = np.bincount(segment, weights=deviation * deviation, minlength=count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std = np.sqrt(sum_squares / (lengths - 1))
+
+    sorted_values = values[np.lexsort((values, segment))]
+    minimum = sorted_values[offsets]
+    maximum = sorted_values[offsets + lengths - 1]
+    q1 = segment_quantiles(sorted_values, offsets, lengths, 0.25)
+    median = segment_quantiles(sorted_values, offsets, lengths, 0.5)
+    q3 = segment_quantiles(sorted_values, offsets, lengths, 0.75)
+    whisker_low, whisker_high = segment_whiskers(sorted_values, segment, offsets, q1, q3)
+
+    # Ordinary least squares of y ~ x with x = 0..n-1 in closed form
+    x = np.arange(len(values)) - offsets[segment]
+    x_mean = (lengths - 1) / 2
+    x_deviation = x - x_mean[segment]
+    sxx = lengths * (lengths * lengths - 1) / 12
+    sxy = np.bincount(segment, weights=x_deviation * deviation, minlength=count)
+    degrees_of_freedom = lengths - 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        coef = sxy / sxx
+        residuals = deviation - coef[segment] * x_deviation
+        residual_sum_squares = np.bincount(segment, weights=residuals * residuals, minlength=count)
+        std_err = np.sqrt(residual_sum_squares / degrees_of_freedom / sxx)
+        t_value = coef / std_err
+        r_squared = 1 - residual_sum_squares / sum_squares
+    has_trend = degrees_of_freedom > 0
+    p_value = np.full(count, np.nan)
+    if has_trend.any():
+        p_value[has_trend] = _t_distribution_two_sided_p(t_value[has_trend], degrees_of_freedom[has_trend])
+
+    rng = np.random.default_rng(BOOTSTRAP_SEED)
+    stats = []
+    for i in range(count):
+        if lengths[i] > BOOTSTRAP_MAX_SAMPLES:
+            median_low, median_high, mean_low, mean_high = _asymptotic_ci(sorted_values[offsets[i]:offsets[i] + lengths[i]], mean[i], std[i], confidence)
+        else:
+            median_low, median_high, mean_low, mean_high = _bootstrap_ci(series[i], rng, resamples, confidence)
+        stats.append({
+            'min': float(minimum[i]),
+            'q1': float(q1[i]),
+            'median': float(median[i]),
+            'q3': float(q3[i]),
+            'max': float(maximum[i]),
+            'whisker_low': float(whisker_low[i]),
+            'whisker_high': float(whisker_high[i]),
+            'mean': float(mean[i]),
+            'std': _finite_or_none(std[i]),
+            'coef': _finite_or_none(coef[i]) if has_trend[i] else None,
+            'std_err': _finite_or_none(std_err[i]) if has_trend[i] else None,
+            't_value': _finite_or_none(t_value[i]) if has_trend[i] else None,
+            'p_value': _finite_or_none(p_value[i]) if has_trend[i] else None,
+            'r_squared': _finite_or_none(r_squared[i]) if has_trend[i] else None,
+            'n': int(lengths[i]),
+            'ci_level': confidence,
+            'median_ci_low': float(median_low),
+            'median_ci_high': float(median_high),
+            'mean_ci_low': float(mean_low),
+            'mean_ci_high': float(mean_high),
+        })
+    return stats
+
+
+def mann_whitney(baseline: list, candidate: list) -> tuple[np.ndarray, np.ndarray]:
+    # Two-sided Mann-Whitney U test and Cliff's delta of every candidate series against its baseline series at
+    # once. Ranks are averaged over ties, p-values use the normal approximation with tie and continuity correction
+    # (as scipy's asymptotic method). Delta is P(candidate > baseline) - P(candidate < baseline), in [-1, 1].
+    xs = [np.atleast_1d(np.asarray(data, dtype=np.float64)) for data in baseline]
+    ys = [np.atleast_1d(np.asarray(data, dtype=np.float64)) for data in candidate]
+    count = len(xs)
+    if count == 0:
+        return np.empty(0), np.empty(0)
+    n = np.array([len(x) for x in xs], dtype=np.float64)
+    m = np.array([len(y) for y in ys], dtype=np.float64)
+    lengths = (n + m).astype(np.int64)
+    values = np.concatenate([part for x, y in zip(xs, ys) for part in (x, y)])
+    segment = np.repeat(np.arange(count), lengths)
+    from_baseline = np.concatenate([part for x, y in zip(xs, ys) for part in (np.ones(len(x), dtype=bool), np.zeros(len(y), dtype=bool))])
+
+    order = np.lexsort((values, segment))
+    sorted_values = values[order]
+    sorted_segment = segment[order]
+    total = len(values)
+    run_starts = np.ones(total, dtype=bool)
+    run_starts[1:] = (sorted_values[1:] != sorted_values[:-1]) | (sorted_segment[1:] != sorted_segment[:-1])
+    run_start = np.flatnonzero(run_starts)
+    run_length = np.diff(np.append(run_start, total))
+    run_segment = sorted_segment[run_start]
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    # 1-based average rank of every run of ties, counted within its segment
+    run_rank = run_start - offsets[run_segment] + (run_length + 1) / 2
+    ranks = np.empty(total)
+    ranks[order] = np.repeat(run_rank, run_length)
+
+    baseline_rank_sum = np.bincount(segment, weights=np.where(from_baseline, ranks, 0.0), minlength=count)
+    # Pairs where the baseline value is larger, ties count half
+    u_baseline = baseline_rank_sum - n * (n + 1) / 2
+    pairs = n * m
+    tie_term = np.bincount(run_segment, weights=(run_length ** 3 - run_length).astype(np.float64), minlength=count)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = 1 - 2 * u_baseline / pairs
+        variance = pairs / 12 * ((lengths + 1) - tie_term / (lengths * (lengths - 1)))
+        z = np.maximum(np.abs(u_baseline - pairs / 2) - 0.5, 0) / np.sqrt(variance)
+    from scipy.special import erfc
+    p_value = erfc(z / np.sqrt(2))
+    # Identical values on both sides carry no evidence of a difference
+    p_value[(pairs > 0) & (variance == 0)] = 1.0
+    delta[pairs == 0] = np.nan
+    p_value[pairs == 0] = np.nan
+    return delta, p_value
+
+
+def benjamini_hochberg(p_values: np.ndarray) -> np.ndarray:
+    # False discovery rate adjusted p-values (q-values) over all tests, NaN p-values are left out
+    p_values = np.asarray(p_values, dtype=np.float64)
+    q_values = np.full(len(p_values), np.nan)
+    tested = np.flatnonzero(np.isfinite(p_values))
+    if len(tested) == 0:
+        return q_values
+    order = tested[np.argsort(p_values[tested], kind="stable")]
+    scaled = p_values[order] * len(tested) / np.arange(1, len(tested) + 1)
+    q_values[order] = np.minimum(np.minimum.accumulate(scaled[::-1])[::-1], 1.0)
+    return q_values
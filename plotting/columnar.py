@@ -0,0 +1,180 @@
+from dataclasses import dataclass
+from array import array
+from typing import Iterable, TextIO
+import json
+
+import numpy as np
+
+from extract_data import DEFAULT_CLUSTER_PAIR
+
+
+CATEGORICAL_COLUMNS = ["provider", "approach", "cluster", "benchmark_type", "data_type", "payload_size", "cluster_pair"]
+
+ARROW_SUFFIXES = (".arrow", ".feather", ".ipc")
+PARQUET_SUFFIXES = (".parquet",)
+
+
+@dataclass
+class CategoricalColumn:
+    codes: np.ndarray
+    categories: list[str]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, row: int) -> str:
+        return self.categories[self.codes[row]]
+
+
+@dataclass
+class BenchmarkDataColumns:
+    provider: CategoricalColumn
+    approach: CategoricalColumn
+    cluster: CategoricalColumn
+    benchmark_type: CategoricalColumn
+    data_type: CategoricalColumn
+    payload_size: CategoricalColumn
+    cluster_pair: CategoricalColumn
+    number: np.ndarray
+    value: np.ndarray
+    # Unix time in seconds, NaN where the log does not record when a value was taken
+    timestamp: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    def categorical(self, name: str) -> CategoricalColumn:
+        return getattr(self, name)
+
+
+class BenchmarkDataColumnsBuilder:
+    # Appends rows into typed buffers and dictionary encodes the string columns on the fly
+    def __init__(self):
+        self.category_codes: dict[str, dict[str, int]] = {name: {} for name in CATEGORICAL_COLUMNS}
+        self.codes: dict[str, array] = {name: array("i") for name in CATEGORICAL_COLUMNS}
+        self.number = array("q")
+        self.value = array("d")
+        self.timestamp = array("d")
+
+    def _code(self, name: str, category: str) -> int:
+        categories = self.category_codes[name]
+        code = categories.get(category)
+        if code is None:
+            code = categories[category] = len(categories)
+        return code
+
+    def append(self, provider: str, approach: str, cluster: str, benchmark_type: str, data_type: str, payload_size: str, number: int, value: float, timestamp: float | None = None, cluster_pair: str = DEFAULT_CLUSTER_PAIR):
+        for name, category in zip(CATEGORICAL_COLUMNS, (provider, approach, cluster, benchmark_type, data_type, payload_size, cluster_pair)):
+            self.codes[name].append(self._code(name, category))
+        self.number.append(number)
+        self.value.append(value)
+        self.timestamp.append(np.nan if timestamp is None else timestamp)
+
+    def extend(self, data_points: Iterable) -> "BenchmarkDataColumnsBuilder":
+        for dp in data_points:
+            self.append(dp.provider, dp.approach, dp.cluster, dp.benchmark_type, dp.data_type, dp.payload_size, dp.number, dp.value, dp.timestamp, dp.cluster_pair)
+        return self
+
+    def build(self) -> BenchmarkDataColumns:
+        columns = {
+            name: CategoricalColumn(
+                codes=np.frombuffer(self.codes[name], dtype=np.int32).copy(),
+                categories=list(self.category_codes[name]),
+            )
+            for name in CATEGORICAL_COLUMNS
+        }
+        return BenchmarkDataColumns(
+            **columns,
+            number=np.frombuffer(self.number, dtype=np.int64).copy(),
+            value=np.frombuffer(self.value, dtype=np.float64).copy(),
+            timestamp=np.frombuffer(self.timestamp, dtype=np.float64).copy(),
+        )
+
+
+def read_jsonl(input: TextIO) -> BenchmarkDataColumns:
+    builder = BenchmarkDataColumnsBuilder()
+    for line in input:
+        if line.strip():
+            obj = json.loads(line)
+            builder.append(obj["provider"], obj["approach"], obj["cluster"], obj["benchmark_type"], obj["data_type"], obj["payload_size"], obj["number"], obj["value"], obj.get("timestamp"), obj.get("cluster_pair", DEFAULT_CLUSTER_PAIR))
+    return builder.build()
+
+
+def to_arrow_table(columns: BenchmarkDataColumns):
+    import pyarrow as pa
+
+    arrays = {}
+    for name in CATEGORICAL_COLUMNS:
+        column = columns.categorical(name)
+        arrays[name] = pa.DictionaryArray.from_arrays(pa.array(column.codes, type=pa.int32()), pa.array(column.categories, type=pa.string()))
+    arrays["number"] = pa.array(columns.number, type=pa.int64())
+    arrays["value"] = pa.array(columns.value, type=pa.float64())
+    arrays["timestamp"] = pa.array(columns.timestamp, type=pa.float64())
+    return pa.table(arrays)
+
+
+def _single_array(chunked):
+    import pyarrow as pa
+
+    # A single chunk is used as is, so buffers of a memory-mapped file are not copied
+    if chunked.num_chunks == 1:
+        return chunked.chunk(0)
+    return pa.concat_arrays(chunked.chunks)
+
+
+def from_arrow_table(table) -> BenchmarkDataColumns:
+    table = table.unify_dictionaries()
+    columns = {}
+    for name in CATEGORICAL_COLUMNS:
+        if table.num_rows == 0:
+            columns[name] = CategoricalColumn(codes=np.empty(0, dtype=np.int32), categories=[])
+            continue
+        if name not in table.column_names:
+            # Files written before the cluster pair was recorded, all of it ran on the default pair
+            columns[name] = CategoricalColumn(codes=np.zeros(table.num_rows, dtype=np.int32), categories=[DEFAULT_CLUSTER_PAIR])
+            continue
+        column = _single_array(table.column(name))
+        # Only the small dictionary is converted to python strings, the codes stay in the arrow buffer
+        columns[name] = CategoricalColumn(codes=column.indices.to_numpy(zero_copy_only=False), categories=column.dictionary.to_pylist())
+    if table.num_rows == 0:
+        number = np.empty(0, dtype=np.int64)
+        value = np.empty(0, dtype=np.float64)
+    else:
+        number = _single_array(table.column("number")).to_numpy(zero_copy_only=False)
+        value = _single_array(table.column("value")).to_numpy(zero_copy_only=False)
+    if table.num_rows and "timestamp" in table.column_names:
+        timestamp = _single_array(table.column("timestamp")).to_numpy(zero_copy_only=False)
+    else:
+        # Files written before timestamps were recorded
+        timestamp = np.full(table.num_rows, np.nan)
+    return BenchmarkDataColumns(**columns, number=number, value=value, timestamp=timestamp)
+
+
+def write_columns(columns: BenchmarkDataColumns, file: str):
+    import pyarrow as pa
+
+    table = to_arrow_table(columns)
+    if file.endswith(PARQUET_SUFFIXES):
+        import pyarrow.parquet as pq
+        pq.write_table(table, file)
+    else:
+        # Uncompressed Arrow IPC so the file can be memory-mapped without decoding on load
+        with pa.OSFile(file, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+def read_columns(file: str) -> BenchmarkDataColumns:
+    if file.endswith(PARQUET_SUFFIXES):
+        import pyarrow.parquet as pq
+        return from_arrow_table(pq.read_table(file, memory_map=True))
+    if file.endswith(ARROW_SUFFIXES):
+        import pyarrow as pa
+        source = pa.memory_map(file, "r")
+        return from_arrow_table(pa.ipc.open_file(source).read_all())
+    with open(file, "r") as f:
+        return read_jsonl(f)
+
+
+def is_columnar_file(file: str) -> bool:
+    return file.endswith(ARROW_SUFFIXES + PARQUET_SUFFIXES)
@@ -0,0 +1,250 @@
+from dataclasses import dataclass, asdict
+from datetime import datetime
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+
+from extract_data import benchmarks, approaches
+from columnar import BenchmarkDataColumns, read_columns
+from results_db import ResultsFilter, is_results_db, read_results_db
+from batch_stats import mann_whitney, benjamini_hochberg
+from plots import DataPointIndex, RenderJob, add_figure_arguments, get_plot_info, parse_payload_size, render_jobs, colors, PLOT_FONTSIZE
+
+
+logger = logging.getLogger(__name__)
+
+# Client measurements that are compared, with the direction that is better where it does not follow the benchmark
+compared_data_types = {
+    "benchmark": None,
+    "requests-per-second": "higher",
+}
+
+# Thresholds of Cliff's delta after Romano et al., below the first one a difference is negligible
+EFFECT_SIZES = [(0.474, "large"), (0.33, "medium"), (0.147, "small"), (0.0, "negligible")]
+
+REGRESSION = "regression"
+IMPROVEMENT = "improvement"
+NEGLIGIBLE = "negligible"
+UNCHANGED = "unchanged"
+
+verdict_order = [REGRESSION, IMPROVEMENT, NEGLIGIBLE, UNCHANGED]
+
+verdict_colors = {
+    REGRESSION: "#CC3311",
+    IMPROVEMENT: "#009988",
+    NEGLIGIBLE: "#BBBBBB",
+    UNCHANGED: "#BBBBBB",
+}
+
+
+@dataclass
+class Comparison:
+    benchmark: str
+    approach: str
+    payload_size: str
+    data_type: str
+    better: str
+    baseline_n: int
+    candidate_n: int
+    baseline_median: float
+    candidate_median: float
+    # Change of the median relative to the baseline, None if the baseline median is 0
+    change: float | None
+    cliffs_delta: float
+    effect: str
+    p_value: float
+    q_value: float
+    verdict: str = UNCHANGED
+
+
+def effect_size(delta: float) -> str:
+    return next(name for threshold, name in EFFECT_SIZES if abs(delta) >= threshold)
+
+
+def read_input(file: str, run: str | None, selected_benchmarks: list[str]) -> BenchmarkDataColumns:
+    if is_results_db(file):
+        return read_results_db(file, ResultsFilter(benchmarks=selected_benchmarks, data_types=list(compared_data_types), runs=[run] if run else None))
+    return read_columns(file)
+
+
+def compare(baseline: DataPointIndex, candidate: DataPointIndex, selected_benchmarks: list[str], alpha: float, min_effect: float) -> list[Comparison]:
+    # Every benchmark, approach, payload size and data type present in both datasets is one test, the q-values
+    # control the false discovery rate over all of them, so noise across a large matrix is not reported as change
+    keys = []
+    baseline_values = []
+    candidate_values = []
+    for benchmark in selected_benchmarks:
+        payload_sizes = baseline.payload_sizes(benchmark) & candidate.payload_sizes(benchmark)
+        data_types = baseline.data_types(benchmark) & candidate.data_types(benchmark)
+        for data_type in compared_data_types:
+            if data_type not in data_types:
+                continue
+            for payload_size in sorted(payload_sizes, key=parse_payload_size):
+                for approach in approaches:
+                    baseline_series = baseline.values(benchmark, approach, data_type, payload_size=payload_size)
+                    candidate_series = candidate.values(benchmark, approach, data_type, payload_size=payload_size)
+                    if len(baseline_series) < 1 or len(candidate_series) < 1:
+                        continue
+                    keys.append((benchmark, approach, payload_size, data_type))
+                    baseline_values.append(baseline_series)
+                    candidate_values.append(candidate_series)
+    if not keys:
+        return []
+
+    deltas, p_values = mann_whitney(baseline_values, candidate_values)
+    q_values = benjamini_hochberg(p_values)
+    comparisons = []
+    for (benchmark, approach, payload_size, data_type), baseline_series, candidate_series, delta, p_value, q_value in zip(
+        keys, baseline_values, candidate_values, deltas, p_values, q_values
+    ):
+        better = compared_data_types[data_type] or get_plot_info(benchmark, "benchmark")["better"]
+        baseline_median = float(np.median(baseline_series))
+        candidate_median = float(np.median(candidate_series))
+        comparison = Comparison(
+            benchmark=benchmark,
+            approach=approach,
+            payload_size=payload_size,
+            data_type=data_type,
+            better=better,
+            baseline_n=len(baseline_series),
+            candidate_n=len(candidate_series),
+            baseline_median=baseline_median,
+            candidate_median=candidate_median,
+            change=(candidate_median - baseline_median) / abs(baseline_median) if baseline_median != 0 else None,
+            cliffs_delta=float(delta),
+            effect=effect_size(float(delta)),
+            p_value=float(p_value),
+            q_value=float(q_value),
+        )
+        if q_value <= alpha:
+            if abs(delta) < min_effect:
+                # Significant but too small to matter, typical for long runs where every tiny shift is detectable
+                comparison.verdict = NEGLIGIBLE
+            elif (delta > 0) == (better == "lower"):
+                comparison.verdict = REGRESSION
+            else:
+                comparison.verdict = IMPROVEMENT
+        comparisons.append(comparison)
+    # Most severe first: regressions by effect size, then improvements, then everything that did not change
+    comparisons.sort(key=lambda c: (verdict_order.index(c.verdict), -abs(c.cliffs_delta), c.q_value))
+    return comparisons
+
+
+def generate_delta_plot(comparisons: list[Comparison], min_effect: float, unit: str, output_file: str):
+    # Left: medians of both datasets side by side, right: Cliff's delta coloured by verdict
+    comparisons = comparisons[::-1]
+    labels = [c.approach if c.payload_size == "none" else f"{c.approach} {c.payload_size}" for c in comparisons]
+    positions = np.arange(len(comparisons))
+    from matplotlib.figure import Figure
+    figure = Figure(figsize=(12, max(3, 0.35 * len(comparisons) + 1.5)))
+    medians_ax, delta_ax = figure.subplots(1, 2, sharey=True, gridspec_kw={"width_ratios": [3, 2]})
+
+    bar_colors = [next((color for key, color in colors.items() if key in label), "#000000") for label in labels]
+    medians_ax.barh(positions + 0.2, [c.baseline_median for c in comparisons], height=0.4, color=bar_colors, alpha=0.4)
+    medians_ax.barh(positions - 0.2, [c.candidate_median for c in comparisons], height=0.4, color=bar_colors)
+    medians_ax.set_yticks(positions, labels, fontsize=PLOT_FONTSIZE)
+    medians_ax.set_xlabel(f"Median [{unit}] ({comparisons[0].better} is better)", fontsize=PLOT_FONTSIZE)
+    # Bars are coloured per approach, the legend only tells the two datasets apart
+    from matplotlib.patches import Patch
+    medians_ax.legend(
+        handles=[Patch(color="gray", alpha=0.4, label="baseline"), Patch(color="gray", label="candidate")],
+        fontsize=PLOT_FONTSIZE, loc="lower right",
+    )
+    medians_ax.xaxis.grid(True, which="major", linestyle="-", linewidth=0.7, color="gray", alpha=0.5)
+    medians_ax.set_axisbelow(True)
+
+    delta_ax.axvspan(-min_effect, min_effect, color="#EEEEEE")
+    delta_ax.barh(positions, [c.cliffs_delta for c in comparisons], height=0.8, color=[verdict_colors[c.verdict] for c in comparisons])
+    delta_ax.axvline(0, color="black", linewidth=0.7)
+    delta_ax.set_xlim(-1, 1)
+    delta_ax.set_xlabel("Cliff's delta (candidate vs. baseline)", fontsize=PLOT_FONTSIZE)
+    delta_ax.xaxis.grid(True, which="major", linestyle="-", linewidth=0.7, color="gray", alpha=0.5)
+    delta_ax.set_axisbelow(True)
+
+    figure.tight_layout(pad=1.0)
+    figure.savefig(output_file)
+
+
+def format_comparison(c: Comparison) -> str:
+    change = f"{c.change:+.1%}" if c.change is not None else "n/a"
+    return (
+        f"{c.verdict:<11} {c.benchmark} {c.approach} P{c.payload_size} {c.data_type}: median {c.baseline_median:.4g} -> "
+        f"{c.candidate_median:.4g} ({change}), delta {c.cliffs_delta:+.3f} ({c.effect}), q {c.q_value:.3g}"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare two benchmark results sets and rank the regressions between them")
+    parser.add_argument("baseline", help="JSONL, Arrow or Parquet file written by extract_data.py or a results database")
+    parser.add_argument("candidate", help="same as baseline, e.g. the results after an upgrade")
+    parser.add_argument("--baseline-run", help="run of the baseline results database to use (default: all)")
+    parser.add_argument("--candidate-run", help="run of the candidate results database to use (default: all)")
+    parser.add_argument("-b", "--benchmarks", nargs="+", default=benchmarks, choices=benchmarks, metavar="BENCHMARK", help="benchmarks to compare (default: all)")
+    parser.add_argument("--alpha", type=float, default=0.05, help="false discovery rate below which a difference counts as real (default: 0.05)")
+    parser.add_argument("--min-effect", type=float, default=0.147, help="smallest absolute Cliff's delta reported as a change (default: 0.147, small)")
+    parser.add_argument("-o", "--output-dir", default="results", help="directory for the timestamped output folder (default: results)")
+    parser.add_argument("--no-plots", action="store_true", help="only write the report")
+    parser.add_argument("-j", "--render-workers", type=int, default=os.cpu_count() or 1, help="processes rendering figures in parallel (default: number of cores)")
+    add_figure_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        baseline = DataPointIndex(read_input(args.baseline, args.baseline_run, args.benchmarks))
+        candidate = DataPointIndex(read_input(args.candidate, args.candidate_run, args.benchmarks))
+    except (OSError, ValueError) as e:
+        logger.error(f"Cannot read input: {e}")
+        sys.exit(1)
+    logger.info(f"Comparing {len(baseline)} baseline with {len(candidate)} candidate data points")
+
+    comparisons = compare(baseline, candidate, args.benchmarks, args.alpha, args.min_effect)
+    if not comparisons:
+        logger.error("No benchmark, approach and payload size is present in both inputs")
+        sys.exit(1)
+
+    output_dir = f"{args.output_dir}/{datetime.now().strftime('%Y%m%d-%H%M%S')}-compare"
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {verdict: sum(c.verdict == verdict for c in comparisons) for verdict in verdict_order}
+    with open(f"{output_dir}/comparison.json", "w") as f:
+        json.dump({
+            "baseline": args.baseline,
+            "baseline_run": args.baseline_run,
+            "candidate": args.candidate,
+            "candidate_run": args.candidate_run,
+            "alpha": args.alpha,
+            "min_effect": args.min_effect,
+            "counts": counts,
+            "comparisons": [asdict(c) for c in comparisons],
+        }, f, indent=2)
+    with open(f"{output_dir}/comparison.txt", "w") as f:
+        f.writelines(f"{format_comparison(c)}\n" for c in comparisons)
+    for c in comparisons:
+        if c.verdict in (REGRESSION, IMPROVEMENT):
+            logger.info(format_comparison(c))
+    logger.info(" ".join(f"{verdict}={count}" for verdict, count in counts.items()) + f", report in {output_dir}")
+
+    if args.no_plots:
+        return
+    jobs = []
+    for benchmark in args.benchmarks:
+        for data_type in compared_data_types:
+            selected = [c for c in comparisons if c.benchmark == benchmark and c.data_type == data_type]
+            if not selected:
+                continue
+            # Grouped by payload size in the matrix order, the severity ranking is in the report
+            selected.sort(key=lambda c: (parse_payload_size(c.payload_size), approaches.index(c.approach)))
+            unit = get_plot_info(benchmark, "benchmark")["unit"] if data_type == "benchmark" else "requests/s"
+            jobs.append(RenderJob(generate_delta_plot, (selected, args.min_effect, unit), f"{output_dir}/{benchmark}-{data_type}-delta.{args.format}"))
+    if jobs:
+        render_jobs(jobs, args.render_workers, args.dpi, args.compact_svg)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
+    main()
@@ -1,14 +1,26 @@
 from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import sys
 import os
 import logging
-from typing import Callable
+from typing import Callable, Iterable, Iterator, TextIO, TYPE_CHECKING
+import gzip
+import io
 import json
 import re
 
+import tracing
+
+if TYPE_CHECKING:
+    from parse_cache import ParseCache
+
 
 logger = logging.getLogger(__name__)
 
+# CLUSTER_PAIR_ID of config.cfg, the pair of all cells run without the scheduler
+DEFAULT_CLUSTER_PAIR = "default"
+
 
 @dataclass
 class BenchmarkDataPoint:
@@ -20,61 +32,318 @@ class BenchmarkDataPoint:
     payload_size: str
     number: int
     value: float
+    timestamp: float | None = None
+    cluster_pair: str = DEFAULT_CLUSTER_PAIR
 
 
-def parse_nginx_curl_benchmark(input: str) -> list[float]:
-    values = []
-    for line in input.splitlines():
-        if "time_total=" in line:
-            time_str = line.split("time_total=")[1].split("s")[0]
-            values.append(float(time_str) * 1000)
-    return values
+# A parsed value tagged with its data type and, where the log records it, the unix time in seconds it was
+# taken at. A single log can yield several data types (e.g. wrk percentiles).
+ParsedValue = tuple[str, float, float | None]
 
 
-def parse_nginx_wrk_benchmark(input: str) -> list[float]:
-    values = []
-    for line in input.splitlines():
-        if "Latency" in line and "Thread Stats" not in line:
-            parts = line.split()
-            # Find the value and unit (e.g., 7.39ms)
-            value_str = parts[1]
-            if value_str.endswith("us"):
-                values.append(float(value_str.replace("us", "")) / 1000)
-            elif value_str.endswith("ms"):
-                values.append(float(value_str.replace("ms", "")))
-            elif value_str.endswith("s"):
-                values.append(float(value_str.replace("s", "")) * 1000)
-    return values
-
-
-def parse_iperf_benchmark(input: str) -> list[float]:
-    data = json.loads(input)
-    values = [interval['sum']['bits_per_second'] / 1e9 for interval in data.get('intervals', [])]
-    return values
-
-
-def parse_cpu_benchmark(input: str) -> list[float]:
-    values = []
-    for line in input.splitlines():
+# Printed by the curl and wrk clients after their loop, adaptive clients may stop before the configured maximum
+SAMPLE_COUNT_LINE = "Samples collected:"
+SAMPLE_COUNT = "sample-count"
+
+
+# The curl clients print when every request started, e.g. "Request 3 at 1767268800: time_total=0.001234s"
+CURL_REQUEST_START = re.compile(r'Request \d+ at (\d+(?:\.\d+)?):')
+
+
+def parse_nginx_curl_benchmark(lines: Iterable[str]) -> Iterator[ParsedValue]:
+    for line in lines:
+        if "time_total=" in line:
+            seconds = float(line.split("time_total=")[1].split("s")[0])
+            # Timestamped at the end of the request like the values of the other benchmarks, logs of older clients
+            # do not record the start
+            match = CURL_REQUEST_START.match(line)
+            yield "benchmark", seconds * 1000, float(match.group(1)) + seconds if match else None
+        elif line.startswith(SAMPLE_COUNT_LINE):
+            yield SAMPLE_COUNT, float(line.removeprefix(SAMPLE_COUNT_LINE)), None
+
+
+duration_unit_ms = {"us": 1 / 1000, "ms": 1, "s": 1000, "m": 60 * 1000, "h": 60 * 60 * 1000}
+
+
+def parse_duration_ms(value_str: str) -> float | None:
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)(us|ms|s|m|h)', value_str)
+    if match is None:
+        return None
+    value, unit = match.groups()
+    return float(value) * duration_unit_ms[unit]
+
+# Latency distribution rows as printed by wrk --latency and the percentile script, e.g. "  99.900%    1.20ms"
+WRK_PERCENTILE_LINE = re.compile(r'\s*(\d+(?:\.\d+)?)%\s+(\S+)\s*')
+
+
+LATENCY_PERCENTILE_PREFIX = "latency-p"
+
+# Printed by the wrk clients after every run, e.g. "Run finished at 1767268800"
+WRK_RUN_FINISHED_LINE = "Run finished at"
+
+
+def latency_percentile_data_type(percentile: float) -> str:
+    return f"{LATENCY_PERCENTILE_PREFIX}{percentile:g}"
+
+
+def parse_nginx_wrk_benchmark(lines: Iterable[str]) -> Iterator[ParsedValue]:
+    # Values of a run are held back until its end is known, logs of older clients have none and yield them untimed
+    run: list[tuple[str, float]] = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0] == "Latency":
+            # Average of the "Thread Stats" latency row (e.g. 7.39ms), the header row has no unit and is skipped
+            value = parse_duration_ms(parts[1])
+            if value is not None:
+                run.append(("benchmark", value))
+            continue
+        if len(parts) == 2 and parts[0] == "Requests/sec:":
+            run.append(("requests-per-second", float(parts[1])))
+            continue
+        if line.startswith(WRK_RUN_FINISHED_LINE):
+            timestamp = float(line.removeprefix(WRK_RUN_FINISHED_LINE))
+            for data_type, value in run:
+                yield data_type, value, timestamp
+            run = []
+            continue
+        if line.startswith(SAMPLE_COUNT_LINE):
+            for data_type, value in run:
+                yield data_type, value, None
+            run = []
+            yield SAMPLE_COUNT, float(line.removeprefix(SAMPLE_COUNT_LINE)), None
+            continue
+        match = WRK_PERCENTILE_LINE.fullmatch(line)
+        if match is not None:
+            value = parse_duration_ms(match.group(2))
+            if value is not None:
+                run.append((latency_percentile_data_type(float(match.group(1))), value))
+    for data_type, value in run:
+        yield data_type, value, None
+
+
+JSON_DECODER = json.JSONDecoder()
+JSON_READ_AHEAD = 64 * 1024
+
+
+class JsonMemberReader:
+    # Decodes a JSON object member by member from a stream of text chunks or lines. Members listed as streamed
+    # arrays are decoded element by element, so only one element is held in memory at a time.
+    def __init__(self, chunks: Iterable[str]):
+        self.chunks = iter(chunks)
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        pieces = [self.buffer]
+        size = 0
+        for piece in self.chunks:
+            pieces.append(piece)
+            size += len(piece)
+            if size >= JSON_READ_AHEAD:
+                break
+        else:
+            self.eof = True
+        self.buffer = "".join(pieces)
+        return size > 0
+
+    def _peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("unexpected end of JSON document")
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"expected '{char}' at offset {self.pos} of JSON document")
+        self.pos += 1
+
+    def _decode(self):
+        self._peek()
+        while True:
+            try:
+                value, end = JSON_DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value may continue in the next chunk, give up only once the input is exhausted
+                if not self._fill():
+                    raise
+                continue
+            if end == len(self.buffer) and not self.eof and not isinstance(value, (dict, list, str)):
+                # A number at the end of the buffer could still continue in the next chunk
+                if self._fill():
+                    continue
+            self.pos = end
+            return value
+
+    def members(self, streamed_arrays: set[str]) -> Iterator[tuple[str, object]]:
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._decode()
+            self._expect(":")
+            if key in streamed_arrays and self._peek() == "[":
+                self.pos += 1
+                if self._peek() != "]":
+                    while True:
+                        yield key, self._decode()
+                        if self._peek() != ",":
+                            break
+                        self.pos += 1
+                self._expect("]")
+            else:
+                yield key, self._decode()
+            if self._peek() != ",":
+                break
+            self.pos += 1
+        self._expect("}")
+
+
+# Measurements of iperf3 -J next to the total throughput of every interval. The clients send, so iperf's host is the
+# sender and the remote server the receiver.
+IPERF_RETRANSMITS = "retransmits"
+IPERF_STREAM_THROUGHPUT = "stream-throughput"
+IPERF_FAIRNESS = "stream-fairness"
+IPERF_JITTER = "jitter"
+IPERF_LOST_PERCENT = "lost-percent"
+IPERF_CPU_SENDER = "cpu-sender"
+IPERF_CPU_RECEIVER = "cpu-receiver"
+
+
+def parse_iperf_benchmark(lines: Iterable[str]) -> Iterator[ParsedValue]:
+    start_time = None
+    timestamp = None
+    for key, value in JsonMemberReader(lines).members({"intervals"}):
+        if key == "start":
+            # iperf writes "start" before "intervals", interval times are relative to it
+            start_time = value.get('timestamp', {}).get('timesecs')
+        elif key == "intervals":
+            total = value['sum']
+            timestamp = start_time + total['end'] if start_time is not None else None
+            yield "benchmark", total['bits_per_second'] / 1e9, timestamp
+            if 'retransmits' in total:
+                # TCP only, segments all streams retransmitted in this interval
+                yield IPERF_RETRANSMITS, total['retransmits'], timestamp
+            rates = [stream['bits_per_second'] / 1e9 for stream in value.get('streams', [])]
+            if len(rates) > 1:
+                for rate in rates:
+                    yield IPERF_STREAM_THROUGHPUT, rate, timestamp
+                # Jain's fairness index of the streams, 1 if all got the same share and 1/n if one got everything.
+                # A single stream always gets everything, so only parallel streams have a fairness.
+                squares = sum(rate * rate for rate in rates)
+                if squares > 0:
+                    yield IPERF_FAIRNESS, sum(rates) ** 2 / (len(rates) * squares), timestamp
+        elif key == "end":
+            # Once per test, taken at the end of the last interval
+            total = value.get('sum', {})
+            if 'jitter_ms' in total:
+                # UDP only, as the receiving server reported it
+                yield IPERF_JITTER, total['jitter_ms'], timestamp
+                yield IPERF_LOST_PERCENT, total['lost_percent'], timestamp
+            cpu = value.get('cpu_utilization_percent')
+            if cpu is not None:
+                yield IPERF_CPU_SENDER, cpu['host_total'], timestamp
+                yield IPERF_CPU_RECEIVER, cpu['remote_total'], timestamp
+
+
+def parse_cpu_benchmark(lines: Iterable[str]) -> Iterator[ParsedValue]:
+    for line in lines:
         line = line.strip()
         if not line or line.startswith("container_cpu_usage_seconds_total"):
             parts = line.split()
             if len(parts) >= 2:
-                values.append(float(parts[-2]))
-    return values
+                yield "metrics-cpu", float(parts[-2]), float(parts[-1]) / 1000
 
 
-def parse_memory_benchmark(input: str) -> list[float]:
-    values = []
-    for line in input.splitlines():
+def parse_memory_benchmark(lines: Iterable[str]) -> Iterator[ParsedValue]:
+    for line in lines:
         line = line.strip()
         if not line or line.startswith("container_memory_working_set_bytes"):
             parts = line.split()
             if len(parts) >= 2:
                 mem_bytes = float(parts[-2])
                 mem_mib = mem_bytes / (1024 * 1024)
-                values.append(mem_mib)
-    return values
+                yield "metrics-memory", mem_mib, float(parts[-1]) / 1000
+
+
+# Per-container series of a full cadvisor dump, grouped into the data plane components of the approaches
+COMPONENT_CPU_METRIC = "container_cpu_usage_seconds_total{"
+COMPONENT_MEMORY_METRIC = "container_memory_working_set_bytes{"
+COMPONENT_SCRAPE_MARKER = "# scrape"
+COMPONENT_LABEL = re.compile(r'(container|cpu)="([^"]*)"')
+
+component_containers = {
+    "cilium-agent": "cilium-agent",
+    "ztunnel": "ztunnel",
+    "istio-proxy": "istio-proxy",
+    "linkerd-proxy": "linkerd-proxy",
+    "router": "skupper-router",
+    "skupper-router": "skupper-router",
+    "submariner-gateway": "submariner-gateway",
+}
+
+components = ["cilium-agent", "ztunnel", "istio-proxy", "linkerd-proxy", "skupper-router", "submariner-gateway", "workload", "benchmark-client", "other"]
+
+
+def get_component(container: str) -> str:
+    component = component_containers.get(container)
+    if component is not None:
+        return component
+    # Benchmark pods name their containers <benchmark>-server and <benchmark>-client
+    if container.endswith("-server"):
+        return "workload"
+    if container.endswith("-client"):
+        return "benchmark-client"
+    return "other"
+
+
+def component_data_type(resource: str, component: str) -> str:
+    return f"components-{resource}-{component}"
+
+
+def parse_components(lines: Iterable[str], metric: str, resource: str, scale: float) -> Iterator[ParsedValue]:
+    # Sums the per-container samples of every scrape by component. Only lines of the wanted metric are split
+    # further, everything else in the dump is skipped with a single prefix check.
+    totals: dict[str, float] = {}
+    timestamp = None
+    for line in lines:
+        if line.startswith(metric):
+            labels_end = line.rfind("}")
+            container = ""
+            cpu = "total"
+            for name, value in COMPONENT_LABEL.findall(line, 0, labels_end):
+                if name == "container":
+                    container = value
+                else:
+                    cpu = value
+            # container="" are cgroup aggregates (root, pods), per-core cpu series would count usage twice
+            if not container or cpu != "total":
+                continue
+            component = get_component(container)
+            totals[component] = totals.get(component, 0.0) + float(line[labels_end + 1:].split()[0]) * scale
+        elif line.startswith(COMPONENT_SCRAPE_MARKER):
+            for component, total in totals.items():
+                yield component_data_type(resource, component), total, timestamp
+            totals = {}
+            timestamp = float(line.split()[-1]) / 1000
+    for component, total in totals.items():
+        yield component_data_type(resource, component), total, timestamp
+
+
+def parse_components_cpu(lines: Iterable[str]) -> Iterator[ParsedValue]:
+    return parse_components(lines, COMPONENT_CPU_METRIC, "cpu", 1.0)
+
+
+def parse_components_memory(lines: Iterable[str]) -> Iterator[ParsedValue]:
+    return parse_components(lines, COMPONENT_MEMORY_METRIC, "memory", 1 / (1024 * 1024))
 
 
 providers = ["kind", "k3s"]
@@ -104,6 +373,7 @@ benchmarks = [
     "nginx-curl",
     "nginx-wrk-pld",
     "nginx-wrk-small",
+    "nginx-wrk-rate",
     "nginx-wrk",
     "iperf-tcp-par",
     "iperf-tcp-pld",
@@ -115,13 +385,17 @@ data_types = [
     "client",
     "metrics-cpu",
     "metrics-memory",
+    "components-cpu",
+    "components-memory",
 ]
 
-benchmark_type_parser_map: dict[str, Callable[[str], list[float]]] = {
+# Parsers consume the log line by line and yield values lazily, memory stays flat for large logs
+benchmark_type_parser_map: dict[str, Callable[[Iterable[str]], Iterator[ParsedValue]]] = {
     "nginx-curl-pld": parse_nginx_curl_benchmark,
     "nginx-curl": parse_nginx_curl_benchmark,
     "nginx-wrk-pld": parse_nginx_wrk_benchmark,
     "nginx-wrk-small": parse_nginx_wrk_benchmark,
+    "nginx-wrk-rate": parse_nginx_wrk_benchmark,
     "nginx-wrk": parse_nginx_wrk_benchmark,
     "iperf-tcp-par": parse_iperf_benchmark,
     "iperf-tcp-pld": parse_iperf_benchmark,
@@ -129,6 +403,8 @@ benchmark_type_parser_map: dict[str, Callable[[str], list[float]]] = {
     "iperf-udp": parse_iperf_benchmark,
     "metrics-cpu": parse_cpu_benchmark,
     "metrics-memory": parse_memory_benchmark,
+    "components-cpu": parse_components_cpu,
+    "components-memory": parse_components_memory,
 }
 
 
@@ -136,8 +412,20 @@ def match_value(possible_values: list[str], value_to_match: str) -> str:
     for value in possible_values:
         if value in value_to_match:
             return value
-    logger.error(f"value {value_to_match} does not match any known values in {possible_values}")
-    sys.exit(1)
+    raise ValueError(f"value {value_to_match} does not match any known values in {possible_values}")
+
+
+# Cluster pair the cell ran on, recorded right before the date, e.g. ...-P16-cluster-1-Cpair-a-20250101120000.log.
+# Logs of runs before the scheduler record none.
+CLUSTER_PAIR = re.compile(r'-C([^/]+?)(?=-\d{14}\.log)')
+
+
+def get_cluster_pair(file: str) -> tuple[str, str]:
+    # Also returns the file name without the pair, so a pair ID cannot match as an approach or cluster
+    match = CLUSTER_PAIR.search(file)
+    if match is None:
+        return DEFAULT_CLUSTER_PAIR, file
+    return match.group(1), file[:match.start()] + file[match.end():]
 
 
 def get_payload_size(file: str) -> str:
@@ -148,52 +436,323 @@ def get_payload_size(file: str) -> str:
     return "1"
 
 
-def extract_data_from_file(file: str) -> list[BenchmarkDataPoint]:
-    provider = match_value(providers, file)
-    approach = match_value(approaches, file)
-    cluster = match_value(clusters, file)
-    benchmark_type = match_value(benchmarks, file)
-    data_type = match_value(data_types, file)
-    payload_size = get_payload_size(file)
+@dataclass
+class LogFileMetadata:
+    provider: str
+    approach: str
+    cluster: str
+    benchmark_type: str
+    data_type: str
+    payload_size: str
+    cluster_pair: str
+    parser_key: str
+
+
+def get_log_file_metadata(file: str) -> LogFileMetadata:
+    # Only match on the file name, directory names like results/<date>/ must not leak into the metadata
+    cluster_pair, file_name = get_cluster_pair(os.path.basename(file))
+    benchmark_type = match_value(benchmarks, file_name)
+    data_type = match_value(data_types, file_name)
     if data_type == "client":
         data_type = "benchmark"
-        parser = benchmark_type_parser_map[benchmark_type]
+        parser_key = benchmark_type
     else:
-        parser = benchmark_type_parser_map[data_type]
-    benchmark_data_points = []
-    number = 0
-    with open(file, 'r') as f:
-        values = parser(f.read())
-        for number, value in enumerate(values):
-            benchmark_data_points.append(
-                BenchmarkDataPoint(
-                    provider=provider,
-                    approach=approach,
-                    cluster=cluster,
-                    benchmark_type=benchmark_type,
-                    data_type=data_type,
-                    payload_size=payload_size,
-                    number=number,
-                    value=value
-                )
-            )
-    return benchmark_data_points
+        parser_key = data_type
+    return LogFileMetadata(
+        provider=match_value(providers, file_name),
+        approach=match_value(approaches, file_name),
+        cluster=match_value(clusters, file_name),
+        benchmark_type=benchmark_type,
+        data_type=data_type,
+        payload_size=get_payload_size(file_name),
+        cluster_pair=cluster_pair,
+        parser_key=parser_key,
+    )
+
+
+# Suffixes of the logs as written with LOG_COMPRESSION none, gzip and zstd
+log_suffixes = {
+    "none": ".log",
+    "gzip": ".log.gz",
+    "zstd": ".log.zst",
+}
 
 
-def main():
-    if len(sys.argv) < 2:
-        logger.error("Usage: python extract_data.py <file>")
+def is_log_file(file: str) -> bool:
+    return file.endswith(tuple(log_suffixes.values()))
+
+
+def open_zstd(file: str, mode: str):
+    try:
+        # Part of the standard library since Python 3.14
+        from compression import zstd
+        return zstd.open(file, f"{mode}b")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(f"Reading and writing {file} needs Python 3.14 or the zstandard package") from None
+    if mode == "w":
+        return zstandard.ZstdCompressor().stream_writer(open(file, "wb"), closefd=True)
+    # A log may consist of several frames, e.g. when compressed pieces were appended
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(file, "rb"), read_across_frames=True, closefd=True))
+
+
+def open_log(file: str, mode: str = "r") -> TextIO:
+    # Plain or compressed text by the file suffix, compressed logs are decompressed while they are read and never
+    # unpacked to disk
+    if file.endswith(log_suffixes["gzip"]):
+        return gzip.open(file, f"{mode}t")
+    if file.endswith(log_suffixes["zstd"]):
+        return io.TextIOWrapper(open_zstd(file, mode))
+    return open(file, mode)
+
+
+def parse_log_file(file: str, parser_key: str) -> list[ParsedValue]:
+    parser = benchmark_type_parser_map[parser_key]
+    with open_log(file) as f:
+        return list(parser(f))
+
+
+def create_data_points(metadata: LogFileMetadata, values: list[ParsedValue]) -> list[BenchmarkDataPoint]:
+    # Values are numbered per data type, in the order they appear in the log
+    numbers: dict[str, int] = {}
+    data_points = []
+    for data_type, value, timestamp in values:
+        number = numbers.get(data_type, 0)
+        numbers[data_type] = number + 1
+        data_points.append(
+            BenchmarkDataPoint(
+                provider=metadata.provider,
+                approach=metadata.approach,
+                cluster=metadata.cluster,
+                benchmark_type=metadata.benchmark_type,
+                data_type=data_type,
+                payload_size=metadata.payload_size,
+                number=number,
+                value=value,
+                timestamp=timestamp,
+                cluster_pair=metadata.cluster_pair,
+            )
+        )
+    return data_points
+
+
+def extract_data_from_file(file: str, cache: "ParseCache | None" = None) -> list[BenchmarkDataPoint]:
+    metadata = get_log_file_metadata(file)
+    if cache is None:
+        return create_data_points(metadata, parse_log_file(file, metadata.parser_key))
+    values, content_hash = cache.get(file, metadata.parser_key)
+    if values is None:
+        values = parse_log_file(file, metadata.parser_key)
+        cache.put(file, metadata.parser_key, values, content_hash)
+    return create_data_points(metadata, values)
+
+
+def parse_log_file_or_error(task: tuple[str, str]) -> tuple[list[ParsedValue], str | None, tuple[int, float, float]]:
+    # Also returns the worker and when and for how long it parsed, for the trace of the parent process
+    file, parser_key = task
+    started = tracing.now_us()
+    try:
+        return parse_log_file(file, parser_key), None, (os.getpid(), started, tracing.now_us() - started)
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}", (os.getpid(), started, tracing.now_us() - started)
+
+
+def find_log_files(directory: str) -> list[str]:
+    log_files = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file in sorted(files):
+            if is_log_file(file):
+                log_files.append(os.path.join(root, file))
+    return log_files
+
+
+def extract_data_from_directory(directory: str, jobs: int, cache: "ParseCache | None" = None) -> Iterator[tuple[str, list[BenchmarkDataPoint], str | None]]:
+    files = find_log_files(directory)
+    logger.info(f"Found {len(files)} log files in {directory}")
+    return extract_data_from_files(files, jobs, cache)
+
+
+def extract_data_from_files(files: list[str], jobs: int, cache: "ParseCache | None" = None) -> Iterator[tuple[str, list[BenchmarkDataPoint], str | None]]:
+    # Metadata and cache lookups happen up front in this process, only files that need parsing go to the pool
+    entries = []
+    for file in files:
+        metadata = values = content_hash = error = None
+        try:
+            metadata = get_log_file_metadata(file)
+            if cache is not None:
+                values, content_hash = cache.get(file, metadata.parser_key)
+        except (ValueError, OSError) as e:
+            error = f"{type(e).__name__}: {e}"
+        entries.append((file, metadata, values, content_hash, error))
+    tasks = [(file, metadata.parser_key) for file, metadata, values, _, error in entries if error is None and values is None]
+    logger.info(f"Parsing {len(tasks)} of {len(files)} log files with {jobs} processes")
+
+    executor = None
+    if jobs <= 1 or len(tasks) <= 1:
+        parsed = map(parse_log_file_or_error, tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        # map keeps the sorted file order, so the output is stable across runs
+        parsed = executor.map(parse_log_file_or_error, tasks, chunksize=max(1, len(tasks) // (jobs * 4)))
+    try:
+        for file, metadata, values, content_hash, error in entries:
+            if error is None and values is None:
+                values, error, (pid, started, duration) = next(parsed)
+                tracing.name_process(pid, "parse worker")
+                tracing.record(f"parse {os.path.basename(file)}", "parse", started, duration, pid=pid)
+                if error is None and cache is not None:
+                    cache.put(file, metadata.parser_key, values, content_hash)
+            if error is not None:
+                yield file, [], error
+            else:
+                yield file, create_data_points(metadata, values), None
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def open_parse_cache(file: str, max_size_mb: int) -> "ParseCache":
+    from parse_cache import ParseCache, parser_version
+    parser_versions = {key: parser_version(parser) for key, parser in benchmark_type_parser_map.items()}
+    return ParseCache(file, parser_versions, max_bytes=max_size_mb * 1024 * 1024)
+
+
+class JsonlDataPointWriter:
+    def __init__(self, file: str | None):
+        self.output = open(file, "w") if file else sys.stdout
+
+    def write(self, data_points: list[BenchmarkDataPoint]):
+        for dp in data_points:
+            self.output.write(json.dumps(dp.__dict__))
+            self.output.write("\n")
+
+    def close(self):
+        if self.output is not sys.stdout:
+            self.output.close()
+
+
+class ColumnarDataPointWriter:
+    def __init__(self, file: str):
+        from columnar import BenchmarkDataColumnsBuilder
+        self.file = file
+        self.builder = BenchmarkDataColumnsBuilder()
+
+    def write(self, data_points: list[BenchmarkDataPoint]):
+        self.builder.extend(data_points)
+
+    def close(self):
+        from columnar import write_columns
+        write_columns(self.builder.build(), self.file)
+
+
+class SketchDataPointWriter:
+    # Folds every log into one sketch per series as it is extracted, memory grows with the series, not the values
+    def __init__(self, file: str, relative_accuracy: float):
+        from sketch import LogHistogram
+        self.file = file
+        self.relative_accuracy = relative_accuracy
+        self.sketches: dict[tuple[str, str, str, str, str], LogHistogram] = {}
+
+    def write(self, data_points: list[BenchmarkDataPoint]):
+        from sketch import LogHistogram
+        series: dict[tuple[str, str, str, str, str], list[float]] = {}
+        for dp in data_points:
+            series.setdefault((dp.benchmark_type, dp.approach, dp.cluster, dp.data_type, dp.payload_size), []).append(dp.value)
+        for key, values in series.items():
+            if key not in self.sketches:
+                self.sketches[key] = LogHistogram(self.relative_accuracy)
+            self.sketches[key].add(values)
+
+    def close(self):
+        from sketch import write_sketches
+        write_sketches(self.sketches, self.file)
+
+
+def open_data_point_writer(file: str | None) -> JsonlDataPointWriter | ColumnarDataPointWriter:
+    if file and file.endswith((".arrow", ".feather", ".ipc", ".parquet")):
+        return ColumnarDataPointWriter(file)
+    return JsonlDataPointWriter(file)
+
+
+def open_data_point_writers(args: argparse.Namespace) -> list:
+    writers = []
+    # With only sketches requested the raw data points are not written at all
+    if args.output or not args.sketches:
+        writers.append(open_data_point_writer(args.output))
+    if args.sketches:
+        writers.append(SketchDataPointWriter(args.sketches, args.sketch_accuracy))
+    return writers
+
+
+def extract(args: argparse.Namespace, cache: "ParseCache | None"):
+    if os.path.isdir(args.path):
+        writers = open_data_point_writers(args)
+        failed = 0
+        try:
+            for file, data_points, error in extract_data_from_directory(args.path, args.jobs, cache):
+                if error is not None:
+                    failed += 1
+                    logger.error(f"Skipping {file}: {error}")
+                    continue
+                for writer in writers:
+                    writer.write(data_points)
+        finally:
+            for writer in writers:
+                writer.close()
+        if failed:
+            logger.warning(f"{failed} log files could not be extracted")
+        return
+
+    if not os.path.isfile(args.path):
+        logger.error(f"File {args.path} does not exist.")
         sys.exit(1)
 
-    file_name = sys.argv[1]
-    if not os.path.isfile(file_name):
-        logger.error(f"File {file_name} does not exist.")
+    try:
+        data_points = extract_data_from_file(args.path, cache)
+    except ValueError as e:
+        logger.error(e)
         sys.exit(1)
-        
-    data_points = extract_data_from_file(file_name)
 
-    for dp in data_points:
-        print(json.dumps(dp.__dict__))
+    writers = open_data_point_writers(args)
+    try:
+        for writer in writers:
+            writer.write(data_points)
+    finally:
+        for writer in writers:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract benchmark data points from result logs as JSONL or Arrow/Parquet")
+    parser.add_argument("path", help="log file or results directory to extract")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes for directory mode (default: number of cores)")
+    parser.add_argument("-o", "--output", help="output file, .arrow/.feather/.parquet write columnar data (default: JSONL to stdout)")
+    parser.add_argument("--sketches", metavar="FILE", help="also write a mergeable quantile sketch of every series to this .sketch.json file, only the sketches without --output")
+    parser.add_argument("--sketch-accuracy", type=float, default=0.01, help="relative accuracy of the sketched quantiles (default: 0.01)")
+    parser.add_argument("--cache", help="parse cache database, only new or changed logs are parsed again")
+    parser.add_argument("--cache-max-size", type=int, default=512, metavar="MB", help="evict least recently used cache entries above this size (default: 512)")
+    parser.add_argument("--clear-cache", action="store_true", help="drop all cache entries before extracting")
+    parser.add_argument("--trace", metavar="FILE", help="write a Chrome trace of the extraction and of every parsed log to FILE")
+    parser.add_argument("--profile-dir", metavar="DIR", help="with --trace, also write a cProfile .prof file of the extraction to DIR")
+    args = parser.parse_args()
+
+    if args.trace:
+        tracing.enable("extract_data.py", args.profile_dir)
+    cache = open_parse_cache(args.cache, args.cache_max_size) if args.cache else None
+    if cache is not None and args.clear_cache:
+        cache.invalidate()
+    try:
+        with tracing.span("extract"):
+            extract(args, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    if args.trace:
+        tracing.finish(args.trace)
 
 
 if __name__ == "__main__":
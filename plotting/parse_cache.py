@@ -0,0 +1,180 @@
+from array import array
+from typing import Callable
+import hashlib
+import inspect
+import json
+import logging
+import math
+import os
+import sqlite3
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the cached values changes, all existing entries are dropped
+CACHE_FORMAT_VERSION = 3
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def parser_version(parser: Callable) -> str:
+    # Derived from the source of the whole module of the parser, so editing a parser or any helper it calls
+    # (wrappers like parse_components_cpu, JsonMemberReader, open_log, ...) invalidates its entries without a manual
+    # version bump
+    try:
+        source = inspect.getsource(inspect.getmodule(parser))
+    except (OSError, TypeError):
+        source = ""
+    return hashlib.sha256(f"{CACHE_FORMAT_VERSION}:{parser.__qualname__}:{source}".encode()).hexdigest()[:16]
+
+
+def file_content_hash(file: str) -> str:
+    with open(file, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class ParseCache:
+    def __init__(self, path: str, parser_versions: dict[str, str], max_bytes: int = DEFAULT_MAX_BYTES):
+        self.parser_versions = parser_versions
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != CACHE_FORMAT_VERSION:
+            self.connection.executescript(f"DROP TABLE IF EXISTS entries; PRAGMA user_version = {CACHE_FORMAT_VERSION};")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                parser TEXT NOT NULL,
+                parser_version TEXT NOT NULL,
+                data_types TEXT NOT NULL,
+                data_type_codes BLOB NOT NULL,
+                value_bytes BLOB NOT NULL,
+                timestamp_bytes BLOB NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_content ON entries (content_hash, parser, parser_version);
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+        """)
+        self.invalidate_outdated()
+
+    def invalidate_outdated(self):
+        with self.connection:
+            removed = 0
+            for parser, version in self.parser_versions.items():
+                removed += self.connection.execute(
+                    "DELETE FROM entries WHERE parser = ? AND parser_version != ?", (parser, version)
+                ).rowcount
+        if removed:
+            logger.info(f"Dropped {removed} parse cache entries of changed parsers")
+
+    def invalidate(self, parser: str | None = None):
+        with self.connection:
+            if parser is None:
+                self.connection.execute("DELETE FROM entries")
+            else:
+                self.connection.execute("DELETE FROM entries WHERE parser = ?", (parser,))
+
+    def get(self, file: str, parser: str) -> tuple[list[tuple[str, float, float | None]] | None, str | None]:
+        # Returns the cached values, or None and the content hash (if it was computed) so put() does not hash again
+        version = self.parser_versions[parser]
+        stat = os.stat(file)
+        key = os.path.abspath(file)
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, content_hash, data_types, data_type_codes, value_bytes, timestamp_bytes FROM entries WHERE path = ? AND parser = ? AND parser_version = ?",
+            (key, parser, version),
+        ).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return self._hit(key, row[3:], stat), None
+
+        content_hash = file_content_hash(file)
+        if row is not None and row[2] == content_hash:
+            return self._hit(key, row[3:], stat), None
+        row = self.connection.execute(
+            "SELECT data_types, data_type_codes, value_bytes, timestamp_bytes FROM entries WHERE content_hash = ? AND parser = ? AND parser_version = ? LIMIT 1",
+            (content_hash, parser, version),
+        ).fetchone()
+        if row is not None:
+            # Same content under another path, e.g. a copied or moved results folder
+            self._store(key, stat, content_hash, parser, version, row)
+            self.hits += 1
+            return self._decode(row), None
+        self.misses += 1
+        return None, content_hash
+
+    def put(self, file: str, parser: str, values: list[tuple[str, float, float | None]], content_hash: str | None = None):
+        stat = os.stat(file)
+        if content_hash is None:
+            content_hash = file_content_hash(file)
+        self._store(os.path.abspath(file), stat, content_hash, parser, self.parser_versions[parser], self._encode(values))
+
+    def evict(self):
+        total = self.connection.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        removed = 0
+        with self.connection:
+            for path, nbytes in self.connection.execute("SELECT path, nbytes FROM entries ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self.connection.execute("DELETE FROM entries WHERE path = ?", (path,))
+                total -= nbytes
+                removed += 1
+        logger.info(f"Evicted {removed} least recently used parse cache entries")
+
+    def close(self):
+        self.evict()
+        self.connection.close()
+        logger.info(f"Parse cache: {self.hits} hits, {self.misses} misses")
+
+    def _hit(self, key: str, encoded: tuple, stat: os.stat_result) -> list[tuple[str, float, float | None]]:
+        with self.connection:
+            self.connection.execute(
+                "UPDATE entries SET last_used = ?, size = ?, mtime_ns = ? WHERE path = ?",
+                (time.time(), stat.st_size, stat.st_mtime_ns, key),
+            )
+        self.hits += 1
+        return self._decode(encoded)
+
+    def _store(self, key: str, stat: os.stat_result, content_hash: str, parser: str, version: str, encoded: tuple):
+        data_types, data_type_codes, value_bytes, timestamp_bytes = encoded
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, stat.st_size, stat.st_mtime_ns, content_hash, parser, version, data_types, data_type_codes, value_bytes,
+                 timestamp_bytes, len(data_type_codes) + len(value_bytes) + len(timestamp_bytes), time.time()),
+            )
+
+    @staticmethod
+    def _encode(values: list[tuple[str, float, float | None]]) -> tuple[str, bytes, bytes, bytes]:
+        # Data types are dictionary encoded, values and timestamps are stored as raw float64 (NaN for no timestamp)
+        names: dict[str, int] = {}
+        codes = array("H")
+        numbers = array("d")
+        timestamps = array("d")
+        for data_type, value, timestamp in values:
+            codes.append(names.setdefault(data_type, len(names)))
+            numbers.append(value)
+            timestamps.append(math.nan if timestamp is None else timestamp)
+        return json.dumps(list(names)), codes.tobytes(), numbers.tobytes(), timestamps.tobytes()
+
+    @staticmethod
+    def _decode(encoded: tuple) -> list[tuple[str, float, float | None]]:
+        data_types, data_type_codes, value_bytes, timestamp_bytes = encoded
+        names = json.loads(data_types)
+        codes = array("H")
+        codes.frombytes(data_type_codes)
+        values = array("d")
+        values.frombytes(value_bytes)
+        timestamps = array("d")
+        timestamps.frombytes(timestamp_bytes)
+        return [
+            (names[code], value, None if math.isnan(timestamp) else timestamp)
+            for code, value, timestamp in zip(codes, values, timestamps)
+        ]
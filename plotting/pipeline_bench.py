@@ -0,0 +1,194 @@
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Callable
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+from extract_data import benchmarks, extract_data_from_directory
+from columnar import BenchmarkDataColumnsBuilder, read_columns, write_columns
+from plots import DataPointIndex, RenderOptions, collect_render_jobs, plot_types, render_jobs
+from synthetic import SyntheticScale, add_scale_arguments, generate, scale_from_args
+
+
+logger = logging.getLogger(__name__)
+
+STAGES = ["parse", "load", "group", "stats", "render"]
+# Stages this much slower are not reported even above the threshold, milliseconds of a tiny stage are noise
+MIN_REGRESSION_SECONDS = 0.05
+
+
+@dataclass
+class StageResult:
+    seconds: float
+    # High-water marks of this process and of the finished worker processes once the stage is done, they never go
+    # down, so a stage shows the peak of itself and all stages before it
+    peak_rss_mib: float
+    peak_children_rss_mib: float
+
+
+def peak_rss_mib(who: int) -> float:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def run_pipeline(results_dir: str, work_dir: str, jobs: int, render_workers: int, skip_render: bool) -> dict[str, StageResult]:
+    # The same steps as extract_data.py and plots.py, every stage timed on its own
+    os.makedirs(work_dir, exist_ok=True)
+    results = {}
+    state = {}
+
+    def stage(name: str, function: Callable):
+        start = time.perf_counter()
+        state[name] = function()
+        results[name] = StageResult(time.perf_counter() - start, peak_rss_mib(resource.RUSAGE_SELF), peak_rss_mib(resource.RUSAGE_CHILDREN))
+        logger.info(f"Stage {name} took {results[name].seconds:.2f}s, peak RSS {results[name].peak_rss_mib:.0f} MiB")
+
+    def parse():
+        data_points = []
+        for file, points, error in extract_data_from_directory(results_dir, jobs):
+            if error is not None:
+                raise ValueError(f"Cannot extract {file}: {error}")
+            data_points.append(points)
+        return data_points
+
+    def load():
+        builder = BenchmarkDataColumnsBuilder()
+        for points in state.pop("parse"):
+            builder.extend(points)
+        # Written and read back as plots.py reads the output of extract_data.py
+        file = os.path.join(work_dir, "data.arrow")
+        write_columns(builder.build(), file)
+        return read_columns(file)
+
+    def stats():
+        options = RenderOptions(output_dir=os.path.join(work_dir, "plots"), plot_types=plot_types, render_workers=render_workers)
+        os.makedirs(options.output_dir, exist_ok=True)
+        return collect_render_jobs(benchmarks, state.pop("group"), options)
+
+    stage("parse", parse)
+    stage("load", load)
+    stage("group", lambda: DataPointIndex(state.pop("load")))
+    stage("stats", stats)
+    if not skip_render:
+        stage("render", lambda: render_jobs(state.pop("stats"), render_workers))
+    return results
+
+
+def run_benchmark(args: argparse.Namespace, scale: SyntheticScale) -> dict:
+    with tempfile.TemporaryDirectory(prefix="pipeline-bench-") as work_dir:
+        results_dir = args.results
+        if results_dir is None:
+            results_dir = os.path.join(work_dir, "results")
+            start = time.perf_counter()
+            files = generate(results_dir, scale)
+            size = sum(os.path.getsize(file) for file in files)
+            logger.info(f"Generated {len(files)} log files with {size / 1024**2:.1f} MiB in {time.perf_counter() - start:.2f}s")
+        best: dict[str, StageResult] = {}
+        for repetition in range(args.repeat):
+            logger.info(f"Repetition {repetition + 1} of {args.repeat}")
+            # The fastest repetition of every stage is kept, slower ones measure noise of the machine, not the pipeline
+            for name, result in run_pipeline(results_dir, os.path.join(work_dir, f"run-{repetition}"), args.jobs, args.render_workers, args.skip_render).items():
+                if name not in best or result.seconds < best[name].seconds:
+                    best[name] = result
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": args.results,
+        "scale": asdict(scale) if args.results is None else None,
+        "jobs": args.jobs,
+        "render_workers": args.render_workers,
+        "repeat": args.repeat,
+        "stages": {name: asdict(result) for name, result in best.items()},
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    # Returns the stages that got slower by more than the threshold
+    if (report["scale"], report["results"], report["jobs"], report["render_workers"]) != (baseline["scale"], baseline["results"], baseline["jobs"], baseline["render_workers"]):
+        logger.warning("Baseline was measured with a different input or worker count, the comparison is not like for like")
+    regressions = []
+    for name, result in report["stages"].items():
+        before = baseline["stages"].get(name)
+        if before is None:
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] > 0 else float("inf")
+        memory_ratio = result["peak_rss_mib"] / before["peak_rss_mib"] if before["peak_rss_mib"] > 0 else float("inf")
+        regressed = ratio > threshold and result["seconds"] - before["seconds"] > MIN_REGRESSION_SECONDS
+        logger.log(
+            logging.WARNING if regressed else logging.INFO,
+            f"{name:<7} {before['seconds']:8.2f}s -> {result['seconds']:8.2f}s ({ratio:.2f}x), peak RSS {before['peak_rss_mib']:.0f} -> {result['peak_rss_mib']:.0f} MiB ({memory_ratio:.2f}x)"
+        )
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def baseline_file(baseline_dir: str, name: str) -> str:
+    return os.path.join(baseline_dir, f"{name}.json")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Time every stage of the extraction and plotting pipeline (parse, load, group, stats, render) on synthetic or real results")
+    parser.add_argument("--results", help="results directory to measure instead of generating synthetic logs")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="parse worker processes (default: number of cores)")
+    parser.add_argument("--render-workers", type=int, default=os.cpu_count() or 1, help="render worker processes (default: number of cores)")
+    parser.add_argument("--repeat", type=int, default=1, help="repetitions, the fastest time of every stage is reported (default: 1)")
+    parser.add_argument("--skip-render", action="store_true", help="stop after the statistics, rendering dominates small inputs")
+    parser.add_argument("-o", "--output", help="also write the report to this JSON file")
+    parser.add_argument("--baseline-dir", default="pipeline-baselines", help="directory of saved baselines (default: pipeline-baselines)")
+    parser.add_argument("--save-baseline", metavar="NAME", help="save the report as baseline NAME")
+    parser.add_argument("--compare", metavar="NAME", help="compare against baseline NAME, exits 1 if a stage regressed")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown factor of a stage that counts as a regression (default: 1.2)")
+    add_scale_arguments(parser.add_argument_group("synthetic results", "scale of the generated results directory, ignored with --results"))
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    baseline = None
+    if args.compare:
+        try:
+            with open(baseline_file(args.baseline_dir, args.compare)) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Cannot read baseline {args.compare}: {e}")
+            sys.exit(2)
+
+    try:
+        report = run_benchmark(args, scale_from_args(args))
+    except (OSError, ValueError) as e:
+        logger.error(f"Pipeline failed: {e}")
+        sys.exit(2)
+    for name in STAGES:
+        if name in report["stages"]:
+            result = report["stages"][name]
+            logger.info(f"{name:<7} {result['seconds']:8.2f}s  peak RSS {result['peak_rss_mib']:6.0f} MiB  workers {result['peak_children_rss_mib']:6.0f} MiB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(args.baseline_dir, exist_ok=True)
+        with open(baseline_file(args.baseline_dir, args.save_baseline), "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Saved baseline {args.save_baseline} in {args.baseline_dir}")
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            logger.error(f"Stages slower than {args.threshold:g}x baseline {args.compare}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
+    main()
@@ -1,18 +1,30 @@
 from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+import argparse
 import sys
 import json
-import matplotlib.pyplot as plt
+import time
 import numpy as np
-import pandas as pd
 from datetime import datetime
 import logging
-from statsmodels.formula.api import ols
 
-from extract_data import BenchmarkDataPoint, benchmarks, approaches, clusters
+from extract_data import benchmarks, approaches, clusters, components, component_data_type, LATENCY_PERCENTILE_PREFIX, SAMPLE_COUNT
+from extract_data import IPERF_RETRANSMITS, IPERF_FAIRNESS, IPERF_JITTER, IPERF_LOST_PERCENT, IPERF_CPU_SENDER, IPERF_CPU_RECEIVER
+from columnar import BenchmarkDataColumns, read_columns, read_jsonl
+from results_db import add_filter_arguments, is_results_db, read_results_db, results_filter_from_args
+from batch_stats import compute_statistics, BOOTSTRAP_CONFIDENCE
+from sketch import LogHistogram, SketchIndex, is_sketch_file, read_sketches, sketch_statistics
+import tracing
+from resources import Run, ResourceUsage, benchmark_window, clip_runs, cpu_rates, resource_usage
 import re
 import os
+import sqlite3
 
 PLOT_FONTSIZE = 12
+OUTPUT_FORMATS = ["svg", "png", "pdf"]
+# Resolution of PNG figures, vector formats only use it for rasterized artists
+DEFAULT_DPI = 300
 
 @dataclass
 class BenchmarkLineInfo:
@@ -21,6 +33,84 @@ class BenchmarkLineInfo:
     label: str
 
 
+@dataclass
+class RenderOptions:
+    output_dir: str
+    plot_types: list[str]
+    stats_only: bool = False
+    render_workers: int = 1
+    format: str = "svg"
+    dpi: int = DEFAULT_DPI
+    compact_svg: bool = False
+
+    def figure_file(self, name: str) -> str:
+        return f"{self.output_dir}/{name}.{self.format}"
+
+
+DataPointKey = tuple[str, str, str, str, str]
+
+
+class DataPointIndex:
+    # Groups the data points once by (benchmark_type, approach, cluster, data_type, payload_size) and keeps the
+    # input position of every value, so queries spanning several groups return values in input order
+    def __init__(self, columns: BenchmarkDataColumns):
+        key_columns = [columns.benchmark_type, columns.approach, columns.cluster, columns.data_type, columns.payload_size]
+        composite_key = np.zeros(len(columns), dtype=np.int64)
+        for column in key_columns:
+            composite_key = composite_key * max(len(column.categories), 1) + column.codes
+        order = np.argsort(composite_key, kind="stable")
+        sorted_key = composite_key[order]
+        boundaries = np.flatnonzero(sorted_key[1:] != sorted_key[:-1]) + 1
+        starts = np.concatenate(([0], boundaries)) if len(order) else np.empty(0, dtype=np.int64)
+        ends = np.concatenate((boundaries, [len(order)])) if len(order) else np.empty(0, dtype=np.int64)
+
+        # Per group: input positions, values, timestamps and per log numbers of the data points
+        self.groups: dict[DataPointKey, tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = {}
+        self.keys_by_series: dict[tuple[str, str, str], list[DataPointKey]] = {}
+        for start, end in zip(starts, ends):
+            positions = order[start:end]
+            key = tuple(column[positions[0]] for column in key_columns)
+            self.groups[key] = (positions, columns.value[positions], columns.timestamp[positions], columns.number[positions])
+            self.keys_by_series.setdefault((key[0], key[1], key[3]), []).append(key)
+
+    def __len__(self) -> int:
+        return sum(len(group[1]) for group in self.groups.values())
+
+    def _keys(self, benchmark_type: str, approach: str, data_type: str, cluster: str | None, payload_size: str | None) -> list[DataPointKey]:
+        return [
+            key for key in self.keys_by_series.get((benchmark_type, approach, data_type), [])
+            if (cluster is None or key[2] == cluster) and (payload_size is None or key[4] == payload_size)
+        ]
+
+    def values(self, benchmark_type: str, approach: str, data_type: str, cluster: str | None = None, payload_size: str | None = None) -> np.ndarray:
+        keys = self._keys(benchmark_type, approach, data_type, cluster, payload_size)
+        if not keys:
+            return np.empty(0, dtype=np.float64)
+        if len(keys) == 1:
+            return self.groups[keys[0]][1]
+        positions = np.concatenate([self.groups[key][0] for key in keys])
+        values = np.concatenate([self.groups[key][1] for key in keys])
+        return values[np.argsort(positions, kind="stable")]
+
+    def runs(self, benchmark_type: str, approach: str, data_type: str, cluster: str | None = None, payload_size: str | None = None) -> list[Run]:
+        # Values and timestamps split into the runs they were recorded in, numbering restarts with every log file
+        keys = self._keys(benchmark_type, approach, data_type, cluster, payload_size)
+        if not keys:
+            return []
+        order = np.argsort(np.concatenate([self.groups[key][0] for key in keys]), kind="stable")
+        values, timestamps, numbers = (np.concatenate([self.groups[key][i] for key in keys])[order] for i in (1, 2, 3))
+        starts = np.flatnonzero(numbers == 0)
+        if len(starts) == 0 or starts[0] != 0:
+            starts = np.concatenate(([0], starts))
+        return [(values[start:end], timestamps[start:end]) for start, end in zip(starts, np.append(starts[1:], len(values)))]
+
+    def payload_sizes(self, benchmark_type: str) -> set[str]:
+        return {key[4] for key in self.groups if key[0] == benchmark_type}
+
+    def data_types(self, benchmark_type: str) -> set[str]:
+        return {key[3] for key in self.groups if key[0] == benchmark_type}
+
+
 markers = {
     "same-cluster": "o",
     "load-balancer": "s",
@@ -58,45 +148,71 @@ colors = {
 }
 
 
-def generate_box_plot(plot_info: any, plot_data: list, labels: list, output_file: str):
+component_colors = {
+    "cilium-agent": "#44AA99",
+    "ztunnel": "#AA3377",
+    "istio-proxy": "#CC6677",
+    "linkerd-proxy": "#AA4499",
+    "skupper-router": "#882255",
+    "submariner-gateway": "#DDCC77",
+    "workload": "#332288",
+    "benchmark-client": "#999933",
+    "other": "#BBBBBB",
+}
+
+
+def new_figure():
+    # matplotlib is only imported once a figure is actually rendered. Every figure is a standalone object,
+    # no pyplot state is shared, so figures can be rendered in any process.
+    from matplotlib.figure import Figure
+    figure = Figure(figsize=(10, 5))
+    return figure, figure.subplots()
+
+
+def box_summary(stat: dict, label: str) -> dict:
+    # The box and whiskers of one series from its statistics, what boxplot would compute from the raw values
+    return {"label": label, "med": stat["median"], "q1": stat["q1"], "q3": stat["q3"], "whislo": stat["whisker_low"], "whishi": stat["whisker_high"], "fliers": []}
+
+
+def generate_box_plot(plot_info: any, plot_data: list[dict], labels: list, output_file: str):
+    # Drawn from the five-number summaries of box_summary, rendering does not depend on the number of samples
     plot_data = plot_data[::-1]
     labels = labels[::-1]
-    plt.figure(figsize=(10, 5))
-    box = plt.boxplot(plot_data, vert=False, patch_artist=True, widths=0.8, showfliers=False)
+    figure, ax = new_figure()
+    box = ax.bxp(plot_data, orientation='horizontal', patch_artist=True, widths=0.8, showfliers=False)
     for i, label in enumerate(labels):
         color = next((color_val for key, color_val in colors.items() if key in label), '#000000')
         box['boxes'][i].set_facecolor(color)
 
     if hasattr(plot_info, 'lower_bound') and plot_info['lower_bound'] is not None:
-        plt.xlim(left=plot_info['lower_bound'])
+        ax.set_xlim(left=plot_info['lower_bound'])
     if hasattr(plot_info, 'upper_bound') and plot_info['upper_bound'] is not None:
-        plt.xlim(right=plot_info['upper_bound'])
+        ax.set_xlim(right=plot_info['upper_bound'])
 
-    #plt.title(plot_info['plot_name'], fontsize=10)
-    plt.xlabel(f'{plot_info['measurement']} [{plot_info['unit']}] ({plot_info['better']} is better)', fontsize=PLOT_FONTSIZE)
-    plt.xticks(fontsize=PLOT_FONTSIZE)
-    plt.yticks(range(1, len(labels) + 1), labels, fontsize=PLOT_FONTSIZE)
+    #ax.set_title(plot_info['plot_name'], fontsize=10)
+    ax.set_xlabel(f'{plot_info['measurement']} [{plot_info['unit']}] ({plot_info['better']} is better)', fontsize=PLOT_FONTSIZE)
+    ax.tick_params(axis='x', labelsize=PLOT_FONTSIZE)
+    ax.set_yticks(range(1, len(labels) + 1), labels, fontsize=PLOT_FONTSIZE)
 
-    plt.gca().xaxis.grid(True, which='major', linestyle='-', linewidth=0.7, color='gray', alpha=0.5)
-    plt.gca().set_axisbelow(True)
+    ax.xaxis.grid(True, which='major', linestyle='-', linewidth=0.7, color='gray', alpha=0.5)
+    ax.set_axisbelow(True)
 
     if plot_info['lower_bound'] is not None:
-        plt.xlim(plot_info['lower_bound'], plot_info['upper_bound'])
+        ax.set_xlim(plot_info['lower_bound'], plot_info['upper_bound'])
 
-    plt.tight_layout(pad=1.0)
-    plt.savefig(output_file, dpi=300)
-    plt.close()
+    figure.tight_layout(pad=1.0)
+    figure.savefig(output_file)
 
 
 def generate_bar_chart(plot_info: any, plot_data: list, labels: list, output_file: str):
     plot_data = plot_data[::-1]
     labels = labels[::-1]
-    bar_colors = [next((color_val for key, color_val in colors.items() if key in label), '#000000') for label in labels]   
-    plt.figure(figsize=(10, 5))
-    bars = plt.barh(labels, plot_data, height=0.8, color=bar_colors)
+    bar_colors = [next((color_val for key, color_val in colors.items() if key in label), '#000000') for label in labels]
+    figure, ax = new_figure()
+    bars = ax.barh(labels, plot_data, height=0.8, color=bar_colors)
 
-    #plt.title(plot_info['plot_name'], fontsize=10)
-    plt.xlabel(f'{plot_info['measurement']} [{plot_info['unit']}] ({plot_info['better']} is better)', fontsize=PLOT_FONTSIZE)
+    #ax.set_title(plot_info['plot_name'], fontsize=10)
+    ax.set_xlabel(f'{plot_info['measurement']} [{plot_info['unit']}] ({plot_info['better']} is better)', fontsize=PLOT_FONTSIZE)
     labels = labels[::-1]
     for i, label in enumerate(labels):
         if i == 0:
@@ -106,89 +222,170 @@ def generate_bar_chart(plot_info: any, plot_data: list, labels: list, output_fil
         if split_label[0] == split_prev_label[0]:
             labels[i] = split_label[1]
     labels = labels[::-1]
-    plt.xticks(fontsize=PLOT_FONTSIZE)
-    plt.yticks(ticks=range(len(labels)), labels=labels, fontsize=PLOT_FONTSIZE)
+    ax.tick_params(axis='x', labelsize=PLOT_FONTSIZE)
+    ax.set_yticks(ticks=range(len(labels)), labels=labels, fontsize=PLOT_FONTSIZE)
 
-    plt.gca().xaxis.grid(True, which='major', linestyle='-', linewidth=0.7, color='gray', alpha=0.5)
-    plt.gca().set_axisbelow(True)
+    ax.xaxis.grid(True, which='major', linestyle='-', linewidth=0.7, color='gray', alpha=0.5)
+    ax.set_axisbelow(True)
 
     min_val = min(plot_data)
     max_val = max(plot_data)
     if min_val != max_val:
         margin = (max_val - min_val) * 0.1  # 10% margin
-        plt.xlim(min_val - margin, max_val + margin)
+        ax.set_xlim(min_val - margin, max_val + margin)
     else:
-        plt.xlim(min_val - 1, max_val + 1)
+        ax.set_xlim(min_val - 1, max_val + 1)
+
+    figure.tight_layout(pad=1.0)
+    figure.savefig(output_file)
+
 
-    plt.tight_layout(pad=1.0)
-    plt.savefig(output_file, dpi=300)
-    plt.close()
+# Labels of the x axis of the comparison line plots, by what the payload size of the benchmark varies
+x_axis_labels = {
+    "pld": "Payload Size",
+    "par": "Amount of Parallel Streams",
+    "rate": "Offered Request Rate [requests/s]",
+}
 
 
-def generate_line_plot(plot_info: any, plot_data: list[BenchmarkLineInfo], output_file: str):
-    plt.figure(figsize=(10, 5))
+def generate_line_plot(plot_info: any, plot_data: list[BenchmarkLineInfo], x_axis: str, output_file: str):
+    figure, ax = new_figure()
     for line_info in plot_data:
-        plt.plot(line_info.x, line_info.y, marker=markers[line_info.label], color=colors[line_info.label], label=line_info.label)
-
-    #plt.title(plot_info['plot_name'], fontsize=10)
-    if "payload" in plot_info['plot_name'].lower():
-        xlabel = "Payload Size"
-    elif "parallel" in plot_info['plot_name'].lower():
-        xlabel = "Amount of Parallel Streams"
-    plt.xlabel(xlabel, fontsize=PLOT_FONTSIZE)
-    plt.ylabel(f'{plot_info['measurement']} [{plot_info['unit']}] ({plot_info['better']} is better)', fontsize=PLOT_FONTSIZE)
-    plt.xticks(fontsize=PLOT_FONTSIZE)
-    plt.legend(fontsize=PLOT_FONTSIZE, loc='best')
-
-    plt.gca().xaxis.grid(True, which='major', linestyle='-', linewidth=0.7, color='gray', alpha=0.5)
-    plt.gca().yaxis.grid(True, which='major', linestyle='-', linewidth=0.7, color='gray', alpha=0.5)
-    plt.gca().set_axisbelow(True)
+        ax.plot(line_info.x, line_info.y, marker=markers[line_info.label], color=colors[line_info.label], label=line_info.label)
+
+    #ax.set_title(plot_info['plot_name'], fontsize=10)
+    ax.set_xlabel(x_axis_labels[x_axis], fontsize=PLOT_FONTSIZE)
+    ax.set_ylabel(f'{plot_info['measurement']} [{plot_info['unit']}] ({plot_info['better']} is better)', fontsize=PLOT_FONTSIZE)
+    ax.tick_params(axis='x', labelsize=PLOT_FONTSIZE)
+    ax.legend(fontsize=PLOT_FONTSIZE, loc='best')
+
+    ax.xaxis.grid(True, which='major', linestyle='-', linewidth=0.7, color='gray', alpha=0.5)
+    ax.yaxis.grid(True, which='major', linestyle='-', linewidth=0.7, color='gray', alpha=0.5)
+    ax.set_axisbelow(True)
 
     max_y = max(max(line.y) for line in plot_data)
     if plot_info['lower_bound'] is not None and max_y < plot_info['upper_bound']:
-        plt.ylim(plot_info['lower_bound'], plot_info['upper_bound'])
+        ax.set_ylim(plot_info['lower_bound'], plot_info['upper_bound'])
 
-    plt.tight_layout(pad=1.0)
-    plt.savefig(output_file, dpi=300)
-    plt.close()
+    figure.tight_layout(pad=1.0)
+    figure.savefig(output_file)
 
 
-def generate_statistics(plot_data: list, labels: list, output_file: str):
-    stats = []
-    for index, data in enumerate(plot_data):
-        series = pd.Series(data)
-        x = np.arange(len(series))
-        y = series.values
-        df = pd.DataFrame({'x': x, 'y': y})
-        try:
-            model = ols('y ~ x', data=df).fit()
-            coef = float(model.params['x'])
-            std_err = float(model.bse['x'])
-            t_value = float(model.tvalues['x'])
-            p_value = float(model.pvalues['x'])
-            r_squared = float(model.rsquared)
-        except Exception:
-            coef = std_err = t_value = p_value = r_squared = None
-        stat = {
-            'name': labels[index],
-            'min': float(series.min()),
-            'q1': float(series.quantile(0.25)),
-            'median': float(series.median()),
-            'q3': float(series.quantile(0.75)),
-            'max': float(series.max()),
-            'mean': float(series.mean()),
-            'std': float(series.std()),
-            'coef': coef,
-            'std_err': std_err,
-            't_value': t_value,
-            'p_value': p_value,
-            'r_squared': r_squared
-        }
-        stats.append(stat)
+def generate_stacked_bar_chart(plot_info: any, segments: list[str], plot_data: list[list[float]], labels: list, output_file: str):
+    plot_data = plot_data[::-1]
+    labels = labels[::-1]
+    figure, ax = new_figure()
+    left = np.zeros(len(labels))
+    for i, segment in enumerate(segments):
+        widths = np.array([values[i] for values in plot_data])
+        ax.barh(labels, widths, left=left, height=0.8, color=component_colors.get(segment, '#000000'), label=segment)
+        left += widths
+
+    ax.set_xlabel(f'{plot_info['measurement']} [{plot_info['unit']}] ({plot_info['better']} is better)', fontsize=PLOT_FONTSIZE)
+    ax.tick_params(axis='x', labelsize=PLOT_FONTSIZE)
+    ax.set_yticks(ticks=range(len(labels)), labels=labels, fontsize=PLOT_FONTSIZE)
+    ax.legend(fontsize=PLOT_FONTSIZE, loc='best')
+
+    ax.xaxis.grid(True, which='major', linestyle='-', linewidth=0.7, color='gray', alpha=0.5)
+    ax.set_axisbelow(True)
+
+    figure.tight_layout(pad=1.0)
+    figure.savefig(output_file)
+
+
+def nines(percentile: float) -> float:
+    # Maps p50, p90, p99, p99.9, ... to 0.3, 1, 2, 3, ... so every additional nine of the tail gets the same width
+    return -np.log10(1 - percentile / 100)
+
+
+def generate_percentile_plot(plot_info: any, plot_data: list[BenchmarkLineInfo], output_file: str):
+    figure, ax = new_figure()
+    percentiles = sorted({percentile for line_info in plot_data for percentile in line_info.x})
+    for line_info in plot_data:
+        ax.plot([nines(percentile) for percentile in line_info.x], line_info.y, marker=markers[line_info.label], color=colors[line_info.label], label=line_info.label)
+
+    ax.set_xticks([nines(percentile) for percentile in percentiles], [f"p{percentile:g}" for percentile in percentiles], fontsize=PLOT_FONTSIZE)
+    ax.set_yscale('log')
+    ax.set_xlabel("Percentile", fontsize=PLOT_FONTSIZE)
+    ax.set_ylabel(f'{plot_info['measurement']} [{plot_info['unit']}] ({plot_info['better']} is better)', fontsize=PLOT_FONTSIZE)
+    ax.tick_params(axis='y', labelsize=PLOT_FONTSIZE)
+    ax.legend(fontsize=PLOT_FONTSIZE, loc='best')
+
+    ax.xaxis.grid(True, which='major', linestyle='-', linewidth=0.7, color='gray', alpha=0.5)
+    ax.yaxis.grid(True, which='both', linestyle='-', linewidth=0.7, color='gray', alpha=0.3)
+    ax.set_axisbelow(True)
+
+    figure.tight_layout(pad=1.0)
+    figure.savefig(output_file)
 
+
+@dataclass
+class RenderJob:
+    function: Callable
+    arguments: tuple
+    output_file: str
+
+
+def init_render_worker(dpi: int = DEFAULT_DPI, compact_svg: bool = False):
+    import matplotlib
+    matplotlib.use("Agg")
+    matplotlib.rcParams["savefig.dpi"] = dpi
+    if compact_svg:
+        # Text as <text> elements instead of a path per glyph, the viewer needs the fonts. Fixed ids keep the
+        # files identical between runs, so unchanged figures do not show up in diffs.
+        matplotlib.rcParams["svg.fonttype"] = "none"
+        matplotlib.rcParams["svg.hashsalt"] = "plots"
+
+
+def render_job(job: RenderJob) -> tuple[str, int, float, float]:
+    started = tracing.now_us()
+    start = time.perf_counter()
+    job.function(*job.arguments, job.output_file)
+    return job.output_file, os.getpid(), started, time.perf_counter() - start
+
+
+def render_jobs(jobs: list[RenderJob], workers: int, dpi: int = DEFAULT_DPI, compact_svg: bool = False):
+    logger.info(f"Rendering {len(jobs)} figures with {workers} worker processes")
+    start = time.perf_counter()
+    if workers <= 1 or len(jobs) <= 1:
+        init_render_worker(dpi, compact_svg)
+        results = map(render_job, jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_render_worker, initargs=(dpi, compact_svg))
+        results = executor.map(render_job, jobs)
+    worker_times: dict[int, float] = {}
+    try:
+        for output_file, pid, started, wall_time in results:
+            logger.info(f"Rendered {output_file} in {wall_time:.2f}s (worker {pid})")
+            tracing.name_process(pid, "render worker")
+            tracing.record(f"render {os.path.basename(output_file)}", "figure", started, wall_time * 1e6, pid=pid)
+            worker_times[pid] = worker_times.get(pid, 0.0) + wall_time
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    for pid, wall_time in worker_times.items():
+        logger.info(f"Worker {pid} spent {wall_time:.2f}s rendering")
+    logger.info(f"Rendered {len(jobs)} figures in {time.perf_counter() - start:.2f}s")
+
+
+def generate_statistics(plot_data: list, labels: list, output_file: str, extra: list[dict] | None = None) -> list[dict]:
+    with tracing.span(f"statistics {os.path.basename(output_file)}", "statistics", series=len(plot_data)):
+        return write_statistics(plot_data, labels, output_file, extra)
+
+
+def write_statistics(plot_data: list, labels: list, output_file: str, extra: list[dict] | None = None) -> list[dict]:
+    if plot_data and all(isinstance(data, LogHistogram) for data in plot_data):
+        computed = sketch_statistics(plot_data, BOOTSTRAP_CONFIDENCE)
+    else:
+        computed = compute_statistics(plot_data)
+    stats = [{'name': label, **stat} for label, stat in zip(labels, computed)]
+    for stat, fields in zip(stats, extra or []):
+        stat.update(fields)
     with open(output_file, 'w') as f:
         json.dump(stats, f, indent=2)
-    pass
+    return stats
+
 
 plots = [
     ["benchmark", generate_box_plot],
@@ -196,8 +393,18 @@ plots = [
     ["metrics-memory", generate_bar_chart],
     ["efficiency-cpu", generate_bar_chart],
     ["efficiency-memory", generate_bar_chart],
+    # Further measurements of the iperf logs, named like their data types
+    [IPERF_RETRANSMITS, generate_box_plot],
+    [IPERF_JITTER, generate_box_plot],
+    [IPERF_LOST_PERCENT, generate_box_plot],
+    ["throughput-per-cpu", generate_bar_chart],
 ]
 
+# Plot types that need the cadvisor metrics of the participants
+resource_plot_types = ["metrics-cpu", "metrics-memory", "efficiency-cpu", "efficiency-memory"]
+
+iperf_plot_types = [IPERF_RETRANSMITS, IPERF_JITTER, IPERF_LOST_PERCENT, "throughput-per-cpu", "fairness"]
+
 info = {
     "nginx-curl": {
         "plot_name": "Nginx Curl Benchmark",
@@ -206,6 +413,8 @@ info = {
         "better": "lower",
         "lower_bound": 0,
         "upper_bound": 10,
+        # Work done per second, one benchmark value is one completed request
+        "work": {"data_type": "benchmark", "aggregate": "count", "measurement": "Requests", "amount": "requests"},
     },
     "nginx-wrk-small": {
         "plot_name": "Nginx Wrk Benchmark",
@@ -214,6 +423,7 @@ info = {
         "better": "lower",
         "lower_bound": 0,
         "upper_bound": 1,
+        "work": {"data_type": "requests-per-second", "aggregate": "mean", "measurement": "Requests", "amount": "requests"},
     },
     "nginx-wrk": {
         "plot_name": "Nginx Wrk Benchmark",
@@ -222,6 +432,7 @@ info = {
         "better": "lower",
         "lower_bound": 0,
         "upper_bound": 50,
+        "work": {"data_type": "requests-per-second", "aggregate": "mean", "measurement": "Requests", "amount": "requests"},
     },
     "iperf-tcp": {
         "plot_name": "Iperf TCP Network Throughput Benchmark",
@@ -230,6 +441,7 @@ info = {
         "better": "higher",
         "lower_bound": 0,
         "upper_bound": 60,
+        "work": {"data_type": "benchmark", "aggregate": "mean", "measurement": "Throughput", "amount": "Gbit"},
     },
     "iperf-udp": {
         "plot_name": "Iperf UDP Network Throughput Benchmark",
@@ -238,11 +450,12 @@ info = {
         "better": "higher",
         "lower_bound": 0,
         "upper_bound": 60,
+        "work": {"data_type": "benchmark", "aggregate": "mean", "measurement": "Throughput", "amount": "Gbit"},
     },
     "metrics-cpu": {
-        "plot_name": "CPU Seconds used",
-        "measurement": "CPU Seconds",
-        "unit": "s",
+        "plot_name": "Average CPU used",
+        "measurement": "CPU",
+        "unit": "cores",
         "better": "lower",
     },
     "metrics-memory": {
@@ -251,33 +464,84 @@ info = {
         "unit": "MiB",
         "better": "lower",
     },
+    "components-cpu": {
+        "plot_name": "CPU Seconds used per component",
+        "measurement": "CPU Seconds per Run",
+        "unit": "s",
+        "better": "lower",
+    },
+    "components-memory": {
+        "plot_name": "Peak Memory used per component",
+        "measurement": "Peak Memory",
+        "unit": "MiB",
+        "better": "lower",
+    },
     "efficiency-cpu": {
         "plot_name": "CPU Efficiency",
-        "measurement": "CPU Second",
-        "unit": "s",
+        "measurement": "Core Second",
+        "unit": "{amount} / core-second",
     },
     "efficiency-memory": {
         "plot_name": "Memory Efficiency",
-        "measurement": "MiB of Peak Memory",
-        "unit": "MiB",
+        "measurement": "GiB of Average Memory",
+        "unit": "{amount}/s / GiB",
+    },
+    IPERF_RETRANSMITS: {
+        "plot_name": "TCP Retransmits",
+        "measurement": "TCP Retransmits",
+        "unit": "segments/s",
+        "better": "lower",
+        "lower_bound": None,
+        "upper_bound": None,
+    },
+    IPERF_JITTER: {
+        "plot_name": "UDP Jitter",
+        "measurement": "Jitter",
+        "unit": "ms",
+        "better": "lower",
+        "lower_bound": None,
+        "upper_bound": None,
+    },
+    IPERF_LOST_PERCENT: {
+        "plot_name": "UDP Packet Loss",
+        "measurement": "Lost Packets",
+        "unit": "%",
+        "better": "lower",
+        "lower_bound": None,
+        "upper_bound": None,
+    },
+    "fairness": {
+        "plot_name": "Fairness of the parallel streams",
+        "measurement": "Jain's Fairness Index",
+        "unit": "1/n to 1",
+        "better": "higher",
+        "lower_bound": 0,
+        "upper_bound": 1.05,
+    },
+    "throughput-per-cpu": {
+        "plot_name": "Throughput per CPU utilization measured by iperf",
+        "measurement": "Throughput per CPU Utilization",
+        "unit": "Gbit/s / %",
+        "better": "higher",
     },
 }
 
 
 def get_plot_info(benchmark: str, plot_type: str, ) -> any:
-    benchmark_info = info[benchmark.removesuffix("-pld").removesuffix("-par")]
+    benchmark_info = info[benchmark.removesuffix("-pld").removesuffix("-par").removesuffix("-rate")]
     plot_type_info = info.get(plot_type, {})
 
+    # Always a new dict, render jobs keep the returned info until a worker draws them and info is shared by all of them
     if plot_type == "benchmark":
-        return benchmark_info
-    elif "metrics" in plot_type:
-        plot_type_info['plot_name'] = f"{benchmark_info['plot_name']} ({plot_type_info['plot_name']})"
-        return plot_type_info
+        return dict(benchmark_info)
+    elif "metrics" in plot_type or "components" in plot_type or plot_type in iperf_plot_types:
+        return {**plot_type_info, "plot_name": f"{benchmark_info['plot_name']} ({plot_type_info['plot_name']})"}
     elif "efficiency" in plot_type:
+        work = benchmark_info["work"]
         return {
             "plot_name": f"{plot_type_info['plot_name']} for {benchmark_info['plot_name']}",
-            "measurement": f"{benchmark_info['measurement']} per {plot_type_info['measurement']}",
-            "unit": f"{benchmark_info['unit']} / {plot_type_info['unit']}",
+            "measurement": f"{work['measurement']} per {plot_type_info['measurement']}",
+            "unit": plot_type_info['unit'].format(amount=work['amount']),
             "better": "higher"
         }
     elif plot_type == "comparison":
@@ -285,166 +549,478 @@ def get_plot_info(benchmark: str, plot_type: str, ) -> any:
             plot_name = f"Comparison of {benchmark_info['plot_name']} across payload sizes"
         elif benchmark.endswith("-par"):
             plot_name = f"Comparison of {benchmark_info['plot_name']} across amount of parallel streams"
-        benchmark_info['plot_name'] = plot_name
-        return benchmark_info
+        elif benchmark.endswith("-rate"):
+            plot_name = f"Comparison of {benchmark_info['plot_name']} across offered request rates"
+        return {**benchmark_info, "plot_name": plot_name}
+    elif plot_type == "latency-percentiles":
+        return {**benchmark_info, "plot_name": f"Latency percentiles of {benchmark_info['plot_name']}"}
     else:
         logger.error(f"Unknown plot type: {plot_type} for benchmark: {benchmark}")
         return {}
 
 
-def render_plots_without_payload_size(benchmark: str, data_points: list[BenchmarkDataPoint], current_time: str):
+@dataclass
+class ParticipantResources:
+    usage: ResourceUsage
+    cpu_rates: np.ndarray
+    memory: np.ndarray
+
+
+def benchmark_windows(benchmark: str, approach: str, index: DataPointIndex) -> list[tuple[float, float] | None]:
+    windows = [benchmark_window(timestamps) for _, timestamps in index.runs(benchmark, approach, "benchmark")]
+    untimed = windows.count(None)
+    if untimed:
+        logger.warning(f"{untimed} of {len(windows)} runs of {benchmark} {approach} have no benchmark timestamps, their resource usage covers the whole run")
+    return windows
+
+
+def participant_resources(benchmark: str, approach: str, index: DataPointIndex) -> dict[str, ParticipantResources]:
+    # Resource usage of both clusters (whole node) and of the benchmark client container, limited to the time the
+    # benchmark ran where the benchmark log records it
+    windows = benchmark_windows(benchmark, approach, index)
+    resources = {}
+    for cluster in clusters:
+        if cluster == "client":
+            cpu_runs = index.runs(benchmark, approach, component_data_type("cpu", "benchmark-client"))
+            memory_runs = index.runs(benchmark, approach, component_data_type("memory", "benchmark-client"))
+        else:
+            cpu_runs = index.runs(benchmark, approach, "metrics-cpu", cluster=cluster)
+            memory_runs = index.runs(benchmark, approach, "metrics-memory", cluster=cluster)
+        if not cpu_runs and not memory_runs:
+            continue
+        cpu_runs = clip_runs(cpu_runs, windows)
+        memory_runs = clip_runs(memory_runs, windows)
+        resources[cluster] = ParticipantResources(
+            usage=resource_usage(cpu_runs, memory_runs),
+            cpu_rates=np.concatenate([cpu_rates(run) for run in cpu_runs]) if cpu_runs else np.empty(0),
+            memory=np.concatenate([values for values, _ in memory_runs]) if memory_runs else np.empty(0),
+        )
+    return resources
+
+
+def work_rate(benchmark: str, approach: str, index: DataPointIndex, duration: float) -> float | None:
+    work = info[benchmark]["work"]
+    values = index.values(benchmark, approach, work["data_type"])
+    if len(values) < 1:
+        return None
+    if work["aggregate"] == "count":
+        return len(values) / duration if duration > 0 else None
+    return float(np.mean(values))
+
+
+def throughput_per_cpu(benchmark: str, approach: str, cpu_data_type: str, index: DataPointIndex) -> np.ndarray:
+    # Mean throughput of every iperf run over the CPU utilization iperf measured on one end of the same run, both
+    # are in input order and every complete log has one of each
+    runs = index.runs(benchmark, approach, "benchmark")
+    cpu = index.values(benchmark, approach, cpu_data_type)
+    if len(runs) != len(cpu):
+        if len(cpu):
+            logger.warning(f"Skipping {cpu_data_type} of {benchmark} {approach}, {len(cpu)} CPU values for {len(runs)} runs")
+        return np.empty(0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = np.array([np.mean(values) for values, _ in runs]) / cpu
+    return ratios[np.isfinite(ratios)]
+
+
+def render_plots_without_payload_size(benchmark: str, index: DataPointIndex | SketchIndex, options: RenderOptions) -> list[RenderJob]:
+    jobs = []
+    resources = {}
     for [plot, function] in plots:
+        if plot not in options.plot_types:
+            continue
         data_points_for_plot = []
+        stats_data = []
+        stats_extra = []
         labels = []
         for approach in approaches:
             if "udp" in benchmark and approach not in ["load-balancer", "same-cluster", "cilium-none", "cilium-ipsec", "cilium-wireguard"]:
                 continue
+            if plot in resource_plot_types and approach not in resources:
+                resources[approach] = participant_resources(benchmark, approach, index)
             if plot == "metrics-cpu":
-                for cluster in clusters:
-                    possible_data_points = [dp.value for dp in data_points if dp.benchmark_type == benchmark and dp.approach == approach and dp.cluster == cluster and dp.data_type == plot]
-                    if possible_data_points is None or len(possible_data_points) < 1:
+                for cluster, participant in resources[approach].items():
+                    if cluster == "client" or not np.isfinite(participant.usage.average_cores):
                         continue
                     labels.append(f"{approach} ({cluster})")
-                    data_points_for_plot.append(possible_data_points[1]-possible_data_points[0])
+                    data_points_for_plot.append(participant.usage.average_cores)
+                    stats_data.append(participant.cpu_rates)
             elif plot == "metrics-memory":
-                for cluster in clusters:
-                    possible_data_points = [dp.value for dp in data_points if dp.benchmark_type == benchmark and dp.approach == approach and dp.cluster == cluster and dp.data_type == plot]
-                    if possible_data_points is None or len(possible_data_points) < 1:
+                for cluster, participant in resources[approach].items():
+                    if cluster == "client" or len(participant.memory) < 1:
                         continue
                     labels.append(f"{approach} ({cluster})")
-                    data_points_for_plot.append(max(possible_data_points))
-            elif plot == "efficiency-cpu":
-                cpu_metrics = []
-                for cluster in clusters:
-                    possible_data_points = [dp.value for dp in data_points if dp.benchmark_type == benchmark and dp.approach == approach and dp.cluster == cluster and dp.data_type == "metrics-cpu"]
-                    if possible_data_points is None or len(possible_data_points) < 1:
-                        continue
-                    cpu_metrics.append(possible_data_points[1]-possible_data_points[0])
-                possible_data_points = [dp.value for dp in data_points if dp.benchmark_type == benchmark and dp.approach == approach and dp.data_type == "benchmark"]
-                if possible_data_points is None or len(possible_data_points) < 1:
+                    data_points_for_plot.append(participant.usage.peak_memory_mib)
+                    stats_data.append(participant.memory)
+            elif plot in ["efficiency-cpu", "efficiency-memory"]:
+                # Work per resource summed over all clusters taking part, the client node included
+                usages = [participant.usage for cluster, participant in resources[approach].items() if cluster != "client"]
+                if not usages:
                     continue
-                cpu_metric = max(cpu_metrics)
-                benchmark_metric = np.mean(possible_data_points)
-                efficiency = benchmark_metric / cpu_metric if cpu_metric > 0 else 0
-                labels.append(f"{approach}")
-                data_points_for_plot.append(efficiency)
-            elif plot == "efficiency-memory":
-                memory_metric = 0
-                for cluster in clusters:
-                    possible_data_points = [dp.value for dp in data_points if dp.benchmark_type == benchmark and dp.approach == approach and dp.cluster == cluster and dp.data_type == "metrics-memory"]
-                    if possible_data_points is None or len(possible_data_points) < 1:
-                        continue
-                possible_data_points = [dp.value for dp in data_points if dp.benchmark_type == benchmark and dp.approach == approach and dp.data_type == "benchmark"]
-                if possible_data_points is None or len(possible_data_points) < 1:
+                rate = work_rate(benchmark, approach, index, max(usage.duration for usage in usages))
+                if plot == "efficiency-cpu":
+                    cost = sum(usage.average_cores for usage in usages if np.isfinite(usage.average_cores))
+                else:
+                    cost = sum(usage.average_memory_mib for usage in usages if np.isfinite(usage.average_memory_mib)) / 1024
+                if rate is None or cost <= 0:
                     continue
-                memory_metric = max(possible_data_points)
-                benchmark_metric = np.mean(possible_data_points)
-                efficiency = benchmark_metric / memory_metric if memory_metric > 0 else 0
-                labels.append(f"{approach}")
-                data_points_for_plot.append(efficiency)
+                labels.append(approach)
+                data_points_for_plot.append(rate / cost)
+                stats_data.append(rate / cost)
+            elif plot == "throughput-per-cpu":
+                for side, data_type in [("sender", IPERF_CPU_SENDER), ("receiver", IPERF_CPU_RECEIVER)]:
+                    ratios = throughput_per_cpu(benchmark, approach, data_type, index)
+                    if len(ratios) < 1:
+                        continue
+                    labels.append(f"{approach} ({side})")
+                    data_points_for_plot.append(float(np.mean(ratios)))
+                    stats_data.append(ratios)
             else:
-                possible_data_points = [dp.value for dp in data_points if dp.benchmark_type == benchmark and dp.approach == approach and dp.data_type == plot]
-                if possible_data_points is None or len(possible_data_points) < 1:
+                possible_data_points = index.values(benchmark, approach, plot)
+                if len(possible_data_points) < 1:
                     continue
                 labels.append(approach)
-                data_points_for_plot.append(possible_data_points)
+                stats_data.append(possible_data_points)
+                sample_counts = index.values(benchmark, approach, SAMPLE_COUNT)
+                # Iterations the clients ran, which differ between approaches with adaptive stopping
+                stats_extra.append({'samples_collected': int(sample_counts.sum())} if len(sample_counts) else {})
 
-        if not data_points_for_plot:
+        if not stats_data:
             continue
 
-        plot_info = get_plot_info(benchmark, plot)
-        logger.info(f"Plotting {benchmark} with {plot} approaches: {labels}")
-        function(plot_info, data_points_for_plot, labels, f"results/{current_time}/{benchmark}-{plot}.svg")
-        generate_statistics(data_points_for_plot, labels, f"results/{current_time}/{benchmark}-{plot}-stats.json")
+        stats = generate_statistics(stats_data, labels, f"{options.output_dir}/{benchmark}-{plot}-stats.json", stats_extra)
+        if function is generate_box_plot:
+            # Only the summaries go to the render workers, not every sample
+            data_points_for_plot = [box_summary(stat, label) for stat, label in zip(stats, labels)]
+        if not options.stats_only:
+            plot_info = get_plot_info(benchmark, plot)
+            logger.info(f"Plotting {benchmark} with {plot} approaches: {labels}")
+            jobs.append(RenderJob(function, (plot_info, data_points_for_plot, labels), options.figure_file(f"{benchmark}-{plot}")))
+
+    if resources and any(plot in options.plot_types for plot in ["metrics-cpu", "metrics-memory"]):
+        report = {
+            approach: {cluster: participant.usage.to_dict() for cluster, participant in participants.items()}
+            for approach, participants in resources.items() if participants
+        }
+        if report:
+            with open(f"{options.output_dir}/{benchmark}-resources.json", 'w') as f:
+                json.dump(report, f, indent=2)
+    return jobs
 
 
-def render_plots_with_payload_size(benchmark: str, data_points: list[BenchmarkDataPoint], current_time: str):
-    plot_data = []
+def series_mean(values: np.ndarray | LogHistogram) -> float:
+    return values.mean() if isinstance(values, LogHistogram) else np.mean(values)
 
-    def parse_size(size):
-        if size is None:
-            return -1
-        size_str = str(size).strip().upper()
-        match = re.match(r"(\d+(?:\.\d+)?)([A-Z]+)?", size_str)
-        if not match:
-            return -1
-        num, unit = match.groups()
-        num = float(num)
-        unit_multipliers = {
-            None: 1,
-            "B": 1,
-            "KB": 1024,
-            "MB": 1024**2,
-            "GB": 1024**3,
-            "TB": 1024**4,
-        }
-        multiplier = unit_multipliers.get(unit, 1)
-        return num * multiplier
 
-    payload_sizes = sorted(
-        set(dp.payload_size for dp in data_points if dp.payload_size if dp.benchmark_type == benchmark  is not None),
-        key=parse_size
+def series_median(values: np.ndarray | LogHistogram) -> float:
+    return values.quantile(0.5) if isinstance(values, LogHistogram) else np.median(values)
+
+
+def render_latency_percentile_plot(benchmark: str, index: DataPointIndex | SketchIndex, options: RenderOptions) -> list[RenderJob]:
+    if "latency-percentiles" not in options.plot_types:
+        return []
+    percentiles = sorted(
+        percentile for percentile in (
+            float(data_type.removeprefix(LATENCY_PERCENTILE_PREFIX))
+            for data_type in index.data_types(benchmark) if data_type.startswith(LATENCY_PERCENTILE_PREFIX)
+        )
+        # p100 (the maximum, printed by wrk2) has no place on the nines axis
+        if percentile < 100
     )
-    payload_sizes = [ps for ps in payload_sizes if str(ps).lower() != "none"]
+    if not percentiles:
+        return []
+
+    plot_data = []
+    stats_data = []
+    stats_labels = []
     for approach in approaches:
         x = []
         y = []
-        for payload_size in payload_sizes:
-            values = [
-                dp.value
-                for dp in data_points
-                if dp.benchmark_type == benchmark
-                and dp.approach == approach
-                and dp.data_type == "benchmark"
-                and dp.payload_size == payload_size
-            ]
-            x.append(payload_size)
-            y.append(np.mean(values) if values else 0)
-        if x and y and any(y):
+        for percentile in percentiles:
+            # One value per wrk run, the line follows the median run
+            values = index.values(benchmark, approach, f"{LATENCY_PERCENTILE_PREFIX}{percentile:g}")
+            if len(values) < 1:
+                continue
+            x.append(percentile)
+            y.append(float(series_median(values)))
+            stats_data.append(values)
+            stats_labels.append(f"{approach} p{percentile:g}")
+        if x:
             plot_data.append(BenchmarkLineInfo(x=x, y=y, label=approach))
 
     if not plot_data:
-        return
+        return []
+
+    generate_statistics(stats_data, stats_labels, f"{options.output_dir}/{benchmark}-latency-percentiles-stats.json")
+    if options.stats_only:
+        return []
+    logger.info(f"Plotting {benchmark} latency percentiles {percentiles} with approaches: {[line.label for line in plot_data]}")
+    plot_info = get_plot_info(benchmark, "latency-percentiles")
+    return [RenderJob(generate_percentile_plot, (plot_info, plot_data), options.figure_file(f"{benchmark}-latency-percentiles"))]
 
-    logger.info(f"Plotting {benchmark} with approaches: {[line.label for line in plot_data]} and payload sizes: {payload_sizes}")
-    plot_info = get_plot_info(benchmark, "comparison")
-    generate_line_plot(plot_info, plot_data, f"results/{current_time}/{benchmark}-comparison.svg")
+
+def render_component_plots(benchmark: str, index: DataPointIndex, options: RenderOptions) -> list[RenderJob]:
+    jobs = []
+    for resource in ["cpu", "memory"]:
+        plot = f"components-{resource}"
+        if plot not in options.plot_types:
+            continue
+        labels = []
+        plot_data = []
+        for approach in approaches:
+            windows = benchmark_windows(benchmark, approach, index)
+            usage = {}
+            for component in components:
+                data_type = component_data_type(resource, component)
+                total = 0.0
+                for cluster in clusters:
+                    runs = clip_runs(index.runs(benchmark, approach, data_type, cluster=cluster), windows)
+                    # Counters restart with every pod and logs of different cells lie hours apart, so usage is taken
+                    # per run within its benchmark window: CPU seconds of the counter increases and the peak memory.
+                    # Runs are averaged, the clusters summed.
+                    if resource == "cpu":
+                        per_run = [resource_usage([run], []).cpu_seconds for run in runs]
+                    else:
+                        per_run = [resource_usage([], [run]).peak_memory_mib for run in runs]
+                    per_run = [value for value in per_run if np.isfinite(value)]
+                    if per_run:
+                        total += float(np.mean(per_run))
+                if total:
+                    usage[component] = total
+            if usage:
+                labels.append(approach)
+                plot_data.append(usage)
+        if not plot_data:
+            continue
+
+        segments = [component for component in components if any(component in usage for usage in plot_data)]
+        stacked = [[usage.get(component, 0.0) for component in segments] for usage in plot_data]
+        generate_statistics(
+            [value for values in stacked for value in values],
+            [f"{label} {component}" for label in labels for component in segments],
+            f"{options.output_dir}/{benchmark}-{plot}-stats.json",
+        )
+        if options.stats_only:
+            continue
+        logger.info(f"Plotting {benchmark} with {plot} approaches: {labels} components: {segments}")
+        plot_info = get_plot_info(benchmark, plot)
+        jobs.append(RenderJob(generate_stacked_bar_chart, (plot_info, segments, stacked, labels), options.figure_file(f"{benchmark}-{plot}")))
+    return jobs
 
 
-def get_data_points(input: str) -> list[BenchmarkDataPoint]:
-    data_points = []
-    for line in input.strip().splitlines():
-        if line.strip():
-            obj = json.loads(line)
-            data_points.append(BenchmarkDataPoint(**obj))
-    return data_points
+RATE_COMPARISON_PERCENTILES = [50, 99, 99.9]
 
 
-def get_input_data() -> str:
-    if len(sys.argv) > 1:
-        input_file = sys.argv[1]
-        with open(input_file, 'r') as f:
-            return f.read()
+def parse_payload_size(size) -> float:
+    if size is None:
+        return -1
+    size_str = str(size).strip().upper()
+    match = re.match(r"(\d+(?:\.\d+)?)([A-Z]+)?", size_str)
+    if not match:
+        return -1
+    num, unit = match.groups()
+    num = float(num)
+    unit_multipliers = {
+        None: 1,
+        "B": 1,
+        "KB": 1024,
+        "MB": 1024**2,
+        "GB": 1024**3,
+        "TB": 1024**4,
+    }
+    multiplier = unit_multipliers.get(unit, 1)
+    return num * multiplier
+
+
+# Further measurements compared across payload sizes, parallel streams or rates, by plot type
+comparison_data_types = {
+    IPERF_RETRANSMITS: IPERF_RETRANSMITS,
+    IPERF_LOST_PERCENT: IPERF_LOST_PERCENT,
+    "fairness": IPERF_FAIRNESS,
+}
+
+# Fairness is compared across the number of parallel streams, -pld runs a fixed number of streams at every payload size
+comparison_benchmark_suffixes = {
+    "fairness": "-par",
+}
+
+
+def render_plots_with_payload_size(benchmark: str, index: DataPointIndex | SketchIndex, options: RenderOptions) -> list[RenderJob]:
+    if options.stats_only:
+        return []
+
+    # -pld, -par or -rate
+    x_axis = benchmark.rsplit("-", 1)[1]
+    payload_sizes = sorted(
+        (ps for ps in index.payload_sizes(benchmark) if ps),
+        key=parse_payload_size
+    )
+    payload_sizes = [ps for ps in payload_sizes if str(ps).lower() != "none"]
+
+    def comparison_lines(data_type: str, aggregate: Callable, sizes: list[str] = payload_sizes) -> list[BenchmarkLineInfo]:
+        lines = []
+        for approach in approaches:
+            x = []
+            y = []
+            for payload_size in sizes:
+                values = index.values(benchmark, approach, data_type, payload_size=payload_size)
+                x.append(payload_size)
+                y.append(aggregate(values) if len(values) else 0)
+            if x and y and any(y):
+                lines.append(BenchmarkLineInfo(x=x, y=y, label=approach))
+        return lines
+
+    jobs = []
+    data_types = index.data_types(benchmark)
+    for plot, data_type in comparison_data_types.items():
+        if plot not in options.plot_types or data_type not in data_types or not benchmark.endswith(comparison_benchmark_suffixes.get(plot, "")):
+            continue
+        sizes = payload_sizes
+        if data_type == IPERF_FAIRNESS:
+            # A single stream has no fairness, it would show up as 0
+            sizes = [ps for ps in payload_sizes if parse_payload_size(ps) > 1]
+        plot_data = comparison_lines(data_type, series_mean, sizes)
+        if not plot_data:
+            continue
+        logger.info(f"Plotting {benchmark} {plot} with approaches: {[line.label for line in plot_data]} and payload sizes: {sizes}")
+        plot_info = {**get_plot_info(benchmark, "comparison"), **{key: value for key, value in info[plot].items() if key != "plot_name"}}
+        jobs.append(RenderJob(generate_line_plot, (plot_info, plot_data, x_axis), options.figure_file(f"{benchmark}-{plot}-comparison")))
+
+    if "comparison" not in options.plot_types:
+        return jobs
+    plot_data = comparison_lines("benchmark", series_mean)
+    if plot_data:
+        logger.info(f"Plotting {benchmark} with approaches: {[line.label for line in plot_data]} and payload sizes: {payload_sizes}")
+        plot_info = get_plot_info(benchmark, "comparison")
+        jobs.append(RenderJob(generate_line_plot, (plot_info, plot_data, x_axis), options.figure_file(f"{benchmark}-comparison")))
+
+    if benchmark.endswith("-rate"):
+        # Open-loop latency percentiles against the offered rate, the knee shows where an approach starts to queue
+        for percentile in RATE_COMPARISON_PERCENTILES:
+            data_type = f"{LATENCY_PERCENTILE_PREFIX}{percentile:g}"
+            if data_type not in data_types:
+                continue
+            plot_data = comparison_lines(data_type, series_median)
+            if not plot_data:
+                continue
+            logger.info(f"Plotting {benchmark} p{percentile:g} with approaches: {[line.label for line in plot_data]} and rates: {payload_sizes}")
+            plot_info = get_plot_info(benchmark, "comparison")
+            plot_info = {**plot_info, "measurement": f"p{percentile:g} {plot_info['measurement']}"}
+            jobs.append(RenderJob(generate_line_plot, (plot_info, plot_data, x_axis), options.figure_file(f"{benchmark}-comparison-p{percentile:g}")))
+    return jobs
+
+
+def collect_render_jobs(selected_benchmarks: list[str], index: DataPointIndex | SketchIndex, options: RenderOptions) -> list[RenderJob]:
+    # Writes the statistics of every benchmark right away, the figures are returned to be rendered in parallel
+    jobs = []
+    for benchmark in selected_benchmarks:
+        if benchmark.endswith(("-pld", "-par", "-rate")):
+            functions = [render_plots_with_payload_size]
+        else:
+            functions = [render_plots_without_payload_size, render_latency_percentile_plot, render_component_plots]
+        for function in functions:
+            with tracing.span(f"{function.__name__} {benchmark}", "collect"):
+                jobs.extend(function(benchmark, index, options))
+    return jobs
+
+
+def get_data_columns(args: argparse.Namespace) -> BenchmarkDataColumns:
+    input_file = args.input
+    if input_file and is_results_db(input_file):
+        # Only the selected slice is read, instead of everything that was ever ingested
+        try:
+            return read_results_db(input_file, results_filter_from_args(args, args.benchmarks))
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Cannot read results database: {e}")
+            sys.exit(1)
+    if input_file:
+        return read_columns(input_file)
     elif not sys.stdin.isatty():
-        return sys.stdin.read()
+        return read_jsonl(sys.stdin)
     else:
         logger.error("No input file provided and no data in stdin.")
         sys.exit(1)
 
 
+plot_types = [plot for plot, _ in plots] + ["comparison", "latency-percentiles", "components-cpu", "components-memory", "fairness"]
+
+# Plot types that can be rendered from merged sketches
+sketch_plot_types = ["benchmark", "comparison", "latency-percentiles", IPERF_RETRANSMITS, IPERF_JITTER, IPERF_LOST_PERCENT, "fairness"]
+
+plot_type_groups = {
+    "bench": ["benchmark", "comparison", "latency-percentiles"],
+    "cpu": ["metrics-cpu", "efficiency-cpu", "components-cpu"],
+    "memory": ["metrics-memory", "efficiency-memory", "components-memory"],
+    "iperf": iperf_plot_types,
+}
+
+
+def add_figure_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--format", default="svg", choices=OUTPUT_FORMATS, help="file format of the figures (default: svg)")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help=f"resolution of PNG figures (default: {DEFAULT_DPI})")
+    parser.add_argument("--compact-svg", action="store_true", help="smaller SVG files with text as text instead of glyph outlines, viewers need the fonts installed")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Render plots and statistics for extracted benchmark data in a single run")
+    parser.add_argument("input", nargs="?", help="JSONL, Arrow or Parquet file or merged .sketch.json file written by extract_data.py, or a results database of results_db.py (default: JSONL from stdin)")
+    parser.add_argument("-b", "--benchmarks", nargs="+", default=benchmarks, choices=benchmarks, metavar="BENCHMARK", help="benchmarks to render (default: all)")
+    parser.add_argument("-p", "--plots", nargs="+", default=plot_types, choices=plot_types + list(plot_type_groups), metavar="PLOT", help=f"plot types or groups to render, one of {', '.join(plot_types + list(plot_type_groups))} (default: all)")
+    parser.add_argument("-o", "--output-dir", default="results", help="directory for the timestamped output folder (default: results)")
+    parser.add_argument("--stats-only", action="store_true", help="only write the statistics JSON files, skip rendering figures")
+    parser.add_argument("-j", "--render-workers", type=int, default=os.cpu_count() or 1, help="processes rendering figures in parallel (default: number of cores)")
+    add_figure_arguments(parser)
+    parser.add_argument("--trace", metavar="FILE", help="write a Chrome trace of all stages, statistics and figures to FILE, open it in Perfetto")
+    parser.add_argument("--profile-dir", metavar="DIR", help="with --trace, also write a cProfile .prof file per stage to DIR")
+    add_filter_arguments(parser.add_argument_group("results database filters", "select a slice of a results database, other inputs are used as a whole"))
+    return parser.parse_args()
+
+
 def main():
-    input_data = get_input_data()
-    data_points = get_data_points(input_data)
-    logger.info(f"Extracted {len(data_points)} data points from input")
+    args = parse_args()
+    selected_plot_types = []
+    for plot_type in args.plots:
+        for selected in plot_type_groups.get(plot_type, [plot_type]):
+            if selected not in selected_plot_types:
+                selected_plot_types.append(selected)
+
+    if args.trace:
+        tracing.enable("plots.py", args.profile_dir)
+
+    if args.input and is_sketch_file(args.input):
+        try:
+            with tracing.span("read sketches"):
+                index = SketchIndex(read_sketches(args.input))
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Cannot read sketches: {e}")
+            sys.exit(1)
+        logger.info(f"Read sketches of {len(index)} data points from input")
+        # Resource plots follow the values over time, which a sketch does not keep
+        skipped = [plot_type for plot_type in selected_plot_types if plot_type not in sketch_plot_types]
+        if skipped:
+            logger.warning(f"Skipping plot types that need the raw data points: {', '.join(skipped)}")
+        selected_plot_types = [plot_type for plot_type in selected_plot_types if plot_type in sketch_plot_types]
+    else:
+        with tracing.span("read input"):
+            columns = get_data_columns(args)
+        logger.info(f"Extracted {len(columns)} data points from input")
+        with tracing.span("index"):
+            index = DataPointIndex(columns)
+        del columns
 
     current_time = datetime.now().strftime('%Y%m%d-%H%M%S')
-    os.makedirs(f"results/{current_time}", exist_ok=True)
+    options = RenderOptions(
+        output_dir=f"{args.output_dir}/{current_time}", plot_types=selected_plot_types, stats_only=args.stats_only,
+        render_workers=args.render_workers, format=args.format, dpi=args.dpi, compact_svg=args.compact_svg,
+    )
+    os.makedirs(options.output_dir, exist_ok=True)
 
-    for benchmark in benchmarks:
-        if benchmark.endswith("-pld") or benchmark.endswith("-par"):
-            render_plots_with_payload_size(benchmark, data_points, current_time)
-        else:
-            render_plots_without_payload_size(benchmark, data_points, current_time)
+    with tracing.span("statistics"):
+        jobs = collect_render_jobs(args.benchmarks, index, options)
+    if jobs:
+        with tracing.span("render", figures=len(jobs)):
+            render_jobs(jobs, options.render_workers, options.dpi, options.compact_svg)
+    if args.trace:
+        tracing.finish(args.trace)
 
 
 logger = logging.getLogger(__name__)
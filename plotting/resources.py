@@ -0,0 +1,143 @@
+from dataclasses import dataclass, asdict
+
+import numpy as np
+
+
+# One uninterrupted series of samples of a single log file, timestamps in unix seconds (NaN if unknown)
+Run = tuple[np.ndarray, np.ndarray]
+
+
+@dataclass
+class ResourceUsage:
+    duration: float
+    cpu_seconds: float
+    average_cores: float
+    peak_cores: float
+    average_memory_mib: float
+    peak_memory_mib: float
+
+    def to_dict(self) -> dict:
+        return {name: value if np.isfinite(value) else None for name, value in asdict(self).items()}
+
+
+def _timed(values: np.ndarray, timestamps: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Samples in time order, of several samples with the same timestamp (e.g. a repeated scrape) the last one wins
+    known = np.isfinite(timestamps)
+    values = values[known]
+    timestamps = timestamps[known]
+    order = np.argsort(timestamps, kind="stable")
+    values = values[order]
+    timestamps = timestamps[order]
+    last = np.append(timestamps[1:] != timestamps[:-1], True)[:len(timestamps)]
+    return values[last], timestamps[last]
+
+
+def benchmark_window(timestamps: np.ndarray) -> tuple[float, float] | None:
+    # Benchmark values are timestamped at the end of their interval (e.g. iperf), the first interval starts one
+    # interval length earlier
+    known = np.sort(timestamps[np.isfinite(timestamps)])
+    if len(known) < 1:
+        return None
+    interval = float(np.median(np.diff(known))) if len(known) > 1 else 0.0
+    return float(known[0]) - interval, float(known[-1])
+
+
+def clip_to_window(run: Run, window: tuple[float, float] | None) -> Run:
+    # Keeps the samples inside the window plus the closest one on either side, so rates cover the whole window
+    if window is None or not np.isfinite(run[1]).any():
+        return run
+    values, timestamps = _timed(*run)
+    start, end = window
+    first = max(int(np.searchsorted(timestamps, start, side="right")) - 1, 0)
+    last = int(np.searchsorted(timestamps, end, side="left")) + 1
+    return values[first:last], timestamps[first:last]
+
+
+def clip_runs(runs: list[Run], windows: list[tuple[float, float] | None]) -> list[Run]:
+    # Every run is clipped to the benchmark window it overlaps, runs without one are kept whole
+    clipped = []
+    for run in runs:
+        timestamps = run[1][np.isfinite(run[1])]
+        window = next((
+            window for window in windows
+            if window is not None and len(timestamps) and window[0] <= timestamps.max() and window[1] >= timestamps.min()
+        ), None)
+        clipped.append(clip_to_window(run, window))
+    return clipped
+
+
+def _cpu_intervals(run: Run) -> tuple[np.ndarray, np.ndarray]:
+    # CPU seconds used and seconds elapsed between consecutive scrapes of a cumulative counter. Intervals where
+    # the counter went backwards (a restarted container) carry no usable difference and are dropped.
+    values, timestamps = _timed(*run)
+    used = np.diff(values)
+    elapsed = np.diff(timestamps)
+    valid = (elapsed > 0) & (used >= 0)
+    return used[valid], elapsed[valid]
+
+
+def cpu_rates(run: Run) -> np.ndarray:
+    # Cores used in every scrape interval
+    used, elapsed = _cpu_intervals(run)
+    return used / elapsed
+
+
+def _cpu_usage(run: Run) -> tuple[float, float, float]:
+    used, elapsed = _cpu_intervals(run)
+    if len(used) < 1:
+        # Without timestamps only the counter difference of the whole run is known
+        values = run[0]
+        return (float(values[-1] - values[0]) if len(values) >= 2 else 0.0), 0.0, np.nan
+    return float(used.sum()), float(elapsed.sum()), float((used / elapsed).max())
+
+
+def _memory_usage(run: Run) -> tuple[float, float, float]:
+    # Time weighted (trapezoidal) average working set, the plain mean where samples carry no timestamps
+    values, timestamps = _timed(*run)
+    if len(values) < 2:
+        values = run[0]
+        if len(values) < 1:
+            return 0.0, np.nan, np.nan
+        return 0.0, float(values.mean()), float(values.max())
+    elapsed = np.diff(timestamps)
+    duration = float(elapsed.sum())
+    average = float(((values[1:] + values[:-1]) / 2 * elapsed).sum()) / duration
+    return duration, average, float(values.max())
+
+
+def resource_usage(cpu_runs: list[Run], memory_runs: list[Run]) -> ResourceUsage:
+    # Runs of repeated benchmark executions are combined as if they were one long run
+    cpu_seconds = 0.0
+    cpu_duration = 0.0
+    peak_cores = np.nan
+    for run in cpu_runs:
+        used, elapsed, peak = _cpu_usage(run)
+        cpu_seconds += used
+        cpu_duration += elapsed
+        peak_cores = np.fmax(peak_cores, peak)
+
+    memory_durations = []
+    memory_averages = []
+    peak_memory = np.nan
+    for run in memory_runs:
+        duration, average, peak = _memory_usage(run)
+        if np.isfinite(average):
+            memory_durations.append(duration)
+            memory_averages.append(average)
+        peak_memory = np.fmax(peak_memory, peak)
+    memory_duration = sum(memory_durations)
+    if memory_duration > 0:
+        average_memory = float(np.average(memory_averages, weights=memory_durations))
+    elif memory_averages:
+        average_memory = float(np.mean(memory_averages))
+    else:
+        average_memory = np.nan
+
+    return ResourceUsage(
+        duration=max(cpu_duration, memory_duration),
+        cpu_seconds=cpu_seconds,
+        average_cores=cpu_seconds / cpu_duration if cpu_duration > 0 else np.nan,
+        peak_cores=float(peak_cores),
+        average_memory_mib=average_memory,
+        peak_memory_mib=float(peak_memory),
+    )
@@ -0,0 +1,338 @@
+from array import array
+from dataclasses import dataclass
+from datetime import datetime
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from columnar import CATEGORICAL_COLUMNS, BenchmarkDataColumns, CategoricalColumn
+from extract_data import BenchmarkDataPoint, extract_data_from_files, find_log_files, get_log_file_metadata, open_parse_cache
+
+
+logger = logging.getLogger(__name__)
+
+# Bump when the schema changes, older databases have to be ingested again
+RESULTS_DB_VERSION = 2
+
+DB_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+# Every log of a benchmark cell carries the time the cell started, e.g. ...-P16-cluster-1-Cpair-a-20250101120000.log
+LOG_DATE = re.compile(r"-(\d{14})\.log(?:\.gz|\.zst)?$")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY,
+        path TEXT NOT NULL UNIQUE,
+        name TEXT NOT NULL,
+        started REAL,
+        ingested REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS cells (
+        id INTEGER PRIMARY KEY,
+        run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+        provider TEXT NOT NULL,
+        approach TEXT NOT NULL,
+        benchmark TEXT NOT NULL,
+        payload_size TEXT NOT NULL,
+        cluster_pair TEXT NOT NULL,
+        started REAL,
+        UNIQUE (run_id, provider, approach, benchmark, payload_size, cluster_pair, started)
+    );
+    CREATE TABLE IF NOT EXISTS files (
+        id INTEGER PRIMARY KEY,
+        cell_id INTEGER NOT NULL REFERENCES cells (id) ON DELETE CASCADE,
+        path TEXT NOT NULL UNIQUE,
+        cluster TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL
+    );
+    -- One row holds all samples of one data type in one log file, values and timestamps as raw float64 in log order
+    CREATE TABLE IF NOT EXISTS samples (
+        file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+        data_type TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        value_bytes BLOB NOT NULL,
+        timestamp_bytes BLOB NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+    CREATE INDEX IF NOT EXISTS cells_provider ON cells (provider);
+    CREATE INDEX IF NOT EXISTS cells_approach ON cells (approach);
+    CREATE INDEX IF NOT EXISTS cells_benchmark ON cells (benchmark, payload_size);
+    CREATE INDEX IF NOT EXISTS cells_payload_size ON cells (payload_size);
+    CREATE INDEX IF NOT EXISTS cells_cluster_pair ON cells (cluster_pair);
+    CREATE INDEX IF NOT EXISTS cells_started ON cells (started);
+    CREATE INDEX IF NOT EXISTS files_cell ON files (cell_id);
+    CREATE INDEX IF NOT EXISTS samples_file ON samples (file_id, data_type);
+    CREATE INDEX IF NOT EXISTS samples_data_type ON samples (data_type);
+"""
+
+
+@dataclass
+class ResultsFilter:
+    providers: list[str] | None = None
+    approaches: list[str] | None = None
+    benchmarks: list[str] | None = None
+    data_types: list[str] | None = None
+    payload_sizes: list[str] | None = None
+    cluster_pairs: list[str] | None = None
+    runs: list[str] | None = None
+    # Unix time in seconds, compared with the start of the cells
+    since: float | None = None
+    until: float | None = None
+
+
+def is_results_db(file: str) -> bool:
+    return file.endswith(DB_SUFFIXES)
+
+
+def parse_time(value: str) -> float:
+    # Dates as in the log names (20250101120000) or ISO 8601 (2025-01-01, 2025-01-01T12:00)
+    try:
+        if re.fullmatch(r"\d{14}", value):
+            return datetime.strptime(value, "%Y%m%d%H%M%S").timestamp()
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time '{value}'")
+
+
+def log_started(file: str) -> float | None:
+    match = LOG_DATE.search(os.path.basename(file))
+    return datetime.strptime(match.group(1), "%Y%m%d%H%M%S").timestamp() if match else None
+
+
+def connect(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA foreign_keys = ON")
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version == 0 and connection.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+        connection.executescript(f"{SCHEMA} PRAGMA user_version = {RESULTS_DB_VERSION};")
+    elif version != RESULTS_DB_VERSION:
+        connection.close()
+        raise ValueError(f"{path} is not a results database of version {RESULTS_DB_VERSION}")
+    return connection
+
+
+def _encode(data_points: list[BenchmarkDataPoint]) -> dict[str, tuple[int, bytes, bytes]]:
+    # Data points of one file grouped by data type, numbers are implied by the position
+    values: dict[str, tuple[array, array]] = {}
+    for dp in data_points:
+        numbers, timestamps = values.setdefault(dp.data_type, (array("d"), array("d")))
+        numbers.append(dp.value)
+        timestamps.append(np.nan if dp.timestamp is None else dp.timestamp)
+    return {data_type: (len(numbers), numbers.tobytes(), timestamps.tobytes()) for data_type, (numbers, timestamps) in values.items()}
+
+
+def ingest(connection: sqlite3.Connection, directory: str, jobs: int, cache=None) -> tuple[int, int]:
+    # A results directory is one run, logs already ingested unchanged are skipped, so ingesting again is cheap
+    path = os.path.abspath(directory)
+    with connection:
+        connection.execute(
+            "INSERT INTO runs (path, name, ingested) VALUES (?, ?, ?) ON CONFLICT (path) DO UPDATE SET ingested = excluded.ingested",
+            (path, os.path.basename(path.rstrip(os.sep)), time.time()),
+        )
+    run_id = connection.execute("SELECT id FROM runs WHERE path = ?", (path,)).fetchone()[0]
+
+    known = {row[0]: (row[1], row[2]) for row in connection.execute("SELECT path, size, mtime_ns FROM files")}
+    files = []
+    for file in find_log_files(directory):
+        stat = os.stat(file)
+        if known.get(os.path.abspath(file)) != (stat.st_size, stat.st_mtime_ns):
+            files.append(file)
+    logger.info(f"Ingesting {len(files)} new or changed log files of {path}")
+
+    ingested = failed = 0
+    for file, data_points, error in extract_data_from_files(files, jobs, cache):
+        if error is not None:
+            failed += 1
+            logger.error(f"Skipping {file}: {error}")
+            continue
+        metadata = get_log_file_metadata(file)
+        stat = os.stat(file)
+        with connection:
+            connection.execute("DELETE FROM files WHERE path = ?", (os.path.abspath(file),))
+            cell = (run_id, metadata.provider, metadata.approach, metadata.benchmark_type, metadata.payload_size, metadata.cluster_pair, log_started(file))
+            # Looked up with IS, so logs without a date in their name still end up in a single cell
+            row = connection.execute(
+                "SELECT id FROM cells WHERE run_id = ? AND provider = ? AND approach = ? AND benchmark = ? AND payload_size = ? AND cluster_pair = ? AND started IS ?", cell
+            ).fetchone()
+            if row is not None:
+                cell_id = row[0]
+            else:
+                cell_id = connection.execute(
+                    "INSERT INTO cells (run_id, provider, approach, benchmark, payload_size, cluster_pair, started) VALUES (?, ?, ?, ?, ?, ?, ?)", cell
+                ).lastrowid
+            file_id = connection.execute(
+                "INSERT INTO files (cell_id, path, cluster, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                (cell_id, os.path.abspath(file), metadata.cluster, stat.st_size, stat.st_mtime_ns),
+            ).lastrowid
+            connection.executemany(
+                "INSERT INTO samples (file_id, data_type, count, value_bytes, timestamp_bytes) VALUES (?, ?, ?, ?, ?)",
+                [(file_id, data_type, *encoded) for data_type, encoded in _encode(data_points).items()],
+            )
+        ingested += 1
+
+    with connection:
+        connection.execute("UPDATE runs SET started = (SELECT MIN(started) FROM cells WHERE run_id = ?) WHERE id = ?", (run_id, run_id))
+    return ingested, failed
+
+
+def _where(results_filter: ResultsFilter) -> tuple[str, list]:
+    conditions = []
+    parameters = []
+    for column, selected in [
+        ("cells.provider", results_filter.providers),
+        ("cells.approach", results_filter.approaches),
+        ("cells.benchmark", results_filter.benchmarks),
+        ("samples.data_type", results_filter.data_types),
+        ("cells.payload_size", results_filter.payload_sizes),
+        ("cells.cluster_pair", results_filter.cluster_pairs),
+        ("runs.name", results_filter.runs),
+    ]:
+        if selected:
+            conditions.append(f"{column} IN ({', '.join('?' * len(selected))})")
+            parameters.extend(selected)
+    if results_filter.since is not None:
+        conditions.append("cells.started >= ?")
+        parameters.append(results_filter.since)
+    if results_filter.until is not None:
+        conditions.append("cells.started < ?")
+        parameters.append(results_filter.until)
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), parameters
+
+
+def query(connection: sqlite3.Connection, results_filter: ResultsFilter) -> BenchmarkDataColumns:
+    # The slice is assembled straight from the stored arrays, in the same file order extract_data.py produces
+    where, parameters = _where(results_filter)
+    rows = connection.execute(f"""
+        SELECT cells.provider, cells.approach, files.cluster, cells.benchmark, samples.data_type, cells.payload_size, cells.cluster_pair,
+               samples.count, samples.value_bytes, samples.timestamp_bytes
+        FROM samples
+        JOIN files ON files.id = samples.file_id
+        JOIN cells ON cells.id = files.cell_id
+        JOIN runs ON runs.id = cells.run_id
+        {where}
+        ORDER BY files.path, samples.rowid
+    """, parameters)
+
+    category_codes: dict[str, dict[str, int]] = {name: {} for name in CATEGORICAL_COLUMNS}
+    codes: dict[str, list[np.ndarray]] = {name: [] for name in CATEGORICAL_COLUMNS}
+    numbers, values, timestamps = [], [], []
+    for *categories, count, value_bytes, timestamp_bytes in rows:
+        for name, category in zip(CATEGORICAL_COLUMNS, categories):
+            code = category_codes[name].setdefault(category, len(category_codes[name]))
+            codes[name].append(np.full(count, code, dtype=np.int32))
+        numbers.append(np.arange(count, dtype=np.int64))
+        values.append(np.frombuffer(value_bytes, dtype=np.float64))
+        timestamps.append(np.frombuffer(timestamp_bytes, dtype=np.float64))
+
+    def concatenate(arrays: list[np.ndarray], dtype) -> np.ndarray:
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+
+    return BenchmarkDataColumns(
+        **{
+            name: CategoricalColumn(codes=concatenate(codes[name], np.int32), categories=list(category_codes[name]))
+            for name in CATEGORICAL_COLUMNS
+        },
+        number=concatenate(numbers, np.int64),
+        value=concatenate(values, np.float64),
+        timestamp=concatenate(timestamps, np.float64),
+    )
+
+
+def read_results_db(file: str, results_filter: ResultsFilter) -> BenchmarkDataColumns:
+    if not os.path.isfile(file):
+        raise ValueError(f"{file} does not exist")
+    connection = connect(file)
+    try:
+        return query(connection, results_filter)
+    finally:
+        connection.close()
+
+
+def list_runs(connection: sqlite3.Connection) -> list[tuple]:
+    return connection.execute("""
+        SELECT runs.name, runs.started, runs.path, COUNT(DISTINCT cells.id), COUNT(files.id)
+        FROM runs
+        LEFT JOIN cells ON cells.run_id = runs.id
+        LEFT JOIN files ON files.cell_id = cells.id
+        GROUP BY runs.id
+        ORDER BY runs.started
+    """).fetchall()
+
+
+def add_filter_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--providers", nargs="+", metavar="PROVIDER", help="only these providers")
+    parser.add_argument("--approaches", nargs="+", metavar="APPROACH", help="only these approaches")
+    parser.add_argument("--payload-sizes", nargs="+", metavar="SIZE", help="only these payload sizes")
+    parser.add_argument("--cluster-pairs", nargs="+", metavar="PAIR", help="only cells run on these cluster pairs")
+    parser.add_argument("--runs", nargs="+", metavar="RUN", help="only these runs, by the name of their results directory")
+    parser.add_argument("--since", type=parse_time, help="only cells started at or after this time, e.g. 2025-01-01")
+    parser.add_argument("--until", type=parse_time, help="only cells started before this time")
+
+
+def results_filter_from_args(args: argparse.Namespace, benchmarks: list[str] | None = None) -> ResultsFilter:
+    return ResultsFilter(
+        providers=args.providers,
+        approaches=args.approaches,
+        benchmarks=benchmarks,
+        payload_sizes=args.payload_sizes,
+        cluster_pairs=args.cluster_pairs,
+        runs=args.runs,
+        since=args.since,
+        until=args.until,
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Keep extracted benchmark results of many runs in one SQLite database")
+    parser.add_argument("database", help="results database, created if missing")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="add the logs of results directories, every directory is one run")
+    ingest_parser.add_argument("directories", nargs="+")
+    ingest_parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes for parsing (default: number of cores)")
+    ingest_parser.add_argument("--cache", help="parse cache database shared with extract_data.py")
+
+    subparsers.add_parser("runs", help="list the ingested runs")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        connection = connect(args.database)
+    except (sqlite3.Error, ValueError) as e:
+        logger.error(f"Cannot open results database: {e}")
+        sys.exit(1)
+    try:
+        if args.command == "ingest":
+            cache = open_parse_cache(args.cache, 512) if args.cache else None
+            try:
+                for directory in args.directories:
+                    if not os.path.isdir(directory):
+                        logger.error(f"Directory {directory} does not exist.")
+                        sys.exit(1)
+                    ingested, failed = ingest(connection, directory, args.jobs, cache)
+                    logger.info(f"Ingested {ingested} log files of {directory}")
+                    if failed:
+                        logger.warning(f"{failed} log files could not be extracted")
+            finally:
+                if cache is not None:
+                    cache.close()
+        elif args.command == "runs":
+            for name, started, path, cells, files in list_runs(connection):
+                started = datetime.fromtimestamp(started).isoformat(timespec="seconds") if started is not None else "-"
+                print(f"{name}\t{started}\t{cells} cells\t{files} logs\t{path}")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
+    main()
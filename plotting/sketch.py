@@ -0,0 +1,319 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+SKETCH_VERSION = 1
+SKETCH_SUFFIX = ".sketch.json"
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# Magnitudes below this count as zero, they would otherwise stretch the buckets down to the smallest float
+ZERO_THRESHOLD = 1e-9
+
+# (benchmark_type, approach, cluster, data_type, payload_size), the same grouping as plots.DataPointIndex
+SketchKey = tuple[str, str, str, str, str]
+
+
+def _merge_buckets(counts: np.ndarray, offset: int, other_counts: np.ndarray, other_offset: int) -> tuple[np.ndarray, int]:
+    # Buckets are stored densely from the lowest index that holds a value
+    if len(other_counts) == 0:
+        return counts, offset
+    if len(counts) == 0:
+        return other_counts.copy(), other_offset
+    low = min(offset, other_offset)
+    merged = np.zeros(max(offset + len(counts), other_offset + len(other_counts)) - low, dtype=np.int64)
+    merged[offset - low:offset - low + len(counts)] += counts
+    merged[other_offset - low:other_offset - low + len(other_counts)] += other_counts
+    return merged, low
+
+
+class LogHistogram:
+    # Mergeable quantile sketch after DDSketch: values fall into logarithmic buckets that grow with the value, so every
+    # quantile is within the relative accuracy of the exact one while the size only depends on the range of the values,
+    # not on their number. Count, sum, mean and spread are kept exactly.
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.positive = np.zeros(0, dtype=np.int64)
+        self.positive_offset = 0
+        self.negative = np.zeros(0, dtype=np.int64)
+        self.negative_offset = 0
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        # Sum of squared deviations from the mean, merged with Chan's formula so the variance stays stable
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _buckets(self, magnitudes: np.ndarray) -> tuple[np.ndarray, int]:
+        if len(magnitudes) == 0:
+            return np.zeros(0, dtype=np.int64), 0
+        indices = np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64)
+        low = int(indices.min())
+        return np.bincount(indices - low).astype(np.int64), low
+
+    def add(self, values) -> "LogHistogram":
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        other = LogHistogram(self.relative_accuracy)
+        other.positive, other.positive_offset = self._buckets(values[values > ZERO_THRESHOLD])
+        other.negative, other.negative_offset = self._buckets(-values[values < -ZERO_THRESHOLD])
+        other.zero_count = int(np.count_nonzero(np.abs(values) <= ZERO_THRESHOLD))
+        other.count = len(values)
+        other.total = float(values.sum())
+        other.m2 = float(np.sum((values - values.mean()) ** 2))
+        other.min = float(values.min())
+        other.max = float(values.max())
+        return self.merge(other)
+
+    def merge(self, other: "LogHistogram") -> "LogHistogram":
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError(f"Cannot merge sketches with relative accuracy {self.relative_accuracy} and {other.relative_accuracy}")
+        if other.count == 0:
+            return self
+        if self.count > 0:
+            delta = other.total / other.count - self.total / self.count
+            self.m2 += other.m2 + delta * delta * self.count * other.count / (self.count + other.count)
+        else:
+            self.m2 = other.m2
+        self.positive, self.positive_offset = _merge_buckets(self.positive, self.positive_offset, other.positive, other.positive_offset)
+        self.negative, self.negative_offset = _merge_buckets(self.negative, self.negative_offset, other.negative, other.negative_offset)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def copy(self) -> "LogHistogram":
+        return LogHistogram(self.relative_accuracy).merge(self)
+
+    def sum(self) -> float:
+        return self.total
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else np.nan
+
+    def std(self) -> float:
+        # Sample standard deviation, as the statistics of the raw values
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
+
+    def _bucket_values(self) -> tuple[np.ndarray, np.ndarray]:
+        # Representative value of every non-empty bucket in ascending order with its count, the representative of
+        # bucket i is within the relative accuracy of every value in (gamma^(i-1), gamma^i]. The outermost buckets
+        # hold the exact minimum and maximum, which stand in for them.
+        scale = 2 / (self.gamma + 1)
+        positive_indices = np.flatnonzero(self.positive)
+        negative_indices = np.flatnonzero(self.negative)[::-1]
+        values = np.concatenate((
+            -scale * self.gamma ** (negative_indices + self.negative_offset).astype(np.float64),
+            [0.0] if self.zero_count else [],
+            scale * self.gamma ** (positive_indices + self.positive_offset).astype(np.float64),
+        ))
+        counts = np.concatenate((
+            self.negative[negative_indices],
+            [self.zero_count] if self.zero_count else [],
+            self.positive[positive_indices],
+        )).astype(np.int64)
+        values = np.clip(values, self.min, self.max)
+        values[0], values[-1] = self.min, self.max
+        return values, counts
+
+    def quantile(self, q):
+        # Interpolated between the values of rank floor(q * (count - 1)) and the next one like numpy's default
+        # quantiles, every value is the representative of its bucket
+        q = np.asarray(q, dtype=np.float64)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)[()]
+        values, counts = self._bucket_values()
+        cumulative = np.cumsum(counts)
+        rank = q * (self.count - 1)
+        lower = np.floor(rank)
+        lower_value = values[np.searchsorted(cumulative, lower, side="right")]
+        upper_value = values[np.searchsorted(cumulative, np.minimum(lower + 1, self.count - 1), side="right")]
+        return (lower_value + (upper_value - lower_value) * (rank - lower))[()]
+
+    def whiskers(self, q1: float, q3: float) -> tuple[float, float]:
+        # Whiskers as matplotlib's boxplot draws them: the most extreme value within 1.5 times the interquartile range
+        iqr = q3 - q1
+        values, _ = self._bucket_values()
+        inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        if not len(inside):
+            return q1, q3
+        return min(inside.min(), q1), max(inside.max(), q3)
+
+    def to_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "total": self.total,
+            "m2": self.m2,
+            "min": self.min,
+            "max": self.max,
+            "zero_count": self.zero_count,
+            "positive": {"offset": self.positive_offset, "counts": self.positive.tolist()},
+            "negative": {"offset": self.negative_offset, "counts": self.negative.tolist()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogHistogram":
+        sketch = cls(data["relative_accuracy"])
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        sketch.m2 = data["m2"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.zero_count = data["zero_count"]
+        sketch.positive = np.array(data["positive"]["counts"], dtype=np.int64)
+        sketch.positive_offset = data["positive"]["offset"]
+        sketch.negative = np.array(data["negative"]["counts"], dtype=np.int64)
+        sketch.negative_offset = data["negative"]["offset"]
+        return sketch
+
+
+class SketchIndex:
+    # Stands in for plots.DataPointIndex, a series is the merged sketch of its groups instead of the raw values
+    def __init__(self, sketches: dict[SketchKey, LogHistogram], relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        self.sketches = sketches
+        self.relative_accuracy = relative_accuracy
+        self.keys_by_series: dict[tuple[str, str, str], list[SketchKey]] = {}
+        for key in sketches:
+            self.keys_by_series.setdefault((key[0], key[1], key[3]), []).append(key)
+
+    def __len__(self) -> int:
+        return sum(sketch.count for sketch in self.sketches.values())
+
+    def values(self, benchmark_type: str, approach: str, data_type: str, cluster: str | None = None, payload_size: str | None = None) -> LogHistogram:
+        merged = LogHistogram(self.relative_accuracy)
+        for key in self.keys_by_series.get((benchmark_type, approach, data_type), []):
+            if (cluster is None or key[2] == cluster) and (payload_size is None or key[4] == payload_size):
+                merged.merge(self.sketches[key])
+        return merged
+
+    def payload_sizes(self, benchmark_type: str) -> set[str]:
+        return {key[4] for key in self.sketches if key[0] == benchmark_type}
+
+    def data_types(self, benchmark_type: str) -> set[str]:
+        return {key[3] for key in self.sketches if key[0] == benchmark_type}
+
+
+def sketch_statistics(sketches: list[LogHistogram], confidence: float) -> list[dict]:
+    # Same fields as batch_stats.compute_statistics. Sketches do not keep the order of the values, so there is no
+    # trend, and the confidence intervals are the normal approximation for the mean and the distribution-free
+    # order statistics interval for the median instead of a bootstrap.
+    from scipy.special import ndtri
+    z = ndtri(1 - (1 - confidence) / 2)
+    stats = []
+    for sketch in sketches:
+        n = sketch.count
+        minimum, q1, median, q3, maximum = sketch.quantile([0, 0.25, 0.5, 0.75, 1])
+        std = sketch.std()
+        whisker_low, whisker_high = sketch.whiskers(q1, q3)
+        mean_margin = z * std / np.sqrt(n) if n > 1 else 0.0
+        rank_margin = z * np.sqrt(n) / 2 / max(n - 1, 1)
+        median_low, median_high = sketch.quantile([max(0.5 - rank_margin, 0), min(0.5 + rank_margin, 1)])
+        stats.append({
+            'min': float(minimum),
+            'q1': float(q1),
+            'median': float(median),
+            'q3': float(q3),
+            'max': float(maximum),
+            'whisker_low': float(whisker_low),
+            'whisker_high': float(whisker_high),
+            'mean': float(sketch.mean()),
+            'std': float(std) if np.isfinite(std) else None,
+            'coef': None,
+            'std_err': None,
+            't_value': None,
+            'p_value': None,
+            'r_squared': None,
+            'n': int(n),
+            'ci_level': confidence,
+            'median_ci_low': float(median_low),
+            'median_ci_high': float(median_high),
+            'mean_ci_low': float(sketch.mean() - mean_margin),
+            'mean_ci_high': float(sketch.mean() + mean_margin),
+            'relative_accuracy': sketch.relative_accuracy,
+        })
+    return stats
+
+
+def is_sketch_file(file: str) -> bool:
+    return file.endswith(SKETCH_SUFFIX)
+
+
+def read_sketches(file: str) -> dict[SketchKey, LogHistogram]:
+    with open(file) as f:
+        data = json.load(f)
+    if data.get("version") != SKETCH_VERSION:
+        raise ValueError(f"Unsupported sketch file version {data.get('version')} in {file}")
+    return {
+        (s["benchmark_type"], s["approach"], s["cluster"], s["data_type"], s["payload_size"]): LogHistogram.from_dict(s["sketch"])
+        for s in data["series"]
+    }
+
+
+def write_sketches(sketches: dict[SketchKey, LogHistogram], file: str):
+    # Replaced atomically like the run manifest, merging into an existing file never leaves it half written
+    directory = os.path.dirname(os.path.abspath(file))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".sketch-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({
+                "version": SKETCH_VERSION,
+                "series": [
+                    {
+                        "benchmark_type": key[0], "approach": key[1], "cluster": key[2], "data_type": key[3], "payload_size": key[4],
+                        "sketch": sketch.to_dict(),
+                    }
+                    for key, sketch in sorted(sketches.items())
+                ],
+            }, f)
+            f.write("\n")
+        os.replace(tmp_path, file)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def merge_sketches(merged: dict[SketchKey, LogHistogram], sketches: dict[SketchKey, LogHistogram]):
+    for key, sketch in sketches.items():
+        if key in merged:
+            merged[key].merge(sketch)
+        else:
+            merged[key] = sketch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the sketch files of several benchmark runs, e.g. the same matrix repeated on different days")
+    parser.add_argument("inputs", nargs="+", help=f"{SKETCH_SUFFIX} files written by extract_data.py --sketches")
+    parser.add_argument("-o", "--output", required=True, help=f"merged {SKETCH_SUFFIX} file, may be one of the inputs")
+    args = parser.parse_args()
+    try:
+        # One input is held in memory at a time next to the merged sketches
+        merged: dict[SketchKey, LogHistogram] = {}
+        for file in args.inputs:
+            merge_sketches(merged, read_sketches(file))
+        write_sketches(merged, args.output)
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Cannot merge sketches: {e}")
+        sys.exit(1)
+    logger.info(f"Merged {len(args.inputs)} sketch files into {len(merged)} series with {sum(s.count for s in merged.values())} values in {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
+    main()
@@ -0,0 +1,289 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+
+from extract_data import benchmarks, approaches, component_containers, log_suffixes, open_log
+
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_SIZES = ["16", "1KB", "64KB", "1MB"]
+PARALLEL_STREAMS = ["1", "2", "4", "8"]
+REQUEST_RATES = ["1000", "5000", "20000"]
+DEFAULT_APPROACHES = ["same-cluster", "load-balancer", "cilium-none", "istio-sidecar", "linkerd"]
+METRIC_CLUSTERS = ["cluster-1", "cluster-2"]
+IPERF_DEFAULT_STREAMS = 6
+
+# Data plane containers every approach runs next to the workload, see extract_data.component_containers
+approach_containers = {
+    "cilium-none": ["cilium-agent"],
+    "cilium-ipsec": ["cilium-agent"],
+    "cilium-wireguard": ["cilium-agent"],
+    "istio-ambient": ["ztunnel"],
+    "istio-sidecar": ["istio-proxy"],
+    "linkerd": ["linkerd-proxy"],
+    "skupper": ["skupper-router"],
+    "submariner": ["submariner-gateway"],
+}
+
+
+@dataclass
+class SyntheticScale:
+    approaches: list[str]
+    benchmarks: list[str]
+    payload_sizes: list[str]
+    runs: int = 1
+    # Client iterations of curl and wrk, seconds of iperf and scrapes of the metrics collector per cell
+    requests: int = 100
+    wrk_runs: int = 10
+    iperf_seconds: int = 100
+    scrapes: int = 60
+    # Containers per scrape next to the data plane and the workload, a real node runs dozens
+    containers: int = 40
+    seed: int = 0
+    # LOG_COMPRESSION of benchmarks.sh the logs are written with
+    compression: str = "none"
+
+
+def cell_payload_sizes(benchmark: str, scale: SyntheticScale) -> list[str]:
+    # Same split as payload_sizes_for in benchmarks.sh
+    if benchmark.endswith("-pld"):
+        return scale.payload_sizes
+    if benchmark.endswith("-par"):
+        return PARALLEL_STREAMS
+    if benchmark.endswith("-rate"):
+        return REQUEST_RATES
+    return ["none"]
+
+
+def payload_bytes(payload_size: str) -> float:
+    units = {"KB": 1024, "MB": 1024**2, "GB": 1024**3}
+    for unit, multiplier in units.items():
+        if payload_size.endswith(unit):
+            return float(payload_size.removesuffix(unit)) * multiplier
+    return float(payload_size) if payload_size.isdigit() else 0.0
+
+
+def overhead(approach: str) -> float:
+    # Every approach gets a stable slowdown factor, meshes with proxies are slower than plain routing
+    factor = 1 + 0.08 * approaches.index(approach)
+    if approach in ("istio-sidecar", "linkerd", "skupper"):
+        factor *= 1.5
+    return factor
+
+
+def curl_log(rng: np.random.Generator, approach: str, payload_size: str, started: datetime, scale: SyntheticScale) -> str:
+    latencies = rng.lognormal(np.log(1e-3 * overhead(approach) + payload_bytes(payload_size) / 200e6), 0.3, scale.requests)
+    # The client sleeps a second between requests
+    start = int(started.timestamp())
+    lines = [f"Request {i} at {start + i - 1}: time_total={latency:.6f}s" for i, latency in enumerate(latencies, start=1)]
+    lines.append(f"Samples collected: {scale.requests}")
+    return "\n".join(lines) + "\n"
+
+
+def wrk_duration(ms: float) -> str:
+    if ms < 1:
+        return f"{ms * 1000:.2f}us"
+    if ms < 1000:
+        return f"{ms:.2f}ms"
+    return f"{ms / 1000:.2f}s"
+
+
+def wrk_log(rng: np.random.Generator, approach: str, payload_size: str, started: datetime, scale: SyntheticScale) -> str:
+    blocks = []
+    base = 5 * overhead(approach) + payload_bytes(payload_size) / 50e6
+    for run in range(scale.wrk_runs):
+        average = base * rng.lognormal(0, 0.1)
+        percentiles = {50: 0.9, 75: 1.2, 90: 1.6, 99: 3.0}
+        requests = 400 / average * 1000 * 10
+        blocks.append(
+            f"Running 10s test @ http://10.0.0.1:80\n"
+            f"  12 threads and 400 connections\n"
+            f"  Thread Stats   Avg      Stdev     Max   +/- Stdev\n"
+            f"    Latency   {wrk_duration(average):>8} {wrk_duration(average * 0.4):>8} {wrk_duration(average * 8):>8}   85.00%\n"
+            f"    Req/Sec     {requests / 10 / 12 / 1000:.2f}k   300.00     6.00k    70.00%\n"
+            f"  Latency Distribution\n"
+            + "".join(f"     {p}%  {wrk_duration(average * factor * rng.lognormal(0, 0.05)):>8}\n" for p, factor in percentiles.items())
+            + f"  {int(requests)} requests in 10.00s, {requests * 850 / 1024**2:.2f}MB read\n"
+            f"Requests/sec:  {requests / 10:.2f}\n"
+            f"Transfer/sec:     {requests * 85 / 1024**2:.2f}MB\n"
+            f"Tail Latency Distribution\n"
+            + "".join(f"{p:7.3f}%  {int(average * factor * 1000 * rng.lognormal(0, 0.1))}us\n" for p, factor in [(99.9, 5.0), (99.99, 9.0)])
+            # Runs take 10s and the client sleeps a second between them
+            + f"Run finished at {int(started.timestamp()) + run * 11 + 10}\n"
+        )
+    return "".join(blocks) + f"Samples collected: {scale.wrk_runs}\n"
+
+
+def iperf_log(rng: np.random.Generator, approach: str, benchmark: str, payload_size: str, started: datetime, scale: SyntheticScale) -> str:
+    # Shaped like iperf3 -J, every interval lists all streams and their sum
+    udp = "udp" in benchmark
+    streams = int(payload_size) if benchmark.endswith("-par") else IPERF_DEFAULT_STREAMS
+    stream_rate = 30e9 / overhead(approach) / streams
+    intervals = []
+    for second in range(scale.iperf_seconds):
+        rates = stream_rate * rng.lognormal(0, 0.05, streams)
+        interval_streams = []
+        for socket, rate in enumerate(rates, start=5):
+            stream = {"socket": socket, "start": float(second), "end": float(second + 1), "seconds": 1.0, "bytes": int(rate / 8), "bits_per_second": float(rate), "omitted": False, "sender": True}
+            if udp:
+                stream["packets"] = int(rate / 8 / 1448)
+            else:
+                stream.update({"retransmits": int(rng.poisson(2)), "snd_cwnd": 3_000_000, "rtt": int(rng.normal(300, 30)), "rttvar": 40, "pmtu": 1450})
+            interval_streams.append(stream)
+        total = {"start": float(second), "end": float(second + 1), "seconds": 1.0, "bytes": int(rates.sum() / 8), "bits_per_second": float(rates.sum()), "omitted": False, "sender": True}
+        if udp:
+            total["packets"] = sum(stream["packets"] for stream in interval_streams)
+        else:
+            total["retransmits"] = sum(stream["retransmits"] for stream in interval_streams)
+        intervals.append({"streams": interval_streams, "sum": total})
+
+    seconds = float(scale.iperf_seconds)
+    sent_bytes = sum(interval["sum"]["bytes"] for interval in intervals)
+    sum_sent = {"start": 0.0, "end": seconds, "seconds": seconds, "bytes": sent_bytes, "bits_per_second": sent_bytes * 8 / seconds, "sender": True}
+    sum_received = {**sum_sent, "sender": False}
+    end = {"streams": [], "cpu_utilization_percent": {
+        "host_total": float(rng.uniform(20, 60)), "host_user": float(rng.uniform(1, 5)), "host_system": float(rng.uniform(20, 55)),
+        "remote_total": float(rng.uniform(20, 60)), "remote_user": float(rng.uniform(1, 5)), "remote_system": float(rng.uniform(20, 55)),
+    }}
+    if udp:
+        packets = sum(interval["sum"]["packets"] for interval in intervals)
+        lost = int(packets * rng.uniform(0, 0.02))
+        end["sum"] = {**sum_sent, "jitter_ms": float(rng.uniform(0.005, 0.05)), "lost_packets": lost, "packets": packets, "lost_percent": 100 * lost / max(packets, 1)}
+    else:
+        retransmits = sum(interval["sum"]["retransmits"] for interval in intervals)
+        end["sum_sent"] = {**sum_sent, "retransmits": retransmits}
+        end["sum_received"] = sum_received
+    return json.dumps({
+        "start": {
+            "connected": [{"socket": socket, "local_host": "10.0.1.2", "local_port": 40000 + socket, "remote_host": "10.0.0.1", "remote_port": 5201} for socket in range(5, 5 + streams)],
+            "version": "iperf 3.16",
+            "timestamp": {"time": started.strftime("%a, %d %b %Y %H:%M:%S GMT"), "timesecs": int(started.timestamp())},
+            "test_start": {"protocol": "UDP" if udp else "TCP", "num_streams": streams, "duration": scale.iperf_seconds},
+        },
+        "intervals": intervals,
+        "end": end,
+    }, indent="\t") + "\n"
+
+
+def scrape_times(started: datetime, scale: SyntheticScale) -> np.ndarray:
+    return int(started.timestamp() * 1000) + np.arange(scale.scrapes) * 1000
+
+
+def root_metric_log(rng: np.random.Generator, metric: str, approach: str, started: datetime, scale: SyntheticScale) -> str:
+    times = scrape_times(started, scale)
+    if metric == "metrics-cpu":
+        # Cumulative core seconds of the whole node
+        values = 10_000 + np.cumsum(rng.uniform(0.5, 1.5, scale.scrapes) * overhead(approach))
+        labels = 'container_cpu_usage_seconds_total{container="",cpu="total",id="/",image="",name="",namespace="",pod=""}'
+    else:
+        values = 2e9 * overhead(approach) + rng.normal(0, 5e7, scale.scrapes)
+        labels = 'container_memory_working_set_bytes{container="",id="/",image="",name="",namespace="",pod=""}'
+    return "".join(f"{labels} {value:.6g} {time}\n" for value, time in zip(values, times))
+
+
+def component_metric_log(rng: np.random.Generator, metric: str, approach: str, benchmark: str, started: datetime, scale: SyntheticScale) -> str:
+    data_plane = approach_containers.get(approach, [])
+    containers = [*data_plane, f"{benchmark}-server", *(f"system-{i}" for i in range(scale.containers))]
+    namespaces = ["kube-system"] * len(data_plane) + [benchmark] + ["kube-system"] * scale.containers
+    prefix = "container_cpu_usage_seconds_total" if metric == "components-cpu" else "container_memory_working_set_bytes"
+    cpu_label = ',cpu="total"' if metric == "components-cpu" else ""
+    if metric == "components-cpu":
+        values = np.cumsum(rng.uniform(0, 0.2, (scale.scrapes, len(containers))), axis=0)
+    else:
+        values = rng.uniform(5e6, 3e8, len(containers)) * rng.lognormal(0, 0.02, (scale.scrapes, len(containers)))
+    lines = []
+    for time, row in zip(scrape_times(started, scale), values):
+        lines.append(f"# scrape {time}\n")
+        lines.extend(
+            f'{prefix}{{container="{container}"{cpu_label},id="/kubepods/pod{i}/{container}",image="{component_containers.get(container, container)}:latest",'
+            f'name="{container}-{i}",namespace="{namespace}",pod="{container}-{i}"}} {value:.6g} {time}\n'
+            for i, (container, namespace, value) in enumerate(zip(containers, namespaces, row))
+        )
+    return "".join(lines)
+
+
+def generate(output_dir: str, scale: SyntheticScale, provider: str = "k3s") -> list[str]:
+    os.makedirs(output_dir, exist_ok=True)
+    files = []
+
+    def write(name: str, content: str):
+        path = os.path.join(output_dir, f"{name}{log_suffixes[scale.compression]}")
+        with open_log(path, "w") as f:
+            f.write(content)
+        files.append(path)
+
+    first_run = datetime(2026, 1, 1, 12, 0, 0)
+    for run in range(scale.runs):
+        # One run per day, cells of a run start a few minutes apart like in benchmarks.sh
+        started = first_run + timedelta(days=run)
+        for approach in scale.approaches:
+            for benchmark in scale.benchmarks:
+                for payload_index, payload_size in enumerate(cell_payload_sizes(benchmark, scale)):
+                    started += timedelta(minutes=3)
+                    date = started.strftime("%Y%m%d%H%M%S")
+                    # Seeded per cell, the same cell has the same content whatever else is generated
+                    rng = np.random.default_rng([scale.seed, run, approaches.index(approach), benchmarks.index(benchmark), payload_index])
+                    if benchmark.startswith("nginx-curl"):
+                        client = curl_log(rng, approach, payload_size, started, scale)
+                    elif benchmark.startswith("nginx-wrk"):
+                        client = wrk_log(rng, approach, payload_size, started, scale)
+                    else:
+                        client = iperf_log(rng, approach, benchmark, payload_size, started, scale)
+                    write(f"{provider}-{approach}-{benchmark}-client-P{payload_size}-{date}", client)
+                    for cluster in METRIC_CLUSTERS:
+                        for metric in ["metrics-cpu", "metrics-memory"]:
+                            write(f"{provider}-{approach}-{benchmark}-{metric}-P{payload_size}-{cluster}-{date}", root_metric_log(rng, metric, approach, started, scale))
+                        for metric in ["components-cpu", "components-memory"]:
+                            write(f"{provider}-{approach}-{benchmark}-{metric}-P{payload_size}-{cluster}-{date}", component_metric_log(rng, metric, approach, benchmark, started, scale))
+    return files
+
+
+def add_scale_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--approaches", nargs="+", default=DEFAULT_APPROACHES, choices=approaches, metavar="APPROACH", help=f"approaches to generate (default: {' '.join(DEFAULT_APPROACHES)})")
+    parser.add_argument("-b", "--benchmarks", nargs="+", default=benchmarks, choices=benchmarks, metavar="BENCHMARK", help="benchmarks to generate (default: all)")
+    parser.add_argument("--payload-sizes", nargs="+", default=PAYLOAD_SIZES, help=f"payload sizes of the *-pld benchmarks (default: {' '.join(PAYLOAD_SIZES)})")
+    parser.add_argument("--runs", type=int, default=1, help="repetitions of the whole matrix, one day apart (default: 1)")
+    parser.add_argument("--requests", type=int, default=100, help="curl requests per cell (default: 100)")
+    parser.add_argument("--wrk-runs", type=int, default=10, help="wrk runs per cell (default: 10)")
+    parser.add_argument("--iperf-seconds", type=int, default=100, help="iperf intervals per cell (default: 100)")
+    parser.add_argument("--scrapes", type=int, default=60, help="cadvisor scrapes per cell and cluster (default: 60)")
+    parser.add_argument("--containers", type=int, default=40, help="containers per scrape besides data plane and workload (default: 40)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument("--compression", default="none", choices=list(log_suffixes), help="compression of the logs like LOG_COMPRESSION of benchmarks.sh (default: none)")
+
+
+def scale_from_args(args: argparse.Namespace) -> SyntheticScale:
+    return SyntheticScale(
+        approaches=args.approaches,
+        benchmarks=args.benchmarks,
+        payload_sizes=args.payload_sizes,
+        runs=args.runs,
+        requests=args.requests,
+        wrk_runs=args.wrk_runs,
+        iperf_seconds=args.iperf_seconds,
+        scrapes=args.scrapes,
+        containers=args.containers,
+        seed=args.seed,
+        compression=args.compression,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic results directory with the logs and file names of a real benchmark run")
+    parser.add_argument("output_dir", help="directory to write the logs to")
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    files = generate(args.output_dir, scale_from_args(args))
+    size = sum(os.path.getsize(file) for file in files)
+    logger.info(f"Wrote {len(files)} log files with {size / 1024**2:.1f} MiB to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
+    main()
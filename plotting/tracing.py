@@ -0,0 +1,193 @@
+from contextlib import nullcontext
+import argparse
+import cProfile
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Events in the Chrome trace event format, timestamps and durations are microseconds since the epoch, so events of
+# worker processes and of the shell phases of benchmarks.sh end up on the same timeline. None while tracing is off.
+_events: list[dict] | None = None
+_process_names: dict[int, str] = {}
+_profile_dir: str | None = None
+_profiling = False
+_profiles = 0
+
+# Returned by span() while tracing is off, entering and leaving it does nothing
+_DISABLED = nullcontext()
+
+
+def now_us() -> float:
+    return time.time() * 1e6
+
+
+class Span:
+    __slots__ = ("name", "category", "args", "start", "profiler")
+
+    def __init__(self, name: str, category: str, args: dict):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.profiler = None
+
+    def __enter__(self) -> "Span":
+        global _profiling
+        # Only stages are profiled and never two at once, a single profiler can be active per process
+        if _profile_dir is not None and self.category == "stage" and not _profiling:
+            _profiling = True
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start = now_us()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _profiling, _profiles
+        end = now_us()
+        if self.profiler is not None:
+            self.profiler.disable()
+            _profiling = False
+            _profiles += 1
+            slug = re.sub(r"[^A-Za-z0-9.-]+", "-", self.name).strip("-")
+            self.profiler.dump_stats(os.path.join(_profile_dir, f"{_profiles:02d}-{slug}.prof"))
+        record(self.name, self.category, self.start, end - self.start, args=self.args)
+        return False
+
+
+def span(name: str, category: str = "stage", **args):
+    if _events is None:
+        return _DISABLED
+    return Span(name, category, args)
+
+
+def enable(process_name: str, profile_dir: str | None = None):
+    global _events, _profile_dir
+    _events = []
+    _process_names[os.getpid()] = process_name
+    if profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+        _profile_dir = profile_dir
+
+
+def name_process(pid: int, name: str):
+    if _events is not None:
+        _process_names.setdefault(pid, name)
+
+
+def record(name: str, category: str, start_us: float, duration_us: float, pid: int | None = None, tid: int | str = 0, args: dict | None = None):
+    # For work measured elsewhere, e.g. a figure rendered in a worker process that reported its start and duration
+    if _events is None:
+        return
+    event = {"name": name, "cat": category, "ph": "X", "ts": start_us, "dur": duration_us, "pid": os.getpid() if pid is None else pid, "tid": tid}
+    if args:
+        event["args"] = args
+    _events.append(event)
+
+
+def normalize(events: list[dict], process_names: dict | None = None) -> list[dict]:
+    # Trace viewers want numeric process and thread ids, the shell names them after the cluster pair and approach.
+    # Ids handed out for names start above the real ids, so a named track never merges with a real process or thread.
+    names = dict(process_names or {})
+    real_pids = [pid for pid in [*names, *(event.get("pid", 0) for event in events)] if isinstance(pid, int)]
+    real_tids = [tid for tid in (event.get("tid", 0) for event in events) if isinstance(tid, int)]
+    pids: dict[object, int] = {}
+    tids: dict[tuple[int, object], int] = {}
+    next_pid = max(real_pids, default=0) + 1
+    next_tid = max(real_tids, default=0) + 1
+    normalized = []
+    metadata = []
+    for event in events:
+        event = dict(event)
+        pid = event.get("pid", 0)
+        if not isinstance(pid, int):
+            if pid not in pids:
+                pids[pid] = next_pid
+                names[next_pid] = str(pid)
+                next_pid += 1
+            event["pid"] = pids[pid]
+        tid = event.get("tid", 0)
+        if not isinstance(tid, int):
+            key = (event["pid"], tid)
+            if key not in tids:
+                tids[key] = next_tid
+                metadata.append({"name": "thread_name", "ph": "M", "pid": event["pid"], "tid": next_tid, "args": {"name": str(tid)}})
+                next_tid += 1
+            event["tid"] = tids[key]
+        normalized.append(event)
+    metadata.extend({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": name}} for pid, name in names.items())
+    return metadata + normalized
+
+
+def summary(events: list[dict]) -> list[str]:
+    # Wall time by category and by name, largest first
+    totals: dict[tuple[str, str], list[float]] = {}
+    for event in events:
+        if event.get("ph") != "X":
+            continue
+        # Events of single figures and files are summed by their first word, e.g. "render", not one row per file
+        name = event["name"] if event.get("cat") in ("stage", "phase") else event["name"].split(" ")[0]
+        durations = totals.setdefault((event.get("cat", ""), name), [])
+        durations.append(event["dur"] / 1e6)
+    lines = [f"{'category':<12} {'name':<32} {'count':>6} {'total [s]':>10} {'mean [s]':>10} {'max [s]':>10}"]
+    for (category, name), durations in sorted(totals.items(), key=lambda item: -sum(item[1])):
+        lines.append(f"{category:<12} {name[:32]:<32} {len(durations):>6} {sum(durations):>10.3f} {sum(durations) / len(durations):>10.3f} {max(durations):>10.3f}")
+    return lines
+
+
+def write_trace(file: str, events: list[dict] | None = None, process_names: dict | None = None):
+    events = _events if events is None else events
+    with open(file, "w") as f:
+        json.dump({"traceEvents": normalize(events or [], _process_names if process_names is None else process_names), "displayTimeUnit": "ms"}, f)
+        f.write("\n")
+
+
+def finish(file: str):
+    # Writes the trace of this process and logs where the time went
+    if _events is None:
+        return
+    write_trace(file)
+    for line in summary(_events):
+        logger.info(line)
+    logger.info(f"Wrote {len(_events)} trace events to {file}")
+
+
+def read_events(file: str) -> list[dict]:
+    # Chrome trace JSON as written by write_trace, or one event per line as appended by benchmarks.sh
+    with open(file) as f:
+        if file.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    return data["traceEvents"] if isinstance(data, dict) else data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge traces of extract_data.py, plots.py and the phase trace of benchmarks.sh into one timeline")
+    parser.add_argument("inputs", nargs="+", help="trace JSON files and .jsonl phase traces")
+    parser.add_argument("-o", "--output", required=True, help="merged trace, open it in Perfetto or chrome://tracing")
+    args = parser.parse_args()
+    events = []
+    process_names = {}
+    try:
+        for file in args.inputs:
+            for event in read_events(file):
+                # Process names are written again once the ids of the shell phases are assigned
+                if event.get("ph") == "M" and event.get("name") == "process_name":
+                    process_names[event["pid"]] = event["args"]["name"]
+                else:
+                    events.append(event)
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Cannot read trace: {e}")
+        sys.exit(1)
+    write_trace(args.output, events, process_names)
+    print("\n".join(summary(events)))
+    logger.info(f"Merged {len(events)} events of {len(args.inputs)} traces into {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
+    main()